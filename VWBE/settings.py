@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .caches import caches_from_env
+from .database import databases_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -27,6 +31,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['https://5402-119-155-34-189.ngrok-free.app',
                  '127.0.0.1:8000',
+                 '127.0.0.1',
+                 'localhost',
                  'http://localhost:3000',
                  'vwbe-production.up.railway.app']
 
@@ -45,17 +51,24 @@ INSTALLED_APPS = [
     'main'
 ]
 
+# The main.middleware versions of the session, CSRF, auth, messages and
+# clickjacking middleware skip requests under API_PATH_PREFIXES, which
+# authenticate with JWT; other paths, including /admin/, get the full stack.
 MIDDLEWARE = [
+    'main.middleware.MetricsMiddleware',
+    'main.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'main.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.CsrfViewMiddleware',
+    'main.middleware.AuthenticationMiddleware',
+    'main.middleware.MessageMiddleware',
+    'main.middleware.XFrameOptionsMiddleware',
 ]
 
+API_PATH_PREFIXES = ('/api/',)
+
 ROOT_URLCONF = 'VWBE.urls'
 
 TEMPLATES = [
@@ -89,12 +102,32 @@ AUTH_USER_MODEL = 'main.User'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+# Configured from the environment; see VWBE/database.py. Without
+# DATABASE_URL this is the local db.sqlite3 in WAL mode.
+DATABASES = databases_from_env(os.environ, BASE_DIR)
+
+DATABASE_ROUTERS = ['main.db_routers.ReplicaRouter']
+
+# Cache
+# Shared by every worker process (a database table unless CACHE_URL is set);
+# see VWBE/caches.py.
+CACHES = caches_from_env(os.environ)
+
+# Offline course packages (main/packages.py); not under MEDIA_ROOT, since
+# they are served only to enrolled users.
+COURSE_PACKAGE_DIR = os.environ.get('COURSE_PACKAGE_DIR') or BASE_DIR / 'course_packages'
+
+# Metrics
+# Workers write snapshots here so /metrics can report every process;
+# gunicorn.conf.py provides a directory when none is configured.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+# Optional bearer token required to scrape /metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# On-demand request profiling (main/profiling.py): staff JWTs, or this token
+# in X-Profile-Token, may send X-Profile: cpu,memory.
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or BASE_DIR / 'profiles'
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
 
 CORS_ALLOW_ALL_ORIGINS = True
 CSRF_TRUSTED_ORIGINS = [
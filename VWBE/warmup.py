@@ -0,0 +1,61 @@
+"""
+Per-worker warmup, run by gunicorn's post_fork hook (see gunicorn.conf.py).
+
+Pays the one-off costs that would otherwise land on a worker's first
+requests: URL resolver population and lazily loaded DRF/JWT settings.
+
+Database connections are not opened here: Django connections are per
+thread, and gthread workers serve requests on pool threads that would
+never see a connection opened by the post_fork hook.
+"""
+import time
+
+from django.urls import get_resolver, reverse
+from django.urls.exceptions import NoReverseMatch
+
+
+def resolve_routes():
+    resolver = get_resolver()
+    # Accessing reverse_dict populates the resolver for every pattern.
+    names = [name for name in resolver.reverse_dict if isinstance(name, str)]
+    for name in names:
+        try:
+            path = reverse(name, kwargs=_sample_kwargs(resolver, name))
+        except NoReverseMatch:
+            continue
+        resolver.resolve(path)
+    return len(names)
+
+
+def _sample_kwargs(resolver, name):
+    possibilities = resolver.reverse_dict.getlist(name)
+    if not possibilities:
+        return {}
+    params = possibilities[0][0][0][1]
+    return {param: 1 for param in params}
+
+
+def prime_caches():
+    from rest_framework.settings import api_settings
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+    # Both settings objects import their classes lazily on first access.
+    api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    api_settings.DEFAULT_RENDERER_CLASSES
+    api_settings.DEFAULT_PARSER_CLASSES
+    jwt_settings.AUTH_TOKEN_CLASSES
+    APIView().get_authenticators()
+
+    from main import serializers
+    for serializer_class in (serializers.CourseSerializer, serializers.VideoSerializer,
+                             serializers.QuizSerializer, serializers.LevelExamSerializer):
+        serializer_class().fields
+
+
+def warmup():
+    """Run every warmup step and return the elapsed time in seconds."""
+    start = time.perf_counter()
+    resolve_routes()
+    prime_caches()
+    return time.perf_counter() - start
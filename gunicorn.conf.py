@@ -0,0 +1,69 @@
+"""
+Production gunicorn profile for VWBE.
+
+Every knob can be overridden from the environment so the same file serves
+small and large dynos:
+
+    WEB_CONCURRENCY          worker processes (default: 2 * CPUs + 1)
+    GUNICORN_THREADS         threads per worker (default: 4, 1 = sync worker)
+    GUNICORN_MAX_REQUESTS    requests before a worker is recycled (default: 1000)
+    GUNICORN_MAX_REQUESTS_JITTER
+                             random extra requests so workers don't all restart
+                             at once (default: 100)
+    GUNICORN_TIMEOUT         seconds before a silent worker is killed (default: 30)
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Import Django once in the master so workers fork with it already loaded.
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+# Workers share metrics through snapshot files; see main/metrics.py.
+if not os.environ.get('METRICS_DIR'):
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='vwbe-metrics-')
+
+
+def when_ready(server):
+    # Stored in the database file, so set once here rather than per connection.
+    from django.conf import settings
+    from VWBE.database import enable_wal
+    enable_wal(settings.DATABASES['default'])
+
+
+def pre_fork(server, worker):
+    # Connections opened while preloading must not be shared across forks.
+    from django.db import connections
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    from VWBE.warmup import warmup
+    elapsed = warmup()
+    server.log.info("Worker %s warmed up in %.1fms", worker.pid, elapsed * 1000)
+
+
+def worker_exit(server, worker):
+    from main.heartbeats import buffer
+    from main.metrics import registry
+    buffer.flush()
+    registry.write()
+
+
+def child_exit(server, worker):
+    from main.metrics import registry
+    registry.mark_process_dead(worker.pid)
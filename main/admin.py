@@ -1,17 +1,97 @@
 # admin.py
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import forms as auth_forms
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from . import completion
+from .enrollments import enroll_users
+from .purge import restore, soft_delete
+from .dashboard import invalidate_dashboard, invalidate_dashboards
+from .media import ingest_video
+from .progress import enqueue_recompute
 from .models import (
     User, Course, CourseLevel, Enrollment, Video, UserVideoProgress,
     Quiz, QuizQuestion, QuizAnswer, UserQuizAttempt,
-    LevelExam, ExamQuestion, ExamAnswer, UserExamAttempt
+    LevelExam, ExamQuestion, ExamAnswer, UserExamAttempt, ExamSession
 )
 
 
+# -----------------------------------------------------------
+# Soft delete for User and Course; see main/purge.py.
+# -----------------------------------------------------------
+class DeletedListFilter(admin.SimpleListFilter):
+    title = 'status'
+    parameter_name = 'deleted'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Deleted'),)
+
+    def queryset(self, request, queryset):
+        return queryset.filter(deleted_at__isnull=self.value() != 'yes')
+
+
+class SoftDeleteAdminMixin:
+    """
+    Deleting hides the object and leaves the dependents to `manage.py
+    purge_deleted`, so neither the confirmation page nor the delete itself
+    walks the related rows.
+    """
+    actions = ['restore_selected']
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+    def get_list_filter(self, request):
+        return (DeletedListFilter, *super().get_list_filter(request))
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        return [str(obj) for obj in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        soft_delete(self.model.all_objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        soft_delete(queryset)
+
+    @admin.action(description="Restore selected deleted %(verbose_name_plural)s")
+    def restore_selected(self, request, queryset):
+        restored = restore(queryset)
+        self.message_user(request, f"Restored {restored} {self.model._meta.verbose_name_plural}.", messages.SUCCESS)
+
+
 # -----------------------------------------------------------
 # Custom UserAdmin for our custom User model.
 # -----------------------------------------------------------
-class UserAdmin(BaseUserAdmin):
+class UserActionForm(ActionForm):
+    course = forms.ModelChoiceField(queryset=Course.objects.order_by('title'), required=False)
+
+
+def check_username_free(form, username):
+    # The forms' own uniqueness checks use User.objects, which hides
+    # soft-deleted users whose rows still hold the username until purged.
+    taken = User.all_objects.filter(username=username).exclude(pk=form.instance.pk)
+    if username and taken.exists():
+        raise form.instance.unique_error_message(User, ['username'])
+    return username
+
+
+class UserCreationForm(auth_forms.UserCreationForm):
+    def clean_username(self):
+        return check_username_free(self, super().clean_username())
+
+
+class UserChangeForm(auth_forms.UserChangeForm):
+    def clean_username(self):
+        return check_username_free(self, self.cleaned_data.get('username'))
+
+
+class UserAdmin(SoftDeleteAdminMixin, BaseUserAdmin):
+    form = UserChangeForm
+    add_form = UserCreationForm
     # Make 'created_at' read-only since it's non-editable (auto_now_add)
     readonly_fields = ('created_at',)
 
@@ -37,6 +117,23 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff')
     search_fields = ('username', 'first_name', 'last_name', 'email')
     ordering = ('username',)
+    action_form = UserActionForm
+    actions = ['enroll_in_course', 'restore_selected']
+
+    @admin.action(description="Enroll selected users in the chosen course")
+    def enroll_in_course(self, request, queryset):
+        # The action form's own validation needs the changelist's action choices.
+        course_id = request.POST.get('course')
+        course = Course.objects.filter(pk=course_id).first() if course_id else None
+        if course is None:
+            self.message_user(request, "Choose a course to enroll the users in.", messages.WARNING)
+            return
+        counts = enroll_users(queryset.values_list('id', flat=True), [course.id])[course.id]
+        self.message_user(
+            request,
+            f"Enrolled {counts['created']} users in {course.title}; {counts['skipped']} were already enrolled.",
+            messages.SUCCESS,
+        )
 
 
 # Register the custom User model with our custom admin.
@@ -47,8 +144,8 @@ admin.site.register(User, UserAdmin)
 # Course Admin
 # -----------------------------------------------------------
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'created_at')
+class CourseAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'title', 'created_at', 'deleted_at')
     search_fields = ('title', 'description')
     list_filter = ('created_at',)
     ordering = ('-created_at',)
@@ -81,10 +178,16 @@ class EnrollmentAdmin(admin.ModelAdmin):
 # -----------------------------------------------------------
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'level', 'order')
+    list_display = ('id', 'title', 'level', 'order', 'duration', 'file_size')
     search_fields = ('title', 'level__name')
     list_filter = ('level',)
     ordering = ('level', 'order')
+    readonly_fields = ('duration', 'file_size', 'width', 'height', 'bitrate')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'video_file' in form.changed_data:
+            ingest_video(obj)
 
 
 # -----------------------------------------------------------
@@ -92,11 +195,29 @@ class VideoAdmin(admin.ModelAdmin):
 # -----------------------------------------------------------
 @admin.register(UserVideoProgress)
 class UserVideoProgressAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'video', 'is_completed', 'completed_at')
+    list_display = ('id', 'user', 'video', 'is_completed', 'completed_at', 'position')
     search_fields = ('user__username', 'video__title')
     list_filter = ('is_completed', 'user')
     ordering = ('user', 'video')
 
+    # Edits here can undo a completion, which the enrollment's completion
+    # bitmap can't express as a bit flip; have it rebuilt on next read.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'user', 'video'} & set(form.changed_data):
+            completion.invalidate(form.initial['user'], form.initial['video'])
+        completion.invalidate(obj.user_id, obj.video_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        completion.invalidate(obj.user_id, obj.video_id)
+
+    def delete_queryset(self, request, queryset):
+        pairs = set(queryset.values_list('user_id', 'video_id'))
+        super().delete_queryset(request, queryset)
+        for user_id, video_id in pairs:
+            completion.invalidate(user_id, video_id)
+
 
 # -----------------------------------------------------------
 # Inlines for Quiz-related models.
@@ -135,6 +256,17 @@ class QuizAdmin(admin.ModelAdmin):
     list_filter = ('video', 'level')
     ordering = ('order',)
     inlines = [QuizQuestionInline]
+    actions = ['recompute_progress']
+
+    # Adding, moving or removing a quiz queues a recompute (main/signals.py);
+    # the action is for refreshing stored progress by hand.
+    @admin.action(description="Recompute progress for users enrolled in these quizzes' levels")
+    def recompute_progress(self, request, queryset):
+        level_ids = set(queryset.exclude(level=None).values_list('level_id', flat=True))
+        if enqueue_recompute(level_ids):
+            self.message_user(request, f"Queued a progress recompute for {len(level_ids)} level(s).")
+        else:
+            self.message_user(request, "None of the selected quizzes belong to a level.", level=messages.WARNING)
 
 
 # -----------------------------------------------------------
@@ -180,7 +312,7 @@ class ExamQuestionInline(admin.TabularInline):
 
 @admin.register(LevelExam)
 class LevelExamAdmin(admin.ModelAdmin):
-    list_display = ('id', 'level', 'passing_score')
+    list_display = ('id', 'level', 'passing_score', 'time_limit_minutes')
     search_fields = ('level__name',)
     list_filter = ('level',)
     ordering = ('level',)
@@ -198,6 +330,18 @@ class UserExamAttemptAdmin(admin.ModelAdmin):
     ordering = ('-attempted_at',)
 
 
+# -----------------------------------------------------------
+# ExamSession Admin
+# -----------------------------------------------------------
+@admin.register(ExamSession)
+class ExamSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'exam', 'started_at', 'deadline', 'submitted_at', 'score', 'passed')
+    search_fields = ('user__username', 'exam__level__name')
+    list_filter = ('passed', 'exam')
+    ordering = ('-started_at',)
+    readonly_fields = ('started_at', 'saved_at')
+
+
 # admin.py
 from django.contrib import admin
 from .models import UserLevelProgress
@@ -206,3 +350,74 @@ from .models import UserLevelProgress
 class UserLevelProgressAdmin(admin.ModelAdmin):
     list_display = ('user', 'course_level', 'progress', 'updated_at')
     search_fields = ('user__username', 'course_level__name')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_dashboard(obj.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_dashboard(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        invalidate_dashboards(user_ids)
+
+
+# -----------------------------------------------------------
+# Attempt summaries written by `manage.py compact_attempts`.
+# -----------------------------------------------------------
+from .models import ExamAttemptSummary, QuizAttemptSummary
+
+
+@admin.register(QuizAttemptSummary)
+class QuizAttemptSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'quiz', 'archived_attempts', 'archived_passes', 'updated_at')
+    search_fields = ('user__username',)
+    list_filter = ('quiz',)
+
+
+@admin.register(ExamAttemptSummary)
+class ExamAttemptSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'exam', 'archived_attempts', 'archived_passes', 'updated_at')
+    search_fields = ('user__username',)
+    list_filter = ('exam',)
+
+
+# -----------------------------------------------------------
+# Offline course packages built by main/packages.py.
+# -----------------------------------------------------------
+from .models import CoursePackage
+
+
+@admin.register(CoursePackage)
+class CoursePackageAdmin(admin.ModelAdmin):
+    list_display = ('course', 'version', 'unlocked_order', 'size', 'built_at')
+    list_filter = ('course',)
+    readonly_fields = ('course', 'version', 'unlocked_order', 'file', 'size', 'sha256', 'built_at')
+
+
+# -----------------------------------------------------------
+# Content-addressed media blobs; see main/storage.py.
+# -----------------------------------------------------------
+from .models import MediaBlob
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'touched_at')
+    search_fields = ('digest',)
+    readonly_fields = ('digest', 'name', 'size', 'ref_count', 'touched_at')
+
+
+# -----------------------------------------------------------
+# Progress recomputes queued by content edits; see main/progress.py.
+# -----------------------------------------------------------
+from .models import RecomputeProgressJob
+
+
+@admin.register(RecomputeProgressJob)
+class RecomputeProgressJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'level_ids', 'created_at', 'started_at', 'finished_at', 'last_user_id', 'written')
+    readonly_fields = ('level_ids', 'last_user_id', 'written', 'created_at', 'started_at', 'finished_at', 'error')
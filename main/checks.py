@@ -0,0 +1,26 @@
+# checks.py
+"""
+System checks for settings the app depends on.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    # Exam answer drafts, video completion markers and dashboard
+    # invalidations are written by one worker and read by another.
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PER_PROCESS_CACHES:
+        return [Error(
+            f"The default cache ({backend}) is not shared between worker processes.",
+            hint="Set CACHE_URL to a Redis or memcached server, or unset it to use the database cache. "
+                 "Silence main.E001 only when serving from a single process.",
+            id='main.E001',
+        )]
+    return []
@@ -0,0 +1,208 @@
+# compaction.py
+"""
+Attempt history compaction.
+
+For every (user, quiz) and (user, exam) pair the hot attempt tables keep the
+best attempt plus the `keep_latest` most recent ones. Everything else is moved
+to an archive table or gzipped NDJSON files, and the per-pair summary rows
+record how many attempts and passes were archived.
+
+Keeping the best attempt preserves every "has passed" check (progress, level
+unlocks). Keeping the latest `keep_latest`, the dashboard's recent-attempt
+count by default, preserves any recent-attempts list of that length.
+"""
+import gzip
+import json
+import os
+from dataclasses import dataclass
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ExamAttemptSummary, QuizAttemptSummary, UserExamAttempt, UserExamAttemptArchive,
+    UserQuizAttempt, UserQuizAttemptArchive,
+)
+
+DELETE_CHUNK = 500
+
+
+@dataclass
+class AttemptKind:
+    name: str
+    model: type
+    archive_model: type
+    summary_model: type
+    target: str
+
+
+KINDS = {
+    'quiz': AttemptKind('quiz', UserQuizAttempt, UserQuizAttemptArchive, QuizAttemptSummary, 'quiz_id'),
+    'exam': AttemptKind('exam', UserExamAttempt, UserExamAttemptArchive, ExamAttemptSummary, 'exam_id'),
+}
+
+FIELDS = ('id', 'user_id', 'score', 'passed', 'attempted_at')
+
+
+def select_archivable(attempts, keep_latest):
+    """
+    Given one pair's attempts newest first, return those that can be archived:
+    all but the newest `keep_latest` and the best (passed, then highest score).
+    """
+    keep = {attempt['id'] for attempt in attempts[:keep_latest]}
+    best = max(attempts, key=lambda attempt: (attempt['passed'], attempt['score'], attempt['attempted_at'], attempt['id']))
+    keep.add(best['id'])
+    return [attempt for attempt in attempts if attempt['id'] not in keep]
+
+
+class NDJSONSink:
+    """
+    Writes each batch of archived attempts to
+    <directory>/<kind>-attempts-<timestamp>-<batch>.ndjson.gz.
+
+    The batch is written to a .tmp file inside the transaction that deletes
+    the attempts, and renamed into place once that transaction commits, so a
+    rolled-back batch never shows up as archived. A .tmp file left by a
+    process killed between the commit and the rename holds attempts that
+    were deleted.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        self.batches = 0
+        self.staged = set()
+
+    def path(self, kind, batch):
+        return os.path.join(self.directory, f"{kind.name}-attempts-{self.stamp}-{batch:05d}.ndjson.gz")
+
+    def write(self, kind, attempts):
+        self.batches += 1
+        path = self.path(kind, self.batches)
+        staged = path + '.tmp'
+        with open(staged, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as f:
+                for attempt in attempts:
+                    f.write(json.dumps(attempt, cls=DjangoJSONEncoder) + '\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        self.staged.add(staged)
+        transaction.on_commit(lambda: self.publish(staged, path))
+
+    def publish(self, staged, path):
+        os.replace(staged, path)
+        self.staged.discard(staged)
+
+    def discard(self):
+        """Remove batches whose transaction rolled back."""
+        for staged in self.staged:
+            if os.path.exists(staged):
+                os.remove(staged)
+        self.staged.clear()
+
+
+class TableSink:
+    def write(self, kind, attempts):
+        kind.archive_model.objects.bulk_create(
+            [
+                kind.archive_model(**{
+                    'user_id': attempt['user_id'],
+                    kind.target: attempt[kind.target],
+                    'score': attempt['score'],
+                    'passed': attempt['passed'],
+                    'attempted_at': attempt['attempted_at'],
+                })
+                for attempt in attempts
+            ],
+            batch_size=DELETE_CHUNK,
+        )
+
+    def discard(self):
+        pass
+
+
+def _update_summaries(kind, archived):
+    totals = {}
+    for attempt in archived:
+        key = (attempt['user_id'], attempt[kind.target])
+        attempts, passes = totals.get(key, (0, 0))
+        totals[key] = (attempts + 1, passes + int(attempt['passed']))
+
+    user_ids = {user_id for user_id, _ in totals}
+    target_ids = {target_id for _, target_id in totals}
+    existing = {
+        (summary.user_id, getattr(summary, kind.target)): summary
+        for summary in kind.summary_model.objects.filter(
+            user_id__in=user_ids, **{f'{kind.target}__in': target_ids}
+        )
+    }
+    to_update, to_create = [], []
+    for (user_id, target_id), (attempts, passes) in totals.items():
+        summary = existing.get((user_id, target_id))
+        if summary is None:
+            to_create.append(kind.summary_model(
+                user_id=user_id, archived_attempts=attempts, archived_passes=passes,
+                **{kind.target: target_id},
+            ))
+        else:
+            summary.archived_attempts += attempts
+            summary.archived_passes += passes
+            summary.updated_at = timezone.now()
+            to_update.append(summary)
+    kind.summary_model.objects.bulk_create(to_create, batch_size=DELETE_CHUNK)
+    kind.summary_model.objects.bulk_update(
+        to_update, ['archived_attempts', 'archived_passes', 'updated_at'], batch_size=DELETE_CHUNK
+    )
+
+
+def compact(kind, sink, keep_latest=5, batch_size=500, dry_run=False, progress=None):
+    """
+    Compact one attempt table, `batch_size` users at a time. Returns
+    (users_scanned, attempts_archived).
+    """
+    users_scanned = archived_total = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            kind.model.objects.filter(user_id__gt=last_user_id)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()[:batch_size]
+        )
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+        attempts = (
+            kind.model.objects.filter(user_id__in=user_ids)
+            .order_by('user_id', kind.target, '-attempted_at', '-id')
+            .values(*FIELDS, kind.target)
+        )
+        archived = []
+        group, group_key = [], None
+        for attempt in attempts.iterator():
+            key = (attempt['user_id'], attempt[kind.target])
+            if key != group_key and group:
+                archived.extend(select_archivable(group, keep_latest))
+                group = []
+            group_key = key
+            group.append(attempt)
+        if group:
+            archived.extend(select_archivable(group, keep_latest))
+
+        if archived and not dry_run:
+            try:
+                with transaction.atomic():
+                    sink.write(kind, archived)
+                    _update_summaries(kind, archived)
+                    ids = [attempt['id'] for attempt in archived]
+                    for start in range(0, len(ids), DELETE_CHUNK):
+                        kind.model.objects.filter(id__in=ids[start:start + DELETE_CHUNK]).delete()
+            except BaseException:
+                sink.discard()
+                raise
+
+        users_scanned += len(user_ids)
+        archived_total += len(archived)
+        if progress:
+            progress(kind, users_scanned, archived_total)
+    return users_scanned, archived_total
@@ -0,0 +1,231 @@
+# completion.py
+"""
+Per-(user, course) video completion bitmaps.
+
+Enrollment.completed_videos holds one bit per video of the course, indexed by
+the video's position in the course's ordered video list (levels by order,
+then videos by order): bit i is byte i // 8, mask 1 << (i % 8). Lock checks,
+progress bars and "next video" lookups read it from the enrollment row the
+views already load, instead of scanning UserVideoProgress.
+
+Course.video_layout_version is bumped (main/signals.py) whenever videos are
+added, removed or reordered, or levels are reordered, so positions move.
+Enrollment.completion_version records the layout a bitmap was built for; a
+bitmap for an older layout, or one never built, is rebuilt from
+UserVideoProgress the first time it is read. The ordered video ids of each
+layout are cached.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BinaryField, Case, F, PositiveIntegerField, Q, Value, When
+
+from .models import Course, Enrollment, UserVideoProgress, Video
+
+LAYOUT_CACHE_TIMEOUT = 24 * 60 * 60
+CHUNK_SIZE = 1000
+
+
+# ----- Bitmaps -----
+
+def with_bit(bitmap, position):
+    data = bytearray(bitmap)
+    byte = position >> 3
+    if byte >= len(data):
+        data.extend(bytes(byte + 1 - len(data)))
+    data[byte] |= 1 << (position & 7)
+    return bytes(data)
+
+
+def from_positions(positions):
+    data = bytearray()
+    for position in positions:
+        byte = position >> 3
+        if byte >= len(data):
+            data.extend(bytes(byte + 1 - len(data)))
+        data[byte] |= 1 << (position & 7)
+    return bytes(data)
+
+
+def set_positions(bitmap):
+    for byte, value in enumerate(bitmap):
+        while value:
+            low = value & -value
+            yield (byte << 3) + low.bit_length() - 1
+            value ^= low
+
+
+# ----- Layouts -----
+
+def layout_cache_key(course_id, version):
+    return f"video-layout:{course_id}:{version}"
+
+
+def bump_layout(course_id):
+    """Mark the course's video positions as changed; existing bitmaps go stale."""
+    if course_id is not None:
+        Course.all_objects.filter(pk=course_id).update(video_layout_version=F('video_layout_version') + 1)
+
+
+def video_orders(versions):
+    """
+    {course_id: video ids in position order} for {course_id: layout version},
+    with one cache round trip and, for layouts not cached yet, two queries.
+    """
+    keys = {course_id: layout_cache_key(course_id, version) for course_id, version in versions.items()}
+    cached = cache.get_many(keys.values())
+    orders = {course_id: cached[key] for course_id, key in keys.items() if key in cached}
+    missing = [course_id for course_id in versions if course_id not in orders]
+    if missing:
+        fetched = {course_id: [] for course_id in missing}
+        rows = (
+            Video.objects.filter(level__course_id__in=missing)
+            .order_by('level__course_id', 'level__order', 'level_id', 'order', 'id')
+            .values_list('level__course_id', 'id')
+        )
+        for course_id, video_id in rows:
+            fetched[course_id].append(video_id)
+        # Only cache layouts no reorder has replaced meanwhile, or another
+        # version's list would be stored under this one.
+        current = dict(Course.all_objects.filter(pk__in=missing).values_list('id', 'video_layout_version'))
+        cache.set_many(
+            {keys[course_id]: order for course_id, order in fetched.items() if current.get(course_id) == versions[course_id]},
+            LAYOUT_CACHE_TIMEOUT,
+        )
+        orders.update(fetched)
+    return orders
+
+
+def video_positions(course_id, version):
+    order = video_orders({course_id: version})[course_id]
+    return {video_id: position for position, video_id in enumerate(order)}
+
+
+# ----- Reading -----
+# Enrollments passed in need their course loaded (select_related) for its
+# layout version.
+
+def rebuild(enrollments, orders):
+    """Rebuild the bitmaps of `enrollments` that are stale, from UserVideoProgress, in two queries."""
+    stale = [
+        enrollment for enrollment in enrollments
+        if enrollment.completion_version != enrollment.course.video_layout_version
+    ]
+    if not stale:
+        return
+    positions = {
+        enrollment.course_id: {video_id: position for position, video_id in enumerate(orders[enrollment.course_id])}
+        for enrollment in stale
+    }
+    completed = defaultdict(list)
+    rows = UserVideoProgress.objects.filter(
+        user_id__in={enrollment.user_id for enrollment in stale},
+        video__level__course_id__in=positions,
+        is_completed=True,
+    ).values_list('user_id', 'video__level__course_id', 'video_id')
+    for user_id, course_id, video_id in rows:
+        if video_id in positions[course_id]:
+            completed[user_id, course_id].append(positions[course_id][video_id])
+
+    bitmaps, versions = [], []
+    for enrollment in stale:
+        # Conditional on the version read, so a bitmap mark_completed() rebuilt
+        # meanwhile, with a completion the query above may have missed, is kept.
+        unchanged = Q(pk=enrollment.pk, completion_version=enrollment.completion_version)
+        enrollment.completed_videos = from_positions(completed[enrollment.user_id, enrollment.course_id])
+        enrollment.completion_version = enrollment.course.video_layout_version
+        bitmaps.append(When(unchanged, then=Value(enrollment.completed_videos)))
+        versions.append(When(unchanged, then=Value(enrollment.completion_version)))
+    Enrollment.objects.filter(pk__in=[enrollment.pk for enrollment in stale]).update(
+        completed_videos=Case(*bitmaps, default=F('completed_videos'), output_field=BinaryField()),
+        completion_version=Case(*versions, default=F('completion_version'), output_field=PositiveIntegerField()),
+    )
+
+
+def completed_by_enrollment(enrollments, orders=None):
+    """
+    {enrollment pk: set of completed video ids}, rebuilding stale bitmaps
+    first. A caller that has already read the courses' videos passes their
+    layouts as `orders` ({course_id: video ids in position order}), read
+    after the enrollments; otherwise they come from video_orders().
+    """
+    if orders is None:
+        orders = video_orders({enrollment.course_id: enrollment.course.video_layout_version for enrollment in enrollments})
+    rebuild(enrollments, orders)
+    completed = {}
+    for enrollment in enrollments:
+        order = orders[enrollment.course_id]
+        completed[enrollment.pk] = {
+            order[position] for position in set_positions(bytes(enrollment.completed_videos)) if position < len(order)
+        }
+    return completed
+
+
+def completed_video_ids(enrollment):
+    """The set of video ids the enrollment's user has completed."""
+    return completed_by_enrollment([enrollment])[enrollment.pk]
+
+
+# ----- Writing -----
+
+def mark_completed(user_id, video_id):
+    """
+    Set the video's bit on the user's enrollment. The row is locked for the
+    read-modify-write, so concurrent completions don't lose each other's bits;
+    call it in the transaction that saves the UserVideoProgress row.
+    """
+    with transaction.atomic():
+        enrollment = (
+            Enrollment.objects
+            .select_for_update(of=('self',))
+            .select_related('course')
+            .filter(user_id=user_id, course__levels__videos=video_id)
+            .only('id', 'user_id', 'course_id', 'completed_videos', 'completion_version', 'course__video_layout_version')
+            .first()
+        )
+        if enrollment is None:
+            return
+        orders = video_orders({enrollment.course_id: enrollment.course.video_layout_version})
+        order = orders[enrollment.course_id]
+        if enrollment.completion_version != enrollment.course.video_layout_version:
+            # The rebuild reads the progress row the caller has just saved.
+            rebuild([enrollment], orders)
+        elif video_id in order:
+            bitmap = with_bit(bytes(enrollment.completed_videos), order.index(video_id))
+            Enrollment.objects.filter(pk=enrollment.pk).update(completed_videos=bitmap)
+
+
+def invalidate(user_id, video_id):
+    """A completion was undone or deleted: rebuild the bitmap on next read."""
+    Enrollment.objects.filter(user_id=user_id, course__levels__videos=video_id).update(completion_version=None)
+
+
+def rebuild_course(course_id, chunk_size=CHUNK_SIZE):
+    """Rebuild every enrollment's bitmap in a course now rather than on read. Returns enrollments rebuilt."""
+    version = Course.all_objects.filter(pk=course_id).values_list('video_layout_version', flat=True).first()
+    if version is None:
+        return 0
+    positions = video_positions(course_id, version)
+    enrollment_ids = list(Enrollment.objects.filter(course_id=course_id).order_by('id').values_list('id', 'user_id'))
+    for start in range(0, len(enrollment_ids), chunk_size):
+        chunk = enrollment_ids[start:start + chunk_size]
+        with transaction.atomic():
+            # Locked so a completion committing meanwhile isn't overwritten.
+            list(Enrollment.objects.select_for_update().filter(pk__in=[pk for pk, _ in chunk]).values_list('pk'))
+            completed = {}
+            rows = UserVideoProgress.objects.filter(
+                user_id__in=[user_id for _, user_id in chunk], video__level__course_id=course_id, is_completed=True,
+            ).values_list('user_id', 'video_id')
+            for user_id, video_id in rows:
+                if video_id in positions:
+                    completed.setdefault(user_id, []).append(positions[video_id])
+            Enrollment.objects.bulk_update(
+                [
+                    Enrollment(pk=pk, completed_videos=from_positions(completed.get(user_id, ())),
+                               completion_version=version)
+                    for pk, user_id in chunk
+                ],
+                ['completed_videos', 'completion_version'],
+            )
+    return len(enrollment_ids)
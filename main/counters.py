@@ -0,0 +1,116 @@
+# counters.py
+"""
+Denormalized catalog counters on Course and CourseLevel.
+
+The signal handlers in main/signals.py keep the counters exact by applying
+F() increments in the same transaction as the write that changes them.
+Structural deletes (a whole level) recount the course instead, since
+cascades and SET_NULL detachments are not signalled row by row.
+`manage.py reconcile_counters` reports and fixes any drift, e.g. after bulk
+operations that skip signals.
+
+A quiz counts towards its level, or towards its video's level when it is
+attached to a video only.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Course, CourseLevel, Enrollment, Quiz, Video
+
+COURSE_COUNTERS = ('levels_count', 'videos_count', 'quizzes_count', 'enrollments_count')
+LEVEL_COUNTERS = ('videos_count', 'quizzes_count')
+
+
+def adjust(course_id=None, level_id=None, **deltas):
+    """Add `deltas` ({counter: n}) to a course's and/or a level's counters."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    if course_id is not None:
+        Course.all_objects.filter(pk=course_id).update(**updates)
+    if level_id is not None:
+        CourseLevel.objects.filter(pk=level_id).update(
+            **{field: value for field, value in updates.items() if field in LEVEL_COUNTERS}
+        )
+
+
+def level_course_id(level_id):
+    if level_id is None:
+        return None
+    return CourseLevel.objects.filter(pk=level_id).values_list('course_id', flat=True).first()
+
+
+def quiz_home_level_id(level_id, video_id):
+    if level_id is not None:
+        return level_id
+    if video_id is not None:
+        return Video.objects.filter(pk=video_id).values_list('level_id', flat=True).first()
+    return None
+
+
+# ----- Exact counts -----
+
+def _count(queryset, outer_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{outer_field: OuterRef('pk')})
+            .order_by().values(outer_field).annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def exact_course_counts(courses=None):
+    courses = Course.objects.all() if courses is None else courses
+    return courses.annotate(
+        exact_levels=_count(CourseLevel.objects.all(), 'course_id'),
+        exact_videos=_count(Video.objects.all(), 'level__course_id'),
+        exact_quizzes=_count(
+            Quiz.objects.annotate(home_course_id=Coalesce('level__course_id', 'video__level__course_id')),
+            'home_course_id',
+        ),
+        exact_enrollments=_count(Enrollment.objects.all(), 'course_id'),
+    )
+
+
+def exact_level_counts(levels=None):
+    levels = CourseLevel.objects.all() if levels is None else levels
+    return levels.annotate(
+        exact_videos=_count(Video.objects.all(), 'level_id'),
+        exact_quizzes=_count(Quiz.objects.annotate(home_level_id=Coalesce('level_id', 'video__level_id')), 'home_level_id'),
+    )
+
+
+def find_drift(courses=None, levels=None):
+    """
+    Return ({course_id: {counter: (stored, exact)}}, {level_id: {...}}) for
+    every row whose stored counters differ from the exact counts.
+    """
+    drift = ({}, {})
+    sources = [
+        (exact_course_counts(courses), COURSE_COUNTERS, drift[0]),
+        (exact_level_counts(levels), LEVEL_COUNTERS, drift[1]),
+    ]
+    for queryset, counters, found in sources:
+        exact_fields = ['exact_' + counter[:-len('_count')] for counter in counters]
+        for row in queryset.values('pk', *counters, *exact_fields):
+            differences = {
+                counter: (row[counter], row[exact])
+                for counter, exact in zip(counters, exact_fields)
+                if row[counter] != row[exact]
+            }
+            if differences:
+                found[row['pk']] = differences
+    return drift
+
+
+def fix_drift(course_drift, level_drift):
+    for model, drift in ((Course, course_drift), (CourseLevel, level_drift)):
+        for pk, differences in drift.items():
+            model.objects.filter(pk=pk).update(**{counter: exact for counter, (_, exact) in differences.items()})
+
+
+def recount_course(course_id):
+    """Make a course's and its levels' counters exact."""
+    fix_drift(*find_drift(Course.objects.filter(pk=course_id), CourseLevel.objects.filter(course_id=course_id)))
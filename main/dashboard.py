@@ -0,0 +1,126 @@
+# dashboard.py
+"""
+Per-user home screen data: every enrolled course with level progress, the
+next video to watch and recent attempts.
+
+build_dashboard() issues the same number of queries however many courses the
+user is enrolled in, with the video layout cache cold or warm; completed
+videos come from the enrollments' completion bitmaps (main/completion.py). Results are cached per user and dropped by
+invalidate_dashboard() whenever one of the user's progress rows changes.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from . import completion
+from .metrics import registry
+from .models import CourseLevel, Enrollment, UserExamAttempt, UserQuizAttempt, Video
+from .progress import level_progress_map
+
+CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+RECENT_ATTEMPTS = getattr(settings, 'DASHBOARD_RECENT_ATTEMPTS', 5)
+
+
+def cache_key(user_id):
+    return f"dashboard:{user_id}"
+
+
+def invalidate_dashboard(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def invalidate_dashboards(user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+def get_dashboard(user):
+    key = cache_key(user.id)
+    data = cache.get(key)
+    registry.inc('cache_requests_total', {'cache': 'dashboard', 'result': 'miss' if data is None else 'hit'})
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, CACHE_TIMEOUT)
+    return data
+
+
+def _recent_attempts(queryset, course_expr, course_ids, target_field):
+    rows = (
+        queryset
+        .annotate(
+            course_id=course_expr,
+            rank=Window(RowNumber(), partition_by=[course_expr], order_by=[F('attempted_at').desc(), F('id').desc()]),
+        )
+        .filter(course_id__in=course_ids, rank__lte=RECENT_ATTEMPTS)
+        .values('id', 'course_id', target_field, 'score', 'passed', 'attempted_at')
+    )
+    recent = defaultdict(list)
+    for row in rows:
+        recent[row.pop('course_id')].append(row)
+    return recent
+
+
+def build_dashboard(user):
+    enrollments = list(
+        Enrollment.objects
+        .filter(user=user, course__deleted_at__isnull=True)
+        .select_related('course')
+        .order_by('enrolled_at', 'id')
+    )
+    course_ids = [enrollment.course_id for enrollment in enrollments]
+
+    levels_by_course = defaultdict(list)
+    for level in CourseLevel.objects.filter(course_id__in=course_ids).order_by('order', 'id').values('id', 'course_id', 'name', 'order'):
+        levels_by_course[level['course_id']].append(level)
+    level_ids = [level['id'] for levels in levels_by_course.values() for level in levels]
+
+    videos_by_level = defaultdict(list)
+    for video in Video.objects.filter(level_id__in=level_ids).order_by('order', 'id').values('id', 'title', 'level_id', 'order', 'duration'):
+        videos_by_level[video['level_id']].append(video)
+    # The same position order as completion.video_orders(), from the rows
+    # already read, so a cold layout cache costs no extra queries.
+    orders = {
+        course_id: [video['id'] for level in levels_by_course[course_id] for video in videos_by_level[level['id']]]
+        for course_id in course_ids
+    }
+    completed = set().union(*completion.completed_by_enrollment(enrollments, orders).values())
+    progress = level_progress_map(user, level_ids)
+
+    quiz_course = Coalesce('quiz__level__course_id', 'quiz__video__level__course_id')
+    recent_quizzes = _recent_attempts(UserQuizAttempt.objects.filter(user=user), quiz_course, course_ids, 'quiz_id')
+    recent_exams = _recent_attempts(UserExamAttempt.objects.filter(user=user), F('exam__level__course_id'), course_ids, 'exam_id')
+
+    courses = []
+    for enrollment in enrollments:
+        course = enrollment.course
+        levels = []
+        next_video = None
+        for level in levels_by_course[course.id]:
+            videos = videos_by_level[level['id']]
+            done = sum(1 for video in videos if video['id'] in completed)
+            # Same rule as unlocks.is_level_unlocked().
+            is_locked = enrollment.unlocked_order is None or level['order'] > enrollment.unlocked_order
+            if next_video is None and not is_locked:
+                # Videos unlock sequentially, so the first unfinished one is next.
+                next_video = next((video for video in videos if video['id'] not in completed), None)
+            levels.append({
+                'id': level['id'],
+                'name': level['name'],
+                'order': level['order'],
+                'is_locked': is_locked,
+                'progress_percentage': progress[level['id']],
+                'videos_total': len(videos),
+                'videos_completed': done,
+            })
+        courses.append({
+            'id': course.id,
+            'title': course.title,
+            'enrolled_at': enrollment.enrolled_at,
+            'levels': levels,
+            'next_video': next_video,
+            'recent_quiz_attempts': recent_quizzes[course.id],
+            'recent_exam_attempts': recent_exams[course.id],
+        })
+    return {'courses': courses}
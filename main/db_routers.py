@@ -0,0 +1,54 @@
+# db_routers.py
+"""
+Send reads from read-only views to replica databases.
+
+Views opt in with ReplicaReadMixin, which marks the request's safe methods
+as replica reads; everything else, and every write, uses "default". Only
+views that can tolerate replication lag should opt in (catalog listings,
+search), not ones that read back what the user just wrote.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def __init__(self, replicas=None):
+        if replicas is None:
+            replicas = [alias for alias in settings.DATABASES if alias.startswith('replica')]
+        self.replicas = list(replicas)
+
+    def db_for_read(self, model, **hints):
+        if self.replicas and _replica_reads.get():
+            return random.choice(self.replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+class ReplicaReadMixin:
+    """For DRF views: GET, HEAD and OPTIONS read from a replica when one is configured."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            with replica_reads():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
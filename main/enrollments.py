@@ -0,0 +1,109 @@
+# enrollments.py
+"""
+Bulk cohort enrollment.
+
+Users are looked up by username or email in one query per chunk, existing
+enrollments are found with one query per (course, chunk), and the rest are
+inserted with bulk_create(ignore_conflicts=True) in a transaction per chunk,
+so a cohort of thousands costs a handful of queries per thousand users. The
+unique (user, course) constraint makes concurrent runs safe.
+
+bulk_create() does not send post_save, so the course's enrollments_count and
+the enrolled users' dashboard caches are updated here.
+"""
+import csv
+import io
+import re
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import counters, unlocks
+from .dashboard import invalidate_dashboards
+from .models import Enrollment, User
+
+CHUNK_SIZE = 1000
+CSV_COLUMNS = ('username', 'email', 'user')
+
+
+def parse_identifiers(value):
+    """Split a comma/whitespace separated string, or a list of strings, into identifiers."""
+    if isinstance(value, str):
+        value = re.split(r'[\s,;]+', value)
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def identifiers_from_csv(file):
+    """
+    Read identifiers from an uploaded CSV: the `username`, `email` or `user`
+    column when the file has a header, otherwise the first column.
+    """
+    content = file.read()
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    rows = [row for row in csv.reader(io.StringIO(content)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in CSV_COLUMNS if name in header), None)
+    if column is None:
+        column = 0
+    else:
+        rows = rows[1:]
+    return parse_identifiers([row[column] for row in rows if len(row) > column])
+
+
+def resolve_users(identifiers):
+    """
+    Return ({identifier: user_id}, [unknown identifiers]). Anything containing
+    "@" is matched case-insensitively against email, the rest against username.
+    """
+    identifiers = list(dict.fromkeys(identifiers))
+    found = {}
+    for start in range(0, len(identifiers), CHUNK_SIZE):
+        chunk = identifiers[start:start + CHUNK_SIZE]
+        emails = {identifier.lower(): identifier for identifier in chunk if '@' in identifier}
+        usernames = [identifier for identifier in chunk if '@' not in identifier]
+        found.update(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        if emails:
+            rows = (
+                User.objects.annotate(email_lower=Lower('email'))
+                .filter(email_lower__in=list(emails))
+                .order_by('id')
+                .values_list('email_lower', 'id')
+            )
+            for email, user_id in rows:
+                # Emails aren't unique; the oldest account wins.
+                found.setdefault(emails[email], user_id)
+    return found, [identifier for identifier in identifiers if identifier not in found]
+
+
+def enroll_users(user_ids, course_ids, chunk_size=CHUNK_SIZE):
+    """
+    Enroll every user in every course. Returns {course_id: {'created': n,
+    'skipped': n}}, where skipped users were already enrolled.
+    """
+    user_ids = sorted(set(user_ids))
+    report = {}
+    for course_id in dict.fromkeys(course_ids):
+        first_order = unlocks.first_level_order(course_id)
+        created = skipped = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            with transaction.atomic():
+                existing = set(
+                    Enrollment.objects.filter(course_id=course_id, user_id__in=chunk).values_list('user_id', flat=True)
+                )
+                new = [user_id for user_id in chunk if user_id not in existing]
+                Enrollment.objects.bulk_create(
+                    [Enrollment(user_id=user_id, course_id=course_id, unlocked_order=first_order) for user_id in new],
+                    ignore_conflicts=True,
+                )
+                # Rows a concurrent request inserted in the meantime were ignored, not created.
+                inserted = Enrollment.objects.filter(course_id=course_id, user_id__in=chunk).count() - len(existing)
+                counters.adjust(course_id, enrollments_count=inserted)
+            invalidate_dashboards(new)
+            created += inserted
+            skipped += len(chunk) - inserted
+        report[course_id] = {'created': created, 'skipped': skipped}
+    return report
@@ -0,0 +1,227 @@
+# exam_sessions.py
+"""
+Timed exam sessions with buffered answer autosave.
+
+With an in-memory cache (Redis or memcached), autosaves only touch the
+cache: each answer lives under its own (session, question) key, so
+concurrent saves of different questions, from any worker, can't overwrite
+each other. Answers are written to ExamSession.answers at most once per
+AUTOSAVE_FLUSH_INTERVAL seconds. With the default database cache every
+buffered answer would be a write transaction of its own, so autosaves are
+written straight to the session row instead, in one transaction.
+
+Submission grades the saved answers against a cached answer key, so a class
+finishing at the deadline costs one UPDATE and one INSERT per student rather
+than one lookup per answer.
+
+The cache must be shared between workers for answers saved on one worker to
+be graded by another; main/checks.py rejects per-process caches.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExamAnswer, ExamSession, UserExamAttempt
+
+AUTOSAVE_FLUSH_INTERVAL = getattr(settings, 'EXAM_AUTOSAVE_FLUSH_INTERVAL', 15)
+# Drafts outlive the longest exam so they are never evicted mid-session.
+DRAFT_TIMEOUT = getattr(settings, 'EXAM_DRAFT_TIMEOUT', 6 * 60 * 60)
+ANSWER_KEY_TIMEOUT = getattr(settings, 'EXAM_ANSWER_KEY_TIMEOUT', 60 * 60)
+
+
+class SessionClosed(Exception):
+    pass
+
+
+def is_buffered():
+    return not isinstance(caches['default'], DatabaseCache)
+
+
+def draft_key(session_id):
+    return f"exam-session:{session_id}"
+
+
+def answer_cache_key(session_id, question_id):
+    return f"exam-session:{session_id}:answer:{question_id}"
+
+
+def flush_lock_key(session_id):
+    return f"exam-session:{session_id}:flushed"
+
+
+def answer_key_cache_key(exam_id):
+    return f"exam-answer-key:{exam_id}"
+
+
+def invalidate_answer_key(exam_id):
+    cache.delete(answer_key_cache_key(exam_id))
+
+
+def answer_key(exam):
+    """
+    Return (question_count, {question_id: {correct answer ids}}) for `exam`,
+    cached until its questions or answers change.
+    """
+    key = answer_key_cache_key(exam.id)
+    cached = cache.get(key)
+    if cached is None:
+        correct = {}
+        for question_id, answer_id in ExamAnswer.objects.filter(
+            question__exam=exam, is_correct=True
+        ).values_list('question_id', 'id'):
+            correct.setdefault(question_id, set()).add(answer_id)
+        cached = (exam.questions.count(), correct)
+        cache.set(key, cached, ANSWER_KEY_TIMEOUT)
+    return cached
+
+
+def grade(exam, answers):
+    """Score {question_id: answer_id} drafts the same way SubmitExamAPIView does."""
+    total_questions, correct = answer_key(exam)
+    correct_count = sum(
+        1 for question_id, answer_id in answers.items()
+        if answer_id in correct.get(question_id, ())
+    )
+    score = int((correct_count / total_questions) * 100) if total_questions else 0
+    return score, score >= exam.passing_score
+
+
+def start(user, exam):
+    """Return the user's open session for `exam`, starting one if needed."""
+    now = timezone.now()
+    session = ExamSession.objects.filter(
+        user=user, exam=exam, submitted_at__isnull=True, deadline__gt=now,
+    ).order_by('-started_at').first()
+    if session is None:
+        session = ExamSession.objects.create(
+            user=user, exam=exam, deadline=now + timedelta(minutes=exam.time_limit_minutes),
+        )
+    return session
+
+
+def _draft(session):
+    return {
+        'user_id': session.user_id,
+        'exam_id': session.exam_id,
+        'deadline': session.deadline,
+        'submitted': session.submitted_at is not None,
+        'question_ids': list(session.exam.questions.values_list('id', flat=True)),
+    }
+
+
+def _stored(answers):
+    return {str(question_id): answer_id for question_id, answer_id in answers.items()}
+
+
+def _loaded(stored):
+    return {int(question_id): answer_id for question_id, answer_id in stored.items()}
+
+
+def load(session_id):
+    """
+    Return the session's cached state, with its saved answers under
+    'answers'. Buffered answers come from the cache, reading the row only on
+    a cache miss; unbuffered ones from the row.
+    """
+    key = draft_key(session_id)
+    buffered = is_buffered()
+    draft = cache.get(key)
+    if draft is None:
+        session = ExamSession.objects.select_related('exam').filter(pk=session_id).first()
+        if session is None:
+            return None
+        draft = _draft(session)
+        if buffered and not draft['submitted']:
+            # add() so answers saved since the last flush aren't overwritten
+            # with older flushed ones.
+            for question_id, answer_id in session.answers.items():
+                cache.add(answer_cache_key(session_id, int(question_id)), answer_id, DRAFT_TIMEOUT)
+            cache.add(flush_lock_key(session_id), True, AUTOSAVE_FLUSH_INTERVAL)
+        cache.set(key, draft, DRAFT_TIMEOUT)
+    if not buffered:
+        draft['answers'] = _loaded(ExamSession.objects.filter(pk=session_id).values_list('answers', flat=True).get())
+        return draft
+    keys = {answer_cache_key(session_id, question_id): question_id for question_id in draft['question_ids']}
+    draft['answers'] = {keys[key]: answer_id for key, answer_id in cache.get_many(keys).items()}
+    return draft
+
+
+def flush(session_id, answers):
+    ExamSession.objects.filter(pk=session_id, submitted_at__isnull=True).update(
+        answers=_stored(answers), saved_at=timezone.now(),
+    )
+
+
+def autosave(session_id, draft, answers):
+    """
+    Save `answers`; answers to questions not in the exam are dropped.
+    Buffered, they go under one cache key per question and the session's
+    answers are written through at most once per AUTOSAVE_FLUSH_INTERVAL,
+    whichever worker gets there first. Otherwise they are merged into the
+    session row in one transaction.
+    """
+    if draft['submitted'] or timezone.now() >= draft['deadline']:
+        raise SessionClosed()
+    question_ids = set(draft['question_ids'])
+    answers = {question_id: answer_id for question_id, answer_id in answers.items() if question_id in question_ids}
+    if not is_buffered():
+        with transaction.atomic():
+            # Locked so concurrent saves of different questions are merged.
+            stored = (
+                ExamSession.objects.select_for_update()
+                .filter(pk=session_id, submitted_at__isnull=True)
+                .values_list('answers', flat=True).first()
+            )
+            if stored is None:
+                raise SessionClosed()
+            ExamSession.objects.filter(pk=session_id).update(
+                answers={**stored, **_stored(answers)}, saved_at=timezone.now(),
+            )
+        return
+    cache.set_many(
+        {answer_cache_key(session_id, question_id): answer_id for question_id, answer_id in answers.items()},
+        DRAFT_TIMEOUT,
+    )
+    if cache.add(flush_lock_key(session_id), True, AUTOSAVE_FLUSH_INTERVAL):
+        flush(session_id, load(session_id)['answers'])
+
+
+def submit(session):
+    """
+    Grade the buffered answers, close the session and record the attempt.
+    Returns (score, passed), or raises SessionClosed if the session was
+    already submitted. Answers saved after the deadline were refused by
+    autosave, so a late submit still grades what was in by the deadline.
+    """
+    draft = load(session.id)
+    score, passed = grade(session.exam, draft['answers'])
+    now = timezone.now()
+    with transaction.atomic():
+        # The conditional update is the state flip: only one submit wins.
+        closed = ExamSession.objects.filter(pk=session.pk, submitted_at__isnull=True).update(
+            answers=_stored(draft['answers']), saved_at=now, submitted_at=now, score=score, passed=passed,
+        )
+        if not closed:
+            raise SessionClosed()
+        UserExamAttempt.objects.create(user_id=session.user_id, exam_id=session.exam_id, score=score, passed=passed)
+    keys = [draft_key(session.id)]
+    if is_buffered():
+        keys.append(flush_lock_key(session.id))
+        keys += [answer_cache_key(session.id, question_id) for question_id in draft['question_ids']]
+    cache.delete_many(keys)
+    return score, passed
+
+
+def parse_answers(data):
+    """Turn [{"question_id": X, "answer_id": Y}, ...] into {X: Y}, skipping junk."""
+    answers = {}
+    for ans in data if isinstance(data, list) else []:
+        try:
+            answers[int(ans.get('question_id'))] = int(ans.get('answer_id'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return answers
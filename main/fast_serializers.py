@@ -0,0 +1,87 @@
+# fast_serializers.py
+"""
+Read-only serialization for hot list endpoints.
+
+Builds response dicts straight from .values() rows instead of instantiating
+models and serializer fields per row. Each function returns exactly what the
+matching ModelSerializer in serializers.py would, and the equivalence is
+covered by tests; keep both in step when fields change.
+"""
+from rest_framework import serializers
+
+from .models import Video
+from .progress import level_progress_map
+
+# Field instances are only used for their to_representation() formatting.
+_datetime = serializers.DateTimeField()
+
+
+def _file_url(storage, name, request=None):
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _optional(cast, value):
+    return None if value is None else cast(value)
+
+
+# Mirrors CourseSerializer.
+def serialize_courses(queryset):
+    to_datetime = _datetime.to_representation
+    return [
+        {
+            'id': pk,
+            'title': title,
+            'description': description,
+            'created_at': to_datetime(created_at),
+            'levels_count': levels_count,
+            'videos_count': videos_count,
+            'quizzes_count': quizzes_count,
+            'enrollments_count': enrollments_count,
+        }
+        for pk, title, description, created_at, levels_count, videos_count, quizzes_count, enrollments_count
+        in queryset.values_list(
+            'id', 'title', 'description', 'created_at',
+            'levels_count', 'videos_count', 'quizzes_count', 'enrollments_count',
+        )
+    ]
+
+
+# Mirrors VideoSerializer.
+def serialize_videos(queryset, request=None):
+    storage = Video._meta.get_field('video_file').storage
+    return [
+        {
+            'id': pk,
+            'title': title,
+            'level': level_id,
+            'order': order,
+            'video_file': _file_url(storage, video_file, request),
+            'duration': _optional(float, duration),
+            'file_size': _optional(int, file_size),
+        }
+        for pk, title, level_id, order, video_file, duration, file_size
+        in queryset.values_list('id', 'title', 'level_id', 'order', 'video_file', 'duration', 'file_size')
+    ]
+
+
+# Mirrors CourseLevelProgressSerializer.
+def serialize_level_progress(queryset, user):
+    rows = list(queryset.values_list('id', 'course_id', 'name', 'order', 'videos_count', 'quizzes_count'))
+    progress = level_progress_map(user, [row[0] for row in rows])
+    return [
+        {
+            'id': pk,
+            'course': course_id,
+            'name': name,
+            'order': order,
+            'videos_count': videos_count,
+            'quizzes_count': quizzes_count,
+            'progress_percentage': progress[pk],
+        }
+        for pk, course_id, name, order, videos_count, quizzes_count in rows
+    ]
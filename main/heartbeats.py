@@ -0,0 +1,174 @@
+# heartbeats.py
+"""
+Write-behind buffer for video playback heartbeats.
+
+Clients report their playback position every few seconds while a video is
+playing. Writing each heartbeat straight to the database would cost one write
+per viewer per interval, so positions are buffered in-process and flushed in
+coalesced batches that keep only the last position per (user, video).
+
+Each worker flushes its own buffer from a background thread every
+VIDEO_HEARTBEAT_FLUSH_INTERVAL seconds while it holds positions, so a viewer
+who stops sending heartbeats loses at most that much on a crash. Positions
+stay in process memory until then: with the default database cache, writing
+them to the shared cache would cost a write transaction per heartbeat again.
+A request handled by another worker sees the last flushed position, at most
+one interval old. Completion markers, written once per video, go to the
+shared cache so every worker stops re-completing the video.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import completion
+from .dashboard import invalidate_dashboard
+from .models import UserVideoProgress
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes, and the buffer size that forces an early flush.
+FLUSH_INTERVAL = getattr(settings, 'VIDEO_HEARTBEAT_FLUSH_INTERVAL', 10)
+MAX_BUFFERED = getattr(settings, 'VIDEO_HEARTBEAT_MAX_BUFFERED', 1000)
+# Fraction of the video that has to be watched before it counts as completed.
+COMPLETION_THRESHOLD = getattr(settings, 'VIDEO_COMPLETION_THRESHOLD', 0.9)
+# How long completion markers are remembered; later heartbeats past the
+# threshold just re-mark the video completed.
+COMPLETED_TIMEOUT = 24 * 60 * 60
+
+
+def is_past_threshold(position, duration):
+    return bool(duration) and position >= duration * COMPLETION_THRESHOLD
+
+
+def completed_key(user_id, video_id):
+    return f"heartbeat-completed:{user_id}:{video_id}"
+
+
+def write_positions(pending):
+    """
+    Persist a {(user_id, video_id): (position, reported_at)} mapping with one
+    upsert, so a concurrent flush or completion can't create a duplicate row.
+    """
+    UserVideoProgress.objects.bulk_create(
+        [
+            UserVideoProgress(user_id=user_id, video_id=video_id, position=position, position_updated_at=reported_at)
+            for (user_id, video_id), (position, reported_at) in pending.items()
+        ],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['user', 'video'],
+        update_fields=['position', 'position_updated_at'],
+    )
+
+
+class HeartbeatBuffer:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_buffered=MAX_BUFFERED):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+
+    def record(self, user_id, video_id, position):
+        reported_at = timezone.now()
+        with self._lock:
+            self._pending[(user_id, video_id)] = (position, reported_at)
+            due = len(self._pending) >= self.max_buffered
+            if self._thread is None or not self._thread.is_alive():
+                # Not inherited across a fork, hence the is_alive() check.
+                self._thread = threading.Thread(target=self._run, name='heartbeat-flusher', daemon=True)
+                self._thread.start()
+        if due:
+            self.flush()
+
+    def get(self, user_id, video_id):
+        with self._lock:
+            entry = self._pending.get((user_id, video_id))
+        return entry[0] if entry else None
+
+    def is_completed(self, user_id, video_id):
+        return bool(cache.get(completed_key(user_id, video_id)))
+
+    def mark_completed(self, user_id, video_id):
+        with self._lock:
+            self._pending.pop((user_id, video_id), None)
+        cache.set(completed_key(user_id, video_id), True, COMPLETED_TIMEOUT)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            # Keep a newer position another worker has already flushed.
+            stored = UserVideoProgress.objects.filter(
+                user_id__in={user_id for user_id, _ in pending},
+                video_id__in={video_id for _, video_id in pending},
+                position_updated_at__isnull=False,
+            ).values_list('user_id', 'video_id', 'position_updated_at')
+            newer = {(user_id, video_id) for user_id, video_id, updated_at in stored
+                     if (user_id, video_id) in pending and updated_at > pending[user_id, video_id][1]}
+            pending = {key: value for key, value in pending.items() if key not in newer}
+            if pending:
+                write_positions(pending)
+        except Exception:
+            # Re-queue whatever has not been superseded by a newer heartbeat.
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+            raise
+        return len(pending)
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Could not flush buffered video heartbeats.")
+                with self._lock:
+                    # Checked under the lock record() starts us with, so no
+                    # position is left without a flusher.
+                    if not self._pending:
+                        self._thread = None
+                        return
+        finally:
+            connection.close()
+
+
+buffer = HeartbeatBuffer()
+
+
+def complete_video(user, video, position):
+    """
+    Mark a video completed from a heartbeat, the same way CompleteVideoAPIView
+    does, and stop buffering positions for it.
+    """
+    with transaction.atomic():
+        progress, created = UserVideoProgress.objects.get_or_create(user=user, video=video)
+        progress.is_completed = True
+        progress.completed_at = timezone.now()
+        progress.position = position
+        progress.position_updated_at = progress.completed_at
+        progress.save()
+        completion.mark_completed(user.id, video.id)
+    buffer.mark_completed(user.id, video.id)
+    invalidate_dashboard(user.id)
+    return progress
+
+
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception("Could not flush buffered video heartbeats on exit.")
+
+
+atexit.register(_flush_at_exit)
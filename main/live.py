@@ -0,0 +1,318 @@
+# live.py
+"""
+Live exam monitoring over Server-Sent Events.
+
+Observers subscribe to an exam or a whole course and receive every new
+UserExamAttempt (score, pass/fail) followed by the running pass-rate, so
+instructors no longer refresh the UserExamAttemptAdmin changelist. A new
+connection starts with a snapshot (the aggregate and the latest attempts);
+a reconnect sending Last-Event-ID gets the attempts it missed instead.
+
+All observers in a process share one broker. The broker is the in-process
+fan-out plus an event source, chosen by EXAM_EVENT_BROKER (a dotted path):
+
+- PollingBroker (default) runs one thread per process that reads new attempt
+  rows once every EXAM_STREAM_POLL_SECONDS, however many observers there are.
+  Attempts submitted by any process, including the WSGI workers, show up.
+- LocalBroker pushes attempts as they commit, with no polling, but only sees
+  submissions made by its own process: use it when one ASGI process serves
+  the whole API.
+
+The stream is an async view and needs the ASGI application (VWBE.asgi),
+which the Procfile's `live` process serves with uvicorn on LIVE_PORT (8001
+by default). The proxy in front sends the .../live/ URLs there and
+everything else to the gunicorn `web` process, which answers them with 501.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max, Q, Sum
+from django.utils.module_loading import import_string
+
+from .models import ExamAttemptSummary, UserExamAttempt
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = getattr(settings, 'EXAM_STREAM_POLL_SECONDS', 1.0)
+KEEPALIVE_SECONDS = getattr(settings, 'EXAM_STREAM_KEEPALIVE_SECONDS', 15)
+QUEUE_SIZE = 1000
+RECENT_ATTEMPTS = 20
+REPLAY_LIMIT = 500
+
+EXAM, COURSE = 'exam', 'course'
+# Filter on UserExamAttempt (and ExamAttemptSummary) for each kind of topic.
+TOPIC_FILTERS = {EXAM: 'exam_id', COURSE: 'exam__level__course_id'}
+
+
+def topic(kind, object_id):
+    return f"{kind}:{object_id}"
+
+
+def event_topics(event):
+    return [topic(EXAM, event['exam']), topic(COURSE, event['course'])]
+
+
+def attempt_events(queryset):
+    rows = queryset.values(
+        'id', 'user_id', 'user__username', 'exam_id', 'exam__level_id', 'exam__level__course_id',
+        'score', 'passed', 'attempted_at',
+    )
+    return [
+        {
+            'attempt': row['id'],
+            'user': row['user_id'],
+            'username': row['user__username'],
+            'exam': row['exam_id'],
+            'level': row['exam__level_id'],
+            'course': row['exam__level__course_id'],
+            'score': row['score'],
+            'passed': row['passed'],
+            'attempted_at': row['attempted_at'].isoformat(),
+        }
+        for row in rows
+    ]
+
+
+# ----- Fan-out -----
+
+class Subscription:
+    """One observer's queue. put() may be called from any thread."""
+
+    def __init__(self, broker, topics, loop):
+        self.broker = broker
+        self.topics = topics
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        # The latest attempt id when the observer's snapshot was read.
+        self.after_id = None
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The observer's event loop has shut down.
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            # A stalled observer loses its oldest events rather than holding memory.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """In-process fan-out from one event source to every subscribed observer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, topics, loop):
+        subscription = Subscription(self, topics, loop)
+        with self._lock:
+            for name in topics:
+                self._subscribers[name].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for name in subscription.topics:
+                self._subscribers[name].discard(subscription)
+                if not self._subscribers[name]:
+                    del self._subscribers[name]
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = set().union(*(self._subscribers.get(name, ()) for name in event_topics(event)))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def attempts_created(self, attempt_ids):
+        """Called after new UserExamAttempt rows commit in this process."""
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    def attempts_created(self, attempt_ids):
+        if not self.has_subscribers():
+            return
+        for event in attempt_events(UserExamAttempt.objects.filter(pk__in=attempt_ids).order_by('id')):
+            self.publish(event)
+
+
+class PollingBroker(Broker):
+    def __init__(self, interval=None):
+        super().__init__()
+        self.interval = POLL_SECONDS if interval is None else interval
+        self._thread = None
+
+    def attempts_created(self, attempt_ids):
+        # The polling thread picks them up.
+        pass
+
+    def subscribe(self, topics, loop):
+        subscription = super().subscribe(topics, loop)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='exam-event-poller', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def _start_id(self):
+        """Where polling starts: the oldest subscriber snapshot, or None until every snapshot is read."""
+        after_ids = [subscription.after_id for subscriptions in self._subscribers.values() for subscription in subscriptions]
+        return None if None in after_ids else min(after_ids)
+
+    def _run(self):
+        try:
+            # Seeded from the snapshots rather than the latest attempt, so an
+            # attempt committed between a snapshot and the first poll is sent.
+            last_id = None
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    # Checked under the lock subscribe() starts us with, so no
+                    # observer is left without a poller.
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                    if last_id is None:
+                        last_id = self._start_id()
+                if last_id is None:
+                    continue
+                events = attempt_events(UserExamAttempt.objects.filter(id__gt=last_id).order_by('id')[:REPLAY_LIMIT])
+                for event in events:
+                    self.publish(event)
+                if events:
+                    last_id = events[-1]['attempt']
+        except Exception:
+            logger.exception("Exam event poller stopped")
+            with self._lock:
+                self._thread = None
+        finally:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'EXAM_EVENT_BROKER', 'main.live.PollingBroker'))()
+
+
+# ----- Aggregates -----
+
+def aggregate(kind, object_id, up_to_id=None):
+    """Attempts and passes so far, including ones compacted into ExamAttemptSummary."""
+    attempts = UserExamAttempt.objects.filter(**{TOPIC_FILTERS[kind]: object_id})
+    if up_to_id is not None:
+        attempts = attempts.filter(id__lte=up_to_id)
+    live = attempts.aggregate(attempts=Count('id'), passed=Count('id', filter=Q(passed=True)))
+    archived = ExamAttemptSummary.objects.filter(**{TOPIC_FILTERS[kind]: object_id}).aggregate(
+        attempts=Sum('archived_attempts'), passed=Sum('archived_passes'),
+    )
+    return with_pass_rate({
+        'attempts': live['attempts'] + (archived['attempts'] or 0),
+        'passed': live['passed'] + (archived['passed'] or 0),
+    })
+
+
+def with_pass_rate(totals):
+    totals['pass_rate'] = round(totals['passed'] / totals['attempts'], 4) if totals['attempts'] else None
+    return totals
+
+
+def latest_attempt_id():
+    return UserExamAttempt.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def initial_state(kind, object_id, last_event_id=None):
+    """
+    Return (last attempt id covered, aggregate, events to send first): the
+    missed attempts after `last_event_id`, or else the most recent ones.
+    """
+    attempts = UserExamAttempt.objects.filter(**{TOPIC_FILTERS[kind]: object_id})
+    up_to_id = attempts.aggregate(last=Max('id'))['last'] or 0
+    if last_event_id is not None:
+        events = attempt_events(attempts.filter(id__gt=last_event_id, id__lte=up_to_id).order_by('id')[:REPLAY_LIMIT])
+    else:
+        events = attempt_events(attempts.filter(id__lte=up_to_id).order_by('-id')[:RECENT_ATTEMPTS])[::-1]
+    return up_to_id, aggregate(kind, object_id, up_to_id), events
+
+
+# ----- Server-Sent Events -----
+
+def authenticate(request):
+    """
+    The user for the request's JWT, or None. EventSource can't send headers,
+    so the access token may also come as ?access_token=.
+    """
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken
+
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else request.GET.get('access_token', '').encode() or None
+    if raw_token is None:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken):
+        return None
+
+
+def sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+async def stream(kind, object_id, last_event_id=None):
+    broker = get_broker()
+    # Subscribe first so nothing committed while the snapshot is read is lost.
+    subscription = broker.subscribe([topic(kind, object_id)], asyncio.get_running_loop())
+    try:
+        # Read before the snapshot, so polling starts at the table's tail
+        # rather than at this topic's last attempt, which may be far behind.
+        after_id = await sync_to_async(latest_attempt_id)()
+        up_to_id, totals, events = await sync_to_async(initial_state)(kind, object_id, last_event_id)
+        subscription.after_id = after_id
+        if last_event_id is None:
+            yield sse('snapshot', {'aggregate': totals, 'recent': events}, up_to_id)
+        else:
+            for event in events:
+                yield sse('attempt', event, event['attempt'])
+            yield sse('aggregate', totals)
+
+        while True:
+            try:
+                event = await subscription.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event['attempt'] <= up_to_id:
+                continue
+            totals['attempts'] += 1
+            totals['passed'] += event['passed']
+            yield sse('attempt', event, event['attempt'])
+            yield sse('aggregate', with_pass_rate(totals))
+    finally:
+        subscription.close()
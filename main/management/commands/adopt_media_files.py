@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from main import storage
+from main.models import User, Video
+
+
+class Command(BaseCommand):
+    help = "Move video files and profile photos stored before content addressing into the blob store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true',
+                            help="Leave the original files in place once no row references them.")
+
+    def handle(self, *args, **options):
+        sources = [
+            (Video, 'video_file', Video.objects.all()),
+            (User, 'profile_photo', User.all_objects.all()),
+        ]
+        adopted = missing = 0
+        originals = set()
+        for model, field, queryset in sources:
+            rows = (
+                queryset.exclude(**{f'{field}__startswith': f'{storage.BLOB_DIR}/'}).exclude(**{field: ''})
+                .exclude(**{f'{field}__isnull': True}).order_by('pk').values_list('pk', field)
+            )
+            for pk, name in rows.iterator():
+                if not storage.blob_storage.exists(name):
+                    self.stdout.write(self.style.WARNING(f"{model.__name__} {pk}: {name} is missing, skipped."))
+                    missing += 1
+                    continue
+                with storage.blob_storage.open(name, 'rb') as f:
+                    blob_name = storage.blob_storage.save(name, f)
+                # Only if the row still points at the old file.
+                if model._base_manager.filter(pk=pk, **{field: name}).update(**{field: blob_name}):
+                    storage.add_reference(blob_name)
+                    adopted += 1
+                    originals.add(name)
+
+        removed = 0
+        if not options['keep_originals']:
+            for name in originals - storage.referenced_names(originals):
+                storage.blob_storage.delete(name)
+                removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Adopted {adopted} file(s) ({missing} missing); removed {removed} original(s)."
+        ))
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from main.dashboard import invalidate_dashboards
+from main.models import CourseLevel, Enrollment, UserExamAttempt
+from main.unlocks import frontier_for
+
+
+class Command(BaseCommand):
+    help = "Derive every enrollment's level unlock frontier from historical exam attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        level_orders = defaultdict(list)
+        for course_id, order in CourseLevel.objects.order_by('course_id', 'order').values_list('course_id', 'order'):
+            level_orders[course_id].append(order)
+
+        scanned = changed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Enrollment.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'user_id', 'course_id', 'unlocked_order')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            max_passed = {
+                (row['user_id'], row['exam__level__course_id']): row['max_order']
+                for row in UserExamAttempt.objects
+                .filter(passed=True, user_id__in={enrollment.user_id for enrollment in batch})
+                .values('user_id', 'exam__level__course_id')
+                .annotate(max_order=Max('exam__level__order'))
+            }
+            updates = []
+            for enrollment in batch:
+                frontier = frontier_for(
+                    level_orders[enrollment.course_id],
+                    max_passed.get((enrollment.user_id, enrollment.course_id)),
+                )
+                if frontier != enrollment.unlocked_order:
+                    enrollment.unlocked_order = frontier
+                    updates.append(enrollment)
+            scanned += len(batch)
+            changed += len(updates)
+            if updates and not options['dry_run']:
+                with transaction.atomic():
+                    Enrollment.objects.bulk_update(updates, ['unlocked_order'])
+                invalidate_dashboards({enrollment.user_id for enrollment in updates})
+
+        verb = "Would update" if options['dry_run'] else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} enrollment(s). {verb} {changed}."))
@@ -0,0 +1,115 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main import completion
+from main.models import Course, CourseLevel, Enrollment, User, UserVideoProgress, Video
+
+
+class Command(BaseCommand):
+    help = "Compare completion lookups from UserVideoProgress rows with the enrollment completion bitmaps."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--levels', type=int, default=10)
+        parser.add_argument('--videos-per-level', type=int, default=30)
+        parser.add_argument('--lookups', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def per_lookup(self, lookups, func):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            for lookup in lookups:
+                func(*lookup)
+            seconds = time.perf_counter() - start
+        return seconds / len(lookups), queries / len(lookups)
+
+    def report(self, name, lookups, func, note=''):
+        seconds, queries = self.per_lookup(lookups, func)
+        self.stdout.write(f"{name:22} {seconds * 1e6:8.1f}us/lookup  {queries:.1f} queries/lookup{note}")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Seed synthetic rows and roll them back so the database is untouched.
+        with transaction.atomic():
+            course = Course.objects.create(title='Benchmark', description='')
+            levels = CourseLevel.objects.bulk_create(
+                CourseLevel(course=course, name=f'Level {i}', order=i) for i in range(options['levels'])
+            )
+            videos = Video.objects.bulk_create(
+                Video(title=f'Video {i}', level=level, order=i, video_file=f'videos/{i}.mp4')
+                for level in levels for i in range(options['videos_per_level'])
+            )
+            users = User.objects.bulk_create(
+                User(username=f'bench-completion-{i}') for i in range(options['users'])
+            )
+            Enrollment.objects.bulk_create(Enrollment(user=user, course=course) for user in users)
+            progress = []
+            for user in users:
+                # Each user is some way through the course, in order.
+                watched = rng.randrange(len(videos) + 1)
+                progress.extend(
+                    UserVideoProgress(user=user, video=video, is_completed=True) for video in videos[:watched]
+                )
+            UserVideoProgress.objects.bulk_create(progress, batch_size=5000)
+            self.stdout.write(
+                f"{len(users)} users, {len(videos)} videos, {len(progress)} completed UserVideoProgress rows"
+            )
+
+            start = time.perf_counter()
+            completion.rebuild_course(course.id)
+            self.stdout.write(f"rebuild_course: {time.perf_counter() - start:.2f}s")
+            sizes = [len(bytes(b)) for b in Enrollment.objects.filter(course=course).values_list('completed_videos', flat=True)]
+            self.stdout.write(f"bitmap size: max {max(sizes)} bytes, mean {sum(sizes) / len(sizes):.1f} bytes")
+
+            lookups = [(rng.choice(users).id, rng.choice(levels).id) for _ in range(options['lookups'])]
+
+            def load_enrollment(user_id):
+                # As level_access() loads it for the level lock check.
+                return (
+                    Enrollment.objects.filter(user_id=user_id, course=course).select_related('course')
+                    .only('id', 'user_id', 'course_id', 'unlocked_order', 'completed_videos', 'completion_version',
+                          'course__video_layout_version')
+                    .first()
+                )
+
+            def level_rows(user_id, level_id):
+                return set(
+                    UserVideoProgress.objects
+                    .filter(user_id=user_id, video__level_id=level_id, is_completed=True)
+                    .values_list('video_id', flat=True)
+                )
+
+            def course_rows(user_id, level_id):
+                return set(
+                    UserVideoProgress.objects
+                    .filter(user_id=user_id, video__level__course_id=course.id, is_completed=True)
+                    .values_list('video_id', flat=True)
+                )
+
+            enrollments = {user.id: load_enrollment(user.id) for user in users}
+            self.stdout.write("Completed-video set, given the enrollment row the view already holds:")
+            self.report('rows, one level', lookups, level_rows)
+            self.report('rows, whole course', lookups, course_rows)
+            self.report('bitmap', lookups, lambda user_id, level_id: completion.completed_video_ids(enrollments[user_id]))
+
+            self.stdout.write("Lock check end to end, including loading the enrollment:")
+            self.report('rows', lookups, lambda user_id, level_id: (load_enrollment(user_id), level_rows(user_id, level_id)))
+            self.report('bitmap', lookups, lambda user_id, level_id: completion.completed_video_ids(load_enrollment(user_id)))
+
+            # After a reorder every bitmap is rebuilt once, on its next read.
+            completion.bump_layout(course.id)
+            first_reads = [(user.id, None) for user in users]
+            self.report('bitmap, after reorder', first_reads,
+                        lambda user_id, level_id: completion.completed_video_ids(load_enrollment(user_id)),
+                        ' (first read rebuilds)')
+            transaction.set_rollback(True)
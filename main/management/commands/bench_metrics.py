@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch
+
+from main.metrics import MetricsRegistry
+from main.middleware import MetricsMiddleware
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request overhead of MetricsMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        request = RequestFactory().get('/api/courses/')
+        match = ResolverMatch(lambda request: None, (), {}, url_name='course-list')
+
+        def view(request):
+            request.resolver_match = match
+            return HttpResponse(b'[]')
+
+        # A private registry keeps the benchmark out of the real metrics.
+        import main.middleware
+        original, main.middleware.registry = main.middleware.registry, MetricsRegistry()
+        try:
+            instrumented = MetricsMiddleware(view)
+            timings = {}
+            for name, handler in (('bare', view), ('metrics', instrumented)):
+                for _ in range(min(n, 1000)):
+                    handler(request)
+                start = time.perf_counter()
+                for _ in range(n):
+                    handler(request)
+                timings[name] = (time.perf_counter() - start) / n
+        finally:
+            main.middleware.registry = original
+
+        overhead = timings['metrics'] - timings['bare']
+        self.stdout.write(
+            f"requests={n}  bare={timings['bare'] * 1e6:.2f}us  "
+            f"with metrics={timings['metrics'] * 1e6:.2f}us  overhead={overhead * 1e6:.2f}us/request"
+        )
@@ -0,0 +1,83 @@
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.utils import ConnectionHandler
+
+from main import search
+
+SYLLABLES = "ka lo mi ne ru sa te vo xi za bre clo dra fin gri plo qua sto tri vex".split()
+
+
+class Command(BaseCommand):
+    help = "Measure SQLite FTS5 search latency on a synthetic corpus in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100_000)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--enrolled', type=int, default=10, help="Courses the searching user is enrolled in.")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def sentence(self, rng, length):
+        # Zipf-like word frequencies, as in natural text.
+        return ' '.join(rng.choices(self.words, cum_weights=self.cum_weights, k=length))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = set()
+        while len(words) < options['vocabulary']:
+            words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.words) + 1)))
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        # A private handler so the benchmark never touches the project database.
+        connections = ConnectionHandler({'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}})
+        connection = connections['default']
+        try:
+            backend = search.SQLiteFTSBackend(connection)
+            backend.create()
+            kinds = [search.COURSE, search.VIDEO, search.QUESTION]
+            start = time.perf_counter()
+            connection.set_autocommit(False)
+            batch = []
+            for i in range(options['documents']):
+                batch.append(search.Document(
+                    kinds[i % 3], i, rng.randrange(options['courses']),
+                    self.sentence(rng, 4), self.sentence(rng, 30),
+                ))
+                if len(batch) == 5000:
+                    backend.index(batch)
+                    batch = []
+            backend.index(batch)
+            connection.commit()
+            connection.set_autocommit(True)
+            self.stdout.write(f"Indexed {options['documents']} documents in {time.perf_counter() - start:.1f}s")
+
+            course_ids = rng.sample(range(options['courses']), options['enrolled'])
+            timings = []
+            for _ in range(options['queries']):
+                query = self.sentence(rng, rng.randint(1, 3))
+                start = time.perf_counter()
+                backend.search(query, course_ids, limit=20, offset=0)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+
+            def percentile(p):
+                return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+
+            self.stdout.write(
+                f"queries={len(timings)} enrolled_courses={len(course_ids)} "
+                f"mean={statistics.mean(timings) * 1000:.2f}ms p50={percentile(0.5):.2f}ms "
+                f"p95={percentile(0.95):.2f}ms p99={percentile(0.99):.2f}ms"
+            )
+        finally:
+            connection.close()
+            os.remove(path)
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from main.fast_serializers import serialize_courses, serialize_level_progress, serialize_videos
+from main.models import Course, CourseLevel, Quiz, User, UserQuizAttempt, Video
+from main.serializers import CourseLevelProgressSerializer, CourseSerializer, VideoSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare ModelSerializer and values()-based serialization on list endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderer = JSONRenderer()
+        # Seed synthetic rows and roll them back so the database is untouched.
+        with transaction.atomic():
+            course = Course.objects.create(title='Benchmark', description='')
+            level = CourseLevel.objects.create(course=course, name='Benchmark', order=1)
+            Course.objects.bulk_create(
+                Course(title=f'Course {i}', description='Lorem ipsum ' * 20) for i in range(rows)
+            )
+            Video.objects.bulk_create(
+                Video(title=f'Video {i}', level=level, order=i, video_file=f'videos/{i}.mp4',
+                      duration=600.0, file_size=10_000_000)
+                for i in range(rows)
+            )
+            # Levels with a quiz each, half of them passed by the user.
+            user = User.objects.create(username='bench-serializers')
+            request = RequestFactory().get('/api/courses/1/levels/')
+            request.user = user
+            levels = CourseLevel.objects.bulk_create(
+                CourseLevel(course=course, name=f'Level {i}', order=i + 2, quizzes_count=1) for i in range(rows)
+            )
+            quizzes = Quiz.objects.bulk_create(Quiz(level=level, passing_score=50, order=1) for level in levels)
+            UserQuizAttempt.objects.bulk_create(
+                UserQuizAttempt(user=user, quiz=quiz, score=80, passed=True) for quiz in quizzes[::2]
+            )
+            cases = [
+                ('courses', Course.objects.all(),
+                 lambda qs: CourseSerializer(qs, many=True).data, serialize_courses),
+                ('videos', level.videos.order_by('order'),
+                 lambda qs: VideoSerializer(qs, many=True).data, serialize_videos),
+                ('levels', course.levels.order_by('order'),
+                 lambda qs: CourseLevelProgressSerializer(qs, many=True, context={'request': request}).data,
+                 lambda qs: serialize_level_progress(qs, user)),
+            ]
+            for name, queryset, slow, fast in cases:
+                assert renderer.render(slow(queryset.all())) == renderer.render(fast(queryset.all()))
+                slow_time = self.best_of(repeat, lambda: slow(queryset.all()))
+                fast_time = self.best_of(repeat, lambda: fast(queryset.all()))
+                self.stdout.write(
+                    f"{name:8} rows={queryset.count():6}  ModelSerializer={slow_time * 1000:8.1f}ms  "
+                    f"values()={fast_time * 1000:8.1f}ms  speedup={slow_time / fast_time:5.1f}x"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,55 @@
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+TIMER = (
+    "import time; start = time.perf_counter(); "
+    "import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+class Command(BaseCommand):
+    help = "Measure how long a fresh interpreter takes to import the WSGI application."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='VWBE.wsgi')
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument(
+            '--top', type=int, default=0,
+            help="Also list the N slowest imports from one `python -X importtime` run.",
+        )
+
+    def run(self, *args):
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+
+    def handle(self, *args, **options):
+        module = options['module']
+        timings = [
+            float(self.run('-c', TIMER.format(module=module)).stdout.strip())
+            for _ in range(options['runs'])
+        ]
+        self.stdout.write(
+            f"import {module}: runs={len(timings)} "
+            f"min={min(timings) * 1000:.1f}ms "
+            f"median={statistics.median(timings) * 1000:.1f}ms "
+            f"max={max(timings) * 1000:.1f}ms"
+        )
+
+        if options['top']:
+            stderr = self.run('-X', 'importtime', '-c', f"import {module}").stderr
+            rows = []
+            for line in stderr.splitlines():
+                # import time: self [us] | cumulative | imported package
+                if not line.startswith('import time:') or 'cumulative' in line:
+                    continue
+                self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+                rows.append((int(cumulative_us), int(self_us), name))
+            for cumulative_us, self_us, name in sorted(rows, reverse=True)[:options['top']]:
+                self.stdout.write(f"{cumulative_us / 1000:8.1f}ms cumulative {self_us / 1000:8.1f}ms self  {name}")
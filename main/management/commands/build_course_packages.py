@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from main import packages
+from main.models import Course, Enrollment
+
+
+class Command(BaseCommand):
+    help = (
+        "Build offline packages for courses whose content changed since their last package, "
+        "one per unlock frontier enrolled users are at."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help="Only this course (repeatable).")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('id')
+        if options['course']:
+            courses = courses.filter(id__in=options['course'])
+        for course_id in courses.values_list('id', flat=True):
+            frontiers = (
+                Enrollment.objects.filter(course_id=course_id).order_by('unlocked_order')
+                .values_list('unlocked_order', flat=True).distinct()
+            )
+            for unlocked_order in frontiers:
+                latest = packages.latest_package(course_id, unlocked_order)
+                package = packages.build_package(course_id, unlocked_order)
+                label = f"Course {course_id}, levels up to {unlocked_order}"
+                if latest is not None and latest.pk == package.pk:
+                    self.stdout.write(f"{label}: v{package.version} is up to date.")
+                else:
+                    self.stdout.write(f"{label}: built v{package.version} ({package.size} bytes).")
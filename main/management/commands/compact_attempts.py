@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import compaction
+from main.dashboard import RECENT_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old quiz/exam attempts out of the hot tables, keeping the best and "
+        "latest attempts per (user, quiz/exam) plus archived counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['quiz', 'exam', 'all'], default='all')
+        parser.add_argument(
+            '--keep-latest', type=int, default=RECENT_ATTEMPTS,
+            help="Recent attempts to keep per pair (default: the dashboard's recent-attempt count).",
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help="Users per batch.")
+        parser.add_argument('--to', choices=['table', 'ndjson'], default='table')
+        parser.add_argument('--output-dir', help="Directory for --to ndjson archives.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['keep_latest'] < 1:
+            raise CommandError("--keep-latest must be at least 1.")
+        if options['to'] == 'ndjson':
+            if not options['output_dir']:
+                raise CommandError("--output-dir is required with --to ndjson.")
+            sink = compaction.NDJSONSink(options['output_dir'])
+        else:
+            sink = compaction.TableSink()
+
+        kinds = compaction.KINDS.values() if options['kind'] == 'all' else [compaction.KINDS[options['kind']]]
+
+        def progress(kind, users, archived):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {kind.name}: {users} user(s) scanned, {archived} attempt(s) archived")
+
+        for kind in kinds:
+            users, archived = compaction.compact(
+                kind, sink,
+                keep_latest=options['keep_latest'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                progress=progress,
+            )
+            verb = "would archive" if options['dry_run'] else "archived"
+            self.stdout.write(self.style.SUCCESS(f"{kind.name}: scanned {users} user(s), {verb} {archived} attempt(s)."))
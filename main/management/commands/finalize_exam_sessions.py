@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main import exam_sessions, unlocks
+from main.dashboard import invalidate_dashboards
+from main.models import ExamSession
+
+
+class Command(BaseCommand):
+    help = "Submit exam sessions whose deadline has passed, grading their last saved answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        expired = (
+            ExamSession.objects.filter(submitted_at__isnull=True, deadline__lte=timezone.now())
+            .select_related('user', 'exam__level')
+            .order_by('id')
+        )
+        if options['dry_run']:
+            self.stdout.write(f"Would submit {expired.count()} expired session(s).")
+            return
+
+        submitted = passed_count = 0
+        user_ids = set()
+        for session in expired.iterator():
+            try:
+                score, passed = exam_sessions.submit(session)
+            except exam_sessions.SessionClosed:
+                # Submitted by the student while we were running.
+                continue
+            if passed:
+                unlocks.advance_past(session.user, session.exam.level)
+                passed_count += 1
+            submitted += 1
+            user_ids.add(session.user_id)
+        invalidate_dashboards(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Submitted {submitted} expired session(s); {passed_count} passed."))
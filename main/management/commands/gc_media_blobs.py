@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from main import storage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media blobs that no Video or User references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help="Keep blobs touched within this many hours (default: MEDIA_BLOB_GC_GRACE_HOURS).")
+        parser.add_argument('--recount', action='store_true',
+                            help="First reset every reference count from the Video and User tables.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount'] and not options['dry_run']:
+            drift = storage.fix_reference_counts()
+            for digest, (stored, exact) in sorted(drift.items()):
+                self.stdout.write(f"Blob {digest}: ref_count {stored} -> {exact}")
+
+        deleted, freed, strays = storage.collect_garbage(options['grace_hours'], options['dry_run'])
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} blob(s) ({freed / 1024 / 1024:.1f} MiB) and {strays} stray file(s)."
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from main.media import ingest_video
+from main.models import Video
+
+
+class Command(BaseCommand):
+    help = "Record MP4 metadata and apply faststart to uploaded videos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_ids', nargs='*', type=int, help="Only ingest these videos.")
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Re-ingest videos that already have metadata.",
+        )
+
+    def handle(self, *args, **options):
+        videos = Video.objects.order_by('id')
+        if options['video_ids']:
+            videos = videos.filter(id__in=options['video_ids'])
+        elif not options['all']:
+            videos = videos.filter(file_size__isnull=True)
+
+        count = 0
+        for video in videos.iterator():
+            metadata = ingest_video(video)
+            count += 1
+            self.stdout.write(f"Video {video.id}: {metadata or 'skipped'}")
+        self.stdout.write(self.style.SUCCESS(f"Ingested {count} video(s)."))
@@ -0,0 +1,314 @@
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from main.models import (
+    Course, CourseLevel, ExamAnswer, ExamQuestion, LevelExam, Quiz, QuizAnswer, QuizQuestion, User, Video,
+)
+
+USERNAME = 'loadtest-{}'
+SEED_COURSE = 'Load test course'
+
+
+class Recorder:
+    """Collects (route, status, latency) samples from every virtual user."""
+
+    def __init__(self):
+        self.samples = []
+        self._routes = {}
+
+    def route(self, path):
+        path = path.split('?', 1)[0]
+        if path not in self._routes:
+            try:
+                self._routes[path] = resolve(path).url_name or path
+            except Resolver404:
+                self._routes[path] = path
+        return self._routes[path]
+
+    def record(self, method, path, status, elapsed, ok):
+        self.samples.append((f"{method} {self.route(path)}", status, elapsed, ok))
+
+
+class Client:
+    """One virtual user: a keep-alive connection plus its JWT."""
+
+    def __init__(self, base_url, recorder):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=60)
+        self.recorder = recorder
+        self.token = None
+
+    def request(self, method, path, body=None, expect=(200,)):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.connection.getresponse()
+            status, raw = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            status, raw = 0, b''
+        self.recorder.record(method, path, status, time.perf_counter() - start, status in expect)
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        return status, data
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, body=None, **kwargs):
+        return self.request('POST', path, body or {}, **kwargs)
+
+    def login(self, username, password):
+        status, data = self.post('/api/token/', {'username': username, 'password': password})
+        if status != 200:
+            raise RuntimeError(f"Could not obtain a token for {username} (HTTP {status}).")
+        self.token = data['access']
+
+
+# ----- Scenarios -----
+
+def _pick_answers(questions, rng, correct_rate):
+    answers = []
+    for question in questions:
+        options = question['answers']
+        if not options:
+            continue
+        correct = [answer for answer in options if answer.get('is_correct')]
+        choice = rng.choice(correct) if correct and rng.random() < correct_rate else rng.choice(options)
+        answers.append({'question_id': question['id'], 'answer_id': choice['id']})
+    return answers
+
+
+def browse(client, plan, rng, options):
+    status, courses = client.get('/api/courses/')
+    if status == 200 and courses:
+        course_id = rng.choice(courses)['id']
+        client.get(f'/api/courses/{course_id}/levels/', expect=(200, 403))
+    client.get('/api/me/dashboard/')
+    client.get(f"/api/search/?q={rng.choice(plan['search_terms'])}")
+
+
+def student(client, plan, rng, options):
+    course_id = plan['course_id']
+    client.post(f'/api/courses/{course_id}/enroll/', expect=(201, 400))
+    client.get(f'/api/courses/{course_id}/levels/')
+    for level in plan['levels']:
+        status, videos = client.get(f"/api/levels/{level['id']}/videos/", expect=(200, 403))
+        if status != 200:
+            break
+        for video in videos:
+            client.get(f"/api/videos/{video['id']}/")
+            client.post(f"/api/videos/{video['id']}/heartbeat/", {'position': rng.uniform(0, 60)}, expect=(200, 202))
+            client.post(f"/api/videos/{video['id']}/complete/")
+        for quiz_id in level['quizzes']:
+            status, quiz = client.get(f'/api/quizzes/{quiz_id}/')
+            if status == 200:
+                answers = _pick_answers(quiz['questions'], rng, options['correct_rate'])
+                client.post(f'/api/quizzes/{quiz_id}/submit/', {'answers': answers})
+        if level['has_exam']:
+            sit_exam(client, level['id'], rng, options)
+
+
+def sit_exam(client, level_id, rng, options, expect=(200, 403)):
+    status, exam = client.get(f'/api/levels/{level_id}/exam/', expect=expect)
+    if status == 200:
+        answers = _pick_answers(exam['questions'], rng, options['correct_rate'])
+        client.post(f'/api/levels/{level_id}/exam/submit/', {'answers': answers})
+
+
+def exam_rush(client, plan, rng, options):
+    # Enrolling opens the first level, whose exam every user then sits.
+    client.post(f"/api/courses/{plan['course_id']}/enroll/", expect=(201, 400))
+    # Every virtual user waits here so the whole class submits together.
+    options['barrier'].wait()
+    sit_exam(client, plan['levels'][0]['id'], rng, options, expect=(200,))
+
+
+SCENARIOS = {'browse': browse, 'student': student, 'exam-rush': exam_rush}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent student scenarios against a running server and report "
+        "per-route latency percentiles, throughput and error rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='student')
+        parser.add_argument('--concurrency', default='1,10,50', help="Comma-separated virtual user counts.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds per concurrency level.")
+        parser.add_argument('--course', type=int, help="Course to use (default: the seeded or first course).")
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--seed-users', action='store_true', help="Create missing loadtest-N users.")
+        parser.add_argument('--seed-content', action='store_true', help="Create a load-test course if none exists.")
+        parser.add_argument('--correct-rate', type=float, default=0.8)
+        parser.add_argument('--start-server', action='store_true', help="Start gunicorn on --base-url's port.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        if options['seed_users']:
+            self.seed_users(max(levels), options['password'])
+        if options['seed_content']:
+            self.seed_content()
+        plan = self.build_plan(options['course'])
+
+        server = self.start_server(options['base_url']) if options['start_server'] else None
+        try:
+            for concurrency in levels:
+                recorder, elapsed = self.run_level(concurrency, plan, options)
+                self.report(concurrency, recorder, elapsed)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    # ----- Setup -----
+
+    def seed_users(self, count, password):
+        existing = set(User.objects.filter(username__startswith='loadtest-').values_list('username', flat=True))
+        # Hash once: per-user hashing would dominate seeding time.
+        hashed = make_password(password)
+        User.objects.bulk_create([
+            User(username=USERNAME.format(i), password=hashed)
+            for i in range(count) if USERNAME.format(i) not in existing
+        ])
+
+    def seed_content(self, levels=3, videos=5, questions=5):
+        if Course.objects.filter(title=SEED_COURSE).exists():
+            return
+        course = Course.objects.create(title=SEED_COURSE, description='Synthetic course for load testing.')
+        for level_order in range(1, levels + 1):
+            level = CourseLevel.objects.create(course=course, name=f'Level {level_order}', order=level_order)
+            for video_order in range(1, videos + 1):
+                Video.objects.create(title=f'Lecture {level_order}.{video_order}', level=level,
+                                     order=video_order, video_file='videos/loadtest.mp4', duration=600)
+            quiz = Quiz.objects.create(level=level, passing_score=60, order=1)
+            exam = LevelExam.objects.create(level=level, passing_score=60)
+            for question_order in range(1, questions + 1):
+                question = QuizQuestion.objects.create(quiz=quiz, question_text=f'Quiz question {question_order}',
+                                                       order=question_order)
+                exam_question = ExamQuestion.objects.create(exam=exam, question_text=f'Exam question {question_order}',
+                                                            order=question_order)
+                for option in range(4):
+                    QuizAnswer.objects.create(question=question, answer_text=f'Option {option}', is_correct=option == 0)
+                    ExamAnswer.objects.create(question=exam_question, answer_text=f'Option {option}',
+                                              is_correct=option == 0)
+
+    def build_plan(self, course_id):
+        courses = Course.objects.filter(levels__isnull=False).distinct().order_by('id')
+        if course_id:
+            course = courses.filter(id=course_id).first()
+        else:
+            course = courses.filter(title=SEED_COURSE).first() or courses.first()
+        if course is None:
+            raise CommandError("No course with levels to test against; pass --seed-content.")
+        levels = []
+        for level in course.levels.order_by('order'):
+            levels.append({
+                'id': level.id,
+                'quizzes': list(level.quizzes.order_by('order').values_list('id', flat=True)),
+                'has_exam': LevelExam.objects.filter(level=level).exists(),
+            })
+        terms = [word for word in course.title.split() if len(word) > 2] or ['course']
+        return {'course_id': course.id, 'levels': levels, 'search_terms': terms}
+
+    def start_server(self, base_url):
+        port = urlsplit(base_url).port or 8000
+        env = {**os.environ, 'PORT': str(port)}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'VWBE.wsgi', '--config', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/api/courses/')
+                connection.getresponse().read()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"Server did not start on port {port}.")
+
+    # ----- Running -----
+
+    def run_level(self, concurrency, plan, options):
+        recorder = Recorder()
+        scenario = SCENARIOS[options['scenario']]
+        options = dict(options, barrier=threading.Barrier(concurrency))
+        deadline = time.monotonic() + options['duration']
+        errors = []
+
+        def virtual_user(index):
+            rng = random.Random(options['seed'] * 100_003 + index)
+            client = Client(options['base_url'], recorder)
+            try:
+                client.login(USERNAME.format(index), options['password'])
+                if options['scenario'] == 'exam-rush':
+                    # Once, whatever the duration: every user has to reach the barrier.
+                    scenario(client, plan, rng, options)
+                else:
+                    while time.monotonic() < deadline:
+                        scenario(client, plan, rng, options)
+            except Exception as e:
+                errors.append(e)
+                options['barrier'].abort()
+
+        threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for error in {str(error) for error in errors if not isinstance(error, threading.BrokenBarrierError)}:
+            self.stderr.write(f"Virtual user failed: {error}")
+        return recorder, elapsed
+
+    def report(self, concurrency, recorder, elapsed):
+        by_route = defaultdict(list)
+        for route, status, latency, ok in recorder.samples:
+            by_route[route].append((latency, ok))
+        total = len(recorder.samples)
+        failed = sum(1 for sample in recorder.samples if not sample[3])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"concurrency={concurrency} elapsed={elapsed:.1f}s requests={total} "
+            f"throughput={total / elapsed:.1f} req/s errors={failed} ({failed / total * 100 if total else 0:.1f}%)"
+        ))
+        self.stdout.write(f"{'route':36} {'count':>7} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for route in sorted(by_route):
+            samples = by_route[route]
+            latencies = sorted(latency for latency, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+
+            def percentile(p):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+            self.stdout.write(
+                f"{route:36} {len(samples):7} {errors / len(samples) * 100:6.1f} "
+                f"{percentile(0.50):8.1f} {percentile(0.95):8.1f} {percentile(0.99):8.1f} "
+                f"{len(samples) / elapsed:8.1f}"
+            )
@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import profiling
+
+
+class Command(BaseCommand):
+    help = "List, summarize and diff request profiles captured with the X-Profile header."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Capture directory (default: PROFILE_DIR).")
+        subcommands = parser.add_subparsers(dest='action', required=True)
+        subcommands.add_parser('list', help="List captures, oldest first.")
+        show = subcommands.add_parser('show', help="Summarize one capture.")
+        show.add_argument('capture')
+        show.add_argument('--sort', default='cumulative', help="pstats sort key (cumulative, tottime, calls...).")
+        show.add_argument('--limit', type=int, default=30)
+        diff = subcommands.add_parser('diff', help="Compare two captures of the same endpoint.")
+        diff.add_argument('before')
+        diff.add_argument('after')
+        diff.add_argument('--limit', type=int, default=30)
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        getattr(self, options['action'])(directory, options)
+
+    def list(self, directory, options):
+        captures = profiling.list_captures(directory)
+        if not captures:
+            self.stdout.write("No captures.")
+            return
+        self.stdout.write(f"{'id':24} {'method':6} {'status':>6} {'ms':>9} {'peak KiB':>9}  {'modes':11} path")
+        for meta in captures:
+            peak = meta.get('memory_peak_bytes')
+            self.stdout.write(
+                f"{meta['id']:24} {meta['method']:6} {meta['status']:6} {meta['duration_seconds'] * 1000:9.1f} "
+                f"{peak / 1024 if peak else 0:9.0f}  {','.join(meta['modes']):11} {meta['path']}"
+            )
+
+    def _require(self, capture, filename, directory):
+        if not os.path.exists(profiling.capture_path(capture, filename, directory)):
+            raise CommandError(f"Capture {capture} has no {filename}.")
+
+    def _has(self, capture, filename, directory):
+        return os.path.exists(profiling.capture_path(capture, filename, directory))
+
+    def show(self, directory, options):
+        capture = options['capture']
+        self._require(capture, 'meta.json', directory)
+        if self._has(capture, 'cpu.prof', directory):
+            self.stdout.write(self.style.MIGRATE_HEADING("CPU"))
+            self.stdout.write(profiling.cpu_summary(capture, options['sort'], options['limit'], directory))
+        if self._has(capture, 'memory.snapshot', directory):
+            self.stdout.write(self.style.MIGRATE_HEADING("Memory still allocated at the end of the request"))
+            for stat in profiling.memory_summary(capture, options['limit'], directory):
+                self.stdout.write(f"  {stat}")
+
+    def diff(self, directory, options):
+        before, after = options['before'], options['after']
+        for capture in (before, after):
+            self._require(capture, 'meta.json', directory)
+        if self._has(before, 'cpu.prof', directory) and self._has(after, 'cpu.prof', directory):
+            self.stdout.write(self.style.MIGRATE_HEADING("Cumulative time (s): before -> after"))
+            for function, old, new in profiling.cpu_diff(before, after, options['limit'], directory):
+                self.stdout.write(f"  {old:9.4f} -> {new:9.4f}  {new - old:+9.4f}  {function}")
+        if self._has(before, 'memory.snapshot', directory) and self._has(after, 'memory.snapshot', directory):
+            self.stdout.write(self.style.MIGRATE_HEADING("Allocated memory: after vs before"))
+            for stat in profiling.memory_diff(before, after, options['limit'], directory):
+                self.stdout.write(f"  {stat}")
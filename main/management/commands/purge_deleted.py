@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import purge
+from main.models import Course, User
+
+
+class Command(BaseCommand):
+    help = "Permanently remove soft-deleted courses and users, and their dependent rows, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help="Only purge rows deleted at least this long ago (default: SOFT_DELETE_GRACE_HOURS).")
+        parser.add_argument('--batch-size', type=int, default=purge.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        targets = [
+            (Course, purge.purge_course, purge.purgeable(Course, options['grace_hours'])),
+            (User, purge.purge_user, purge.purgeable(User, options['grace_hours'])),
+        ]
+        if options['dry_run']:
+            for model, _, queryset in targets:
+                self.stdout.write(f"Would purge {queryset.count()} {model._meta.verbose_name_plural}.")
+            return
+
+        last_report = [0.0]
+
+        def progress(label, deleted):
+            # A line every couple of seconds is enough to see it moving.
+            now = time.monotonic()
+            if now - last_report[0] >= 2:
+                last_report[0] = now
+                self.stdout.write(f"  {label}: {deleted} row(s) deleted")
+
+        for model, purge_one, queryset in targets:
+            for pk, name in list(queryset.values_list('pk', model.USERNAME_FIELD if model is User else 'title')):
+                started = time.monotonic()
+                self.stdout.write(f"Purging {model._meta.verbose_name} {pk} ({name})...")
+                deleted = purge_one(pk, options['batch_size'], progress)
+                total = sum(deleted.values())
+                self.stdout.write(self.style.SUCCESS(
+                    f"Purged {model._meta.verbose_name} {pk}: {total} dependent row(s) "
+                    f"in {time.monotonic() - started:.1f}s."
+                ))
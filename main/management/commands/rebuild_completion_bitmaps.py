@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from main.completion import bump_layout, rebuild_course
+from main.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild enrollments' video completion bitmaps from UserVideoProgress now, e.g. after videos "
+        "were reordered with bulk updates that skip signals. Otherwise they are rebuilt when next read."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help="Only this course (repeatable). Defaults to every course.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        course_ids = options['courses'] or list(Course.all_objects.order_by('id').values_list('id', flat=True))
+        total = 0
+        for course_id in course_ids:
+            # Positions are re-read too, in case they changed without a signal.
+            bump_layout(course_id)
+            rebuilt = rebuild_course(course_id, options['chunk_size'])
+            self.stdout.write(f"Course {course_id}: {rebuilt} enrollment(s)")
+            total += rebuilt
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} bitmap(s)."))
@@ -0,0 +1,26 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from courses, videos and quiz questions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        documents = search.all_documents()
+        total = 0
+        with transaction.atomic():
+            backend.clear()
+            while True:
+                batch = list(itertools.islice(documents, options['batch_size']))
+                if not batch:
+                    break
+                total += backend.index(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} document(s) with {type(backend).__name__}."))
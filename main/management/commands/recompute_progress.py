@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from main.models import CourseLevel, Quiz, RecomputeProgressJob
+from main.progress import affected_users, store_progress
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Forked workers inherit the parent's open connections. Drop them without
+    # closing, which would end the parent's session on some databases.
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+def _run_chunk(level_ids, user_ids):
+    from main.dashboard import invalidate_dashboards
+    written = store_progress(level_ids, user_ids)
+    invalidate_dashboards(user_ids)
+    return written
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stored quiz-based level progress for every enrolled user, in "
+        "chunks across a process pool, with a resumable checkpoint. With --jobs, "
+        "work through the recomputes queued by content edits instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help="Levels of this course (repeatable).")
+        parser.add_argument('--level', type=int, action='append', help="This level (repeatable).")
+        parser.add_argument('--quiz', type=int, action='append', help="The level of this quiz (repeatable).")
+        parser.add_argument('--workers', type=int,
+                            help="Worker processes; 1 runs in this process. Defaults to the CPU count, "
+                                 "or 1 on SQLite, which allows a single writer at a time.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Users per chunk.")
+        parser.add_argument('--checkpoint', help="File recording the last finished user id.")
+        parser.add_argument('--resume', action='store_true', help="Continue from --checkpoint.")
+        parser.add_argument('--jobs', action='store_true',
+                            help="Run queued RecomputeProgressJobs, resuming any that were interrupted.")
+        parser.add_argument('--poll', type=float,
+                            help="With --jobs, keep waiting for new jobs, checking every POLL seconds.")
+
+    def handle(self, *args, **options):
+        if options['jobs']:
+            return self.run_jobs(options)
+        level_ids = self.resolve_levels(options)
+        if not level_ids:
+            raise CommandError("No levels to recompute.")
+        checkpoint = options['checkpoint']
+        if options['resume'] and not checkpoint:
+            raise CommandError("--resume needs --checkpoint.")
+
+        last_user_id = written = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            if state['levels'] != level_ids:
+                raise CommandError("The checkpoint was written for a different set of levels.")
+            last_user_id, written = state['last_user_id'], state['written']
+            self.stdout.write(f"Resuming after user {last_user_id}.")
+
+        def save_checkpoint(user_id, rows):
+            if checkpoint:
+                tmp = f"{checkpoint}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump({'levels': level_ids, 'last_user_id': user_id, 'written': rows}, f)
+                os.replace(tmp, checkpoint)
+
+        self.recompute(level_ids, last_user_id, written, save_checkpoint, options)
+
+    def run_jobs(self, options):
+        while True:
+            job = RecomputeProgressJob.objects.filter(finished_at__isnull=True).order_by('id').first()
+            if job is None:
+                if options['poll'] is None:
+                    return
+                time.sleep(options['poll'])
+                continue
+            if job.started_at is None:
+                RecomputeProgressJob.objects.filter(pk=job.pk).update(started_at=timezone.now())
+            elif job.last_user_id:
+                self.stdout.write(f"Job {job.pk}: resuming after user {job.last_user_id}.")
+
+            def save_checkpoint(user_id, rows, job_id=job.pk):
+                RecomputeProgressJob.objects.filter(pk=job_id).update(last_user_id=user_id, written=rows)
+
+            error = ''
+            try:
+                self.recompute(job.level_ids, job.last_user_id, job.written, save_checkpoint, options)
+            except Exception as e:
+                # Recorded rather than retried forever; queue a new job to retry.
+                error = repr(e)
+                self.stderr.write(f"Job {job.pk} failed: {error}")
+            RecomputeProgressJob.objects.filter(pk=job.pk).update(finished_at=timezone.now(), error=error)
+
+    def recompute(self, level_ids, last_user_id, written, save_checkpoint, options):
+        users = processed = 0
+        start = time.perf_counter()
+
+        def finished(chunk_last_user_id, chunk_users, chunk_written):
+            nonlocal users, written, processed
+            users += chunk_users
+            written += chunk_written
+            processed += chunk_written
+            save_checkpoint(chunk_last_user_id, written)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"  {users} users, {processed} rows in {elapsed:.1f}s ({users / elapsed:.0f} users/s)"
+            )
+
+        workers = options['workers']
+        if workers is None:
+            workers = 1 if connections['default'].vendor == 'sqlite' else os.cpu_count() or 1
+        chunks = self.chunks(level_ids, last_user_id, options['chunk_size'])
+        if workers <= 1:
+            for user_ids in chunks:
+                finished(user_ids[-1], len(user_ids), _run_chunk(level_ids, user_ids))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                # Checkpoints only advance past chunks that finished in order,
+                # so a resumed run redoes at most the chunks in flight.
+                pending = deque()
+                for user_ids in chunks:
+                    pending.append((pool.submit(_run_chunk, level_ids, user_ids), user_ids[-1], len(user_ids)))
+                    while len(pending) >= workers * 2 or (pending and pending[0][0].done()):
+                        future, chunk_last, count = pending.popleft()
+                        finished(chunk_last, count, future.result())
+                while pending:
+                    future, chunk_last, count = pending.popleft()
+                    finished(chunk_last, count, future.result())
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {len(level_ids)} level(s) for {users} user(s): {processed} rows in {elapsed:.1f}s "
+            f"({users / elapsed if elapsed else 0:.0f} users/s, {processed / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+
+    def resolve_levels(self, options):
+        levels = CourseLevel.objects.all()
+        if options['course'] or options['level'] or options['quiz']:
+            level_ids = set(options['level'] or [])
+            level_ids |= set(levels.filter(course_id__in=options['course'] or []).values_list('id', flat=True))
+            level_ids |= set(
+                Quiz.objects.filter(id__in=options['quiz'] or []).exclude(level=None).values_list('level_id', flat=True)
+            )
+            levels = levels.filter(id__in=level_ids)
+        return sorted(levels.values_list('id', flat=True))
+
+    def chunks(self, level_ids, after_user_id, chunk_size):
+        while True:
+            user_ids = list(affected_users(level_ids).filter(user_id__gt=after_user_id)[:chunk_size])
+            if not user_ids:
+                return
+            after_user_id = user_ids[-1]
+            yield user_ids
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.counters import find_drift, fix_drift
+
+
+class Command(BaseCommand):
+    help = "Compare catalog counters on courses and levels with exact counts, and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            course_drift, level_drift = find_drift()
+            for label, drift in (('Course', course_drift), ('Level', level_drift)):
+                for pk, differences in sorted(drift.items()):
+                    details = ', '.join(
+                        f"{counter} {stored} -> {exact}" for counter, (stored, exact) in sorted(differences.items())
+                    )
+                    self.stdout.write(f"{label} {pk}: {details}")
+            if not options['dry_run']:
+                fix_drift(course_drift, level_drift)
+
+        total = len(course_drift) + len(level_drift)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{total} row(s) drifted."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {total} row(s)."))
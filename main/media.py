@@ -0,0 +1,70 @@
+# media.py
+"""
+Video ingest: record file metadata on the Video row and make MP4 uploads
+faststart so playback can begin before the whole file is downloaded.
+
+Content-addressed blobs are never rewritten in place: the faststart copy is
+stored as a new blob and the row is pointed at it.
+"""
+import logging
+import os
+import tempfile
+
+from django.core.files import File
+
+from . import storage
+from .models import Video
+from .mp4 import MP4Error, faststart, read_metadata
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_video(video):
+    """
+    Rewrite `video.video_file` with `moov` first if needed and store its
+    duration, size, resolution and bitrate. Returns the saved metadata.
+    """
+    try:
+        path = video.video_file.path
+    except (NotImplementedError, ValueError):
+        # Storage without local paths, or no file attached.
+        return {}
+
+    metadata = {'file_size': os.path.getsize(path)}
+    try:
+        info = read_metadata(path)
+        if not info['faststart']:
+            content_addressed = storage.digest_of(video.video_file.name) is not None
+            fd, tmp_path = tempfile.mkstemp(
+                dir=None if content_addressed else os.path.dirname(path), suffix='.faststart',
+            )
+            os.close(fd)
+            try:
+                faststart(path, tmp_path)
+                if content_addressed:
+                    with open(tmp_path, 'rb') as f:
+                        name = video.video_file.storage.save(video.video_file.name, File(f))
+                    storage.retarget(video.video_file.name, name)
+                    metadata['video_file'] = video.video_file.name = name
+                    path = video.video_file.path
+                else:
+                    os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            info = read_metadata(path)
+        metadata.update(
+            duration=info['duration'],
+            file_size=info['file_size'],
+            width=info['width'],
+            height=info['height'],
+            bitrate=info['bitrate'],
+        )
+    except MP4Error as e:
+        logger.info("Skipping MP4 parsing for video %s: %s", video.pk, e)
+
+    # update() rather than save() so ingest never re-triggers save hooks.
+    Video.objects.filter(pk=video.pk).update(**metadata)
+    for field, value in metadata.items():
+        setattr(video, field, value)
+    return metadata
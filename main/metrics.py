@@ -0,0 +1,224 @@
+# metrics.py
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Each process keeps its own counters and histograms in memory. When
+METRICS_DIR is set (gunicorn.conf.py sets it for its workers), every process
+also writes a snapshot of its metrics to METRICS_DIR/<pid>.json at most once
+per METRICS_WRITE_INTERVAL seconds. A scrape, whichever worker serves it,
+merges those files with its own live values, so counts from every worker
+are reported together.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', "HTTP requests by URL name, method and status code."),
+    'http_request_duration_seconds': ('histogram', "HTTP request latency by URL name and method."),
+    'db_queries_total': ('counter', "Database queries executed, by URL name."),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result (hit or miss)."),
+    'grading_duration_seconds': ('histogram', "Time spent grading quiz and exam submissions."),
+    'media_bytes_served_total': ('counter', "Bytes of media files served."),
+}
+
+DEAD_PROCESSES_FILE = 'dead.json'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None, write_interval=1.0):
+        self.directory = directory
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_write = 0.0
+
+    def inc(self, name, labels=None, amount=1):
+        with self._lock:
+            self._counters[_key(name, labels)] += amount
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0,
+                }
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(histogram, counts=list(histogram['counts']))]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+            }
+
+    # ----- Multi-process support -----
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f"{pid or os.getpid()}.json")
+
+    def write(self):
+        if not self.directory:
+            return
+        with self._write_lock:
+            self._write()
+
+    def maybe_write(self):
+        # Threads of one worker share the snapshot file; a thread that finds
+        # another one writing skips rather than waits.
+        if (self.directory and time.monotonic() - self._last_write >= self.write_interval
+                and self._write_lock.acquire(blocking=False)):
+            try:
+                self._write()
+            finally:
+                self._write_lock.release()
+
+    def _write(self):
+        path = self._path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+        self._last_write = time.monotonic()
+
+    def collect(self):
+        """Return snapshots for every process, this one's taken live."""
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            own = os.path.basename(self._path())
+            for filename in os.listdir(self.directory):
+                if filename == own or not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    # Being replaced or removed concurrently; it'll be in the next scrape.
+                    continue
+        return snapshots
+
+    def mark_process_dead(self, pid):
+        """Fold a finished worker's snapshot into the dead-process totals."""
+        path = self._path(pid)
+        if not os.path.exists(path):
+            return
+        dead_path = os.path.join(self.directory, DEAD_PROCESSES_FILE)
+        snapshots = [path] + ([dead_path] if os.path.exists(dead_path) else [])
+        merged = []
+        for snapshot_path in snapshots:
+            with open(snapshot_path) as f:
+                merged.append(json.load(f))
+        tmp_path = f"{dead_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(_as_snapshot(merge(merged)), f)
+        os.replace(tmp_path, dead_path)
+        os.remove(path)
+
+
+def merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(tuple(pair) for pair in labels))] += value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(histogram, counts=list(histogram['counts']))
+                continue
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+
+def _as_snapshot(merged):
+    counters, histograms = merged
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), histogram] for (name, labels), histogram in histograms.items()],
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def render(snapshots):
+    """Render merged snapshots in the Prometheus text exposition format."""
+    counters, histograms = merge(snapshots)
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for (name, labels), histogram in histograms.items():
+        by_name[name].append((labels, histogram))
+
+    lines = []
+    for name in sorted(by_name):
+        metric_type, help_text = METRICS.get(name, ('untyped', ''))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if metric_type != 'histogram':
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value['buckets'], value['counts']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(
+    directory=getattr(settings, 'METRICS_DIR', None),
+    write_interval=getattr(settings, 'METRICS_WRITE_INTERVAL', 1.0),
+)
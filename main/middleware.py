@@ -0,0 +1,124 @@
+# middleware.py
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.db import connections
+from django.middleware import clickjacking, csrf
+from django.views.static import serve
+
+from . import profiling
+from .metrics import registry
+from .views import serve_blob
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and DB query count for every request, labeled by
+    the URL name from main/urls.py. Should sit first in MIDDLEWARE so the
+    timing covers the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is None:
+            route = '<unmatched>'
+        elif match.func is serve:
+            route = 'media'
+        else:
+            route = match.url_name or match.view_name or '<unnamed>'
+        if match is not None and match.func in (serve, serve_blob):
+            registry.inc('media_bytes_served_total', amount=int(response.get('Content-Length') or 0))
+        registry.observe('http_request_duration_seconds', elapsed, {'route': route, 'method': request.method})
+        registry.inc('http_requests_total', {
+            'route': route, 'method': request.method, 'status': str(response.status_code),
+        })
+        registry.inc('db_queries_total', {'route': route}, queries)
+        registry.maybe_write()
+        return response
+
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request on demand; see main/profiling.py. Sits right
+    after MetricsMiddleware so captures cover the rest of the stack.
+    Unauthorized or malformed profile headers are ignored.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        header = request.META.get(profiling.PROFILE_HEADER)
+        if header is None:
+            return self.get_response(request)
+        modes = profiling.requested_modes(header)
+        if not modes or not profiling.is_authorized(request):
+            return self.get_response(request)
+        return profiling.profile_request(request, self.get_response, modes)
+
+
+# ----- Lean API pipeline -----
+# API routes authenticate with JWTAuthentication and never use sessions,
+# CSRF tokens, messages or frame options. These subclasses of the stock
+# middleware pass such requests straight through, while every other path
+# (the admin in particular) gets the stock behaviour. Being subclasses, they
+# still satisfy the admin's middleware system checks.
+
+API_PATH_PREFIXES = tuple(getattr(settings, 'API_PATH_PREFIXES', ('/api/',)))
+
+
+def is_api_request(request):
+    return request.path_info.startswith(API_PATH_PREFIXES)
+
+
+class SkipForAPIMixin:
+    def __call__(self, request):
+        if is_api_request(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SkipForAPIMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SkipForAPIMixin, csrf.CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # Called by the handler directly, outside __call__.
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(SkipForAPIMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(SkipForAPIMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(SkipForAPIMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
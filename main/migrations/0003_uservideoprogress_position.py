@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_userlevelprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uservideoprogress',
+            name='position',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uservideoprogress',
+            name='position_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
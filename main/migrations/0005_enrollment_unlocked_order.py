@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_video_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='unlocked_order',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', 'course'], name='main_enroll_user_id_6d143f_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Mirrors main.search.SQLiteFTSBackend.create_sql; kept inline so the
+# migration doesn't depend on application code.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS main_search_index USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED, title, body, "
+    "tokenize = 'porter unicode61')"
+)
+
+
+def fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(option == 'ENABLE_FTS5' for option, in cursor.fetchall())
+
+
+def create_index(apps, schema_editor):
+    # Without FTS5, main.search falls back to DatabaseSearchBackend.
+    if schema_editor.connection.vendor == 'sqlite' and fts5_available(schema_editor.connection):
+        schema_editor.execute(CREATE_SQL)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS main_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_enrollment_unlocked_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
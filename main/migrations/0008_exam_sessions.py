@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_attempt_archives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='levelexam',
+            name='time_limit_minutes',
+            field=models.PositiveIntegerField(default=60, help_text='Time allowed for an exam session'),
+        ),
+        migrations.CreateModel(
+            name='ExamSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('deadline', models.DateTimeField()),
+                ('answers', models.JSONField(blank=True, default=dict)),
+                ('saved_at', models.DateTimeField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('score', models.IntegerField(blank=True, null=True)),
+                ('passed', models.BooleanField(blank=True, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to='main.levelexam')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'exam', 'submitted_at'], name='main_examse_user_id_3b9249_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-19 04:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_exam_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='main.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'id'], name='main_conten_course__ce6de2_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoursePackage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(help_text='Last content change included')),
+                ('file', models.FileField(upload_to='packages/')),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('built_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='packages', to='main.course')),
+            ],
+            options={
+                'unique_together': {('course', 'version')},
+            },
+        ),
+    ]
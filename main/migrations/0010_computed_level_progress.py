@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_course_packages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComputedLevelProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quizzes_total', models.PositiveIntegerField(default=0)),
+                ('quizzes_passed', models.PositiveIntegerField(default=0)),
+                ('progress', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('course_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='computed_progress', to='main.courselevel')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='computed_level_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'course_level')},
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:04
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Course = apps.get_model('main', 'Course')
+    CourseLevel = apps.get_model('main', 'CourseLevel')
+    Video = apps.get_model('main', 'Video')
+    Quiz = apps.get_model('main', 'Quiz')
+    Enrollment = apps.get_model('main', 'Enrollment')
+
+    level_course = dict(CourseLevel.objects.values_list('id', 'course_id'))
+    video_level = dict(Video.objects.values_list('id', 'level_id'))
+    levels = Counter(level_course.values())
+    level_videos = Counter(video_level.values())
+    level_quizzes = Counter(
+        level_id if level_id is not None else video_level.get(video_id)
+        for level_id, video_id in Quiz.objects.values_list('level_id', 'video_id')
+    )
+    enrollments = Counter(Enrollment.objects.values_list('course_id', flat=True))
+
+    course_videos, course_quizzes = Counter(), Counter()
+    for level_id, course_id in level_course.items():
+        course_videos[course_id] += level_videos[level_id]
+        course_quizzes[course_id] += level_quizzes[level_id]
+        CourseLevel.objects.filter(pk=level_id).update(
+            videos_count=level_videos[level_id], quizzes_count=level_quizzes[level_id],
+        )
+    for course_id in Course.objects.values_list('id', flat=True):
+        Course.objects.filter(pk=course_id).update(
+            levels_count=levels[course_id], videos_count=course_videos[course_id],
+            quizzes_count=course_quizzes[course_id], enrollments_count=enrollments[course_id],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_computed_level_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='levels_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='quizzes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='videos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='courselevel',
+            name='quizzes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='courselevel',
+            name='videos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    Course = apps.get_model('main', 'Course')
+    Enrollment = apps.get_model('main', 'Enrollment')
+
+    duplicates = (
+        Enrollment.objects.values('user_id', 'course_id')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    courses = set()
+    for row in duplicates:
+        Enrollment.objects.filter(user_id=row['user_id'], course_id=row['course_id']).exclude(pk=row['keep']).delete()
+        courses.add(row['course_id'])
+    for course_id in courses:
+        Course.objects.filter(pk=course_id).update(
+            enrollments_count=Enrollment.objects.filter(course_id=course_id).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_catalog_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='enrollment',
+            name='main_enroll_user_id_6d143f_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_enrollment'),
+        ),
+    ]
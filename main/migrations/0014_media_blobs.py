@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:22
+
+import django.utils.timezone
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('touched_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='profile_photo',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.get_blob_storage, upload_to='profile_photos/'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='video_file',
+            field=models.FileField(storage=main.storage.get_blob_storage, upload_to='videos/'),
+        ),
+    ]
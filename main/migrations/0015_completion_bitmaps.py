@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='video_layout_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_videos',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completion_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
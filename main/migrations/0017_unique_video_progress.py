@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-19 05:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_progress(apps, schema_editor):
+    UserVideoProgress = apps.get_model('main', 'UserVideoProgress')
+
+    duplicates = (
+        UserVideoProgress.objects.values('user_id', 'video_id')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        rows = list(UserVideoProgress.objects.filter(user_id=row['user_id'], video_id=row['video_id']))
+        kept = next(progress for progress in rows if progress.pk == row['keep'])
+        # Completed if any copy was, with the latest reported position.
+        completed = [progress for progress in rows if progress.is_completed]
+        if completed:
+            kept.is_completed = True
+            kept.completed_at = min((p.completed_at for p in completed if p.completed_at), default=None)
+        latest = max(rows, key=lambda p: (p.position_updated_at is not None, p.position_updated_at or 0, p.pk))
+        kept.position, kept.position_updated_at = latest.position, latest.position_updated_at
+        kept.save()
+        UserVideoProgress.objects.filter(user_id=row['user_id'], video_id=row['video_id']).exclude(pk=kept.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_progress, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='uservideoprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'video'), name='unique_video_progress'),
+        ),
+    ]
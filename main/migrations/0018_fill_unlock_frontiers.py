@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 07:12
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def fill_frontiers(apps, schema_editor):
+    # Same derivation as the backfill_unlocks command, for the enrollments
+    # level gating used to compute on first read.
+    CourseLevel = apps.get_model('main', 'CourseLevel')
+    Enrollment = apps.get_model('main', 'Enrollment')
+    UserExamAttempt = apps.get_model('main', 'UserExamAttempt')
+
+    level_orders = defaultdict(list)
+    for course_id, order in CourseLevel.objects.order_by('course_id', 'order').values_list('course_id', 'order'):
+        level_orders[course_id].append(order)
+    enrollments = list(Enrollment.objects.filter(unlocked_order__isnull=True, course_id__in=level_orders))
+    max_passed = {
+        (row['user_id'], row['exam__level__course_id']): row['max_order']
+        for row in UserExamAttempt.objects
+        .filter(passed=True, user_id__in={enrollment.user_id for enrollment in enrollments})
+        .values('user_id', 'exam__level__course_id')
+        .annotate(max_order=Max('exam__level__order'))
+    }
+    for enrollment in enrollments:
+        orders = level_orders[enrollment.course_id]
+        passed = max_passed.get((enrollment.user_id, enrollment.course_id))
+        enrollment.unlocked_order = (
+            orders[0] if passed is None else next((order for order in orders if order > passed), orders[-1])
+        )
+    Enrollment.objects.bulk_update(enrollments, ['unlocked_order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_unique_video_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_frontiers, migrations.RunPython.noop),
+    ]
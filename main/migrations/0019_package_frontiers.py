@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 07:40
+
+import main.storage
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def drop_public_packages(apps, schema_editor):
+    # Packages built so far sit under MEDIA_ROOT and include locked levels
+    # and correct answers; they are rebuilt per frontier on request.
+    CoursePackage = apps.get_model('main', 'CoursePackage')
+    for name in CoursePackage.objects.values_list('file', flat=True):
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+    CoursePackage.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_fill_unlock_frontiers'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_public_packages, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='coursepackage',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='coursepackage',
+            name='unlocked_order',
+            field=models.IntegerField(blank=True, help_text='Highest level order included', null=True),
+        ),
+        migrations.AlterField(
+            model_name='coursepackage',
+            name='file',
+            field=models.FileField(storage=main.storage.get_package_storage, upload_to='packages/'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='coursepackage',
+            unique_together={('course', 'version', 'unlocked_order')},
+        ),
+    ]
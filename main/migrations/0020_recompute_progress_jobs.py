@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_package_frontiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecomputeProgressJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level_ids', models.JSONField()),
+                ('last_user_id', models.PositiveBigIntegerField(default=0)),
+                ('written', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['finished_at', 'id'], name='main_recomp_finishe_b42822_idx')],
+            },
+        ),
+    ]
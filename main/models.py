@@ -1,14 +1,33 @@
 # models.py
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.utils import timezone
 
+from .storage import get_blob_storage, get_package_storage
+
+
+# Soft-deleted rows (deleted_at set) are hidden by the default managers and
+# removed later by main/purge.py; `all_objects` still sees them.
+class ActiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class ActiveUserManager(UserManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class User(AbstractUser):
     # Fields inherited: id, username, first_name, last_name, email, password, etc.
-    profile_photo = models.ImageField(upload_to='profile_photos/', blank=True, null=True)
+    profile_photo = models.ImageField(upload_to='profile_photos/', storage=get_blob_storage, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = ActiveUserManager()
+    all_objects = UserManager()
 
     def __str__(self):
         return self.username
@@ -18,6 +37,17 @@ class Course(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Catalog counters maintained by main/counters.py.
+    levels_count = models.PositiveIntegerField(default=0, editable=False)
+    videos_count = models.PositiveIntegerField(default=0, editable=False)
+    quizzes_count = models.PositiveIntegerField(default=0, editable=False)
+    enrollments_count = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped whenever video positions change; see main/completion.py.
+    video_layout_version = models.PositiveIntegerField(default=0, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
@@ -27,6 +57,9 @@ class CourseLevel(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="levels")
     name = models.CharField(max_length=50)  # e.g., "Beginner", "Intermediate", "Professional"
     order = models.IntegerField()
+    # Catalog counters maintained by main/counters.py.
+    videos_count = models.PositiveIntegerField(default=0, editable=False)
+    quizzes_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.course.title} - {self.name}"
@@ -36,6 +69,15 @@ class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="enrollments")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments")
     enrolled_at = models.DateTimeField(auto_now_add=True)
+    # Order of the highest level the user may open; see main/unlocks.py.
+    unlocked_order = models.IntegerField(null=True, blank=True)
+    # Bit per completed video, by position in the course's ordered video list,
+    # built for Course.video_layout_version completion_version; see main/completion.py.
+    completed_videos = models.BinaryField(default=bytes, editable=False)
+    completion_version = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'course'], name='unique_enrollment')]
 
     def __str__(self):
         return f"{self.user.username} enrolled in {self.course.title}"
@@ -45,7 +87,13 @@ class Video(models.Model):
     title = models.CharField(max_length=255)
     level = models.ForeignKey(CourseLevel, on_delete=models.CASCADE, related_name="videos")
     order = models.IntegerField()
-    video_file = models.FileField(upload_to='videos/')
+    video_file = models.FileField(upload_to='videos/', storage=get_blob_storage)
+    # Filled in by main.media.ingest_video() when a file is uploaded.
+    duration = models.FloatField(null=True, blank=True, help_text="Duration in seconds")
+    file_size = models.BigIntegerField(null=True, blank=True, help_text="Size in bytes")
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text="Average bits per second")
 
     def __str__(self):
         return f"{self.title} (Level: {self.level.name})"
@@ -56,6 +104,12 @@ class UserVideoProgress(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="progresses")
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Last playback position reported by the client heartbeat, in seconds.
+    position = models.FloatField(default=0)
+    position_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'video'], name='unique_video_progress')]
 
     def __str__(self):
         return f"{self.user.username} - {self.video.title} - Completed: {self.is_completed}"
@@ -103,6 +157,7 @@ class UserQuizAttempt(models.Model):
 class LevelExam(models.Model):
     level = models.OneToOneField(CourseLevel, on_delete=models.CASCADE, related_name="exam")
     passing_score = models.IntegerField()
+    time_limit_minutes = models.PositiveIntegerField(default=60, help_text="Time allowed for an exam session")
 
     def __str__(self):
         return f"Exam for {self.level}"
@@ -137,6 +192,75 @@ class UserExamAttempt(models.Model):
         return f"{self.user.username} - Exam for {self.exam.level.name} Attempt"
 
 
+class ExamSession(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="exam_sessions")
+    exam = models.ForeignKey(LevelExam, on_delete=models.CASCADE, related_name="sessions")
+    started_at = models.DateTimeField(auto_now_add=True)
+    deadline = models.DateTimeField()
+    # Draft answers as {question_id: answer_id}, flushed from the autosave buffer.
+    answers = models.JSONField(default=dict, blank=True)
+    saved_at = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    score = models.IntegerField(null=True, blank=True)
+    passed = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'exam', 'submitted_at'])]
+
+    def __str__(self):
+        return f"{self.user.username} - Exam session for {self.exam.level.name}"
+
+
+class MediaBlob(models.Model):
+    """
+    One stored media file, shared by every Video/User row whose file has the
+    same content. See main/storage.py.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    touched_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class ContentChange(models.Model):
+    """
+    Append-only log of course content edits. The id is the content version
+    that offline packages and delta sync cursors refer to; see main/packages.py.
+    """
+    # No database constraint: deleting a course logs changes for its children
+    # after the cascade is collected. Its rows are removed in post_delete.
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    kind = models.CharField(max_length=10)  # "course", "level", "video", "quiz" or "exam"
+    object_id = models.PositiveIntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['course', 'id'])]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id} in course {self.course_id}"
+
+
+class CoursePackage(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="packages")
+    version = models.PositiveIntegerField(help_text="Last content change included")
+    unlocked_order = models.IntegerField(null=True, blank=True, help_text="Highest level order included")
+    file = models.FileField(upload_to='packages/', storage=get_package_storage)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('course', 'version', 'unlocked_order')
+
+    def __str__(self):
+        return f"{self.course.title} package v{self.version} (levels up to {self.unlocked_order})"
+
+
 # models.py
 
 class UserLevelProgress(models.Model):
@@ -157,3 +281,98 @@ class UserLevelProgress(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.course_level.name}: {self.progress}%"
+
+
+class ComputedLevelProgress(models.Model):
+    """
+    Quiz-based level progress, stored so reads don't recompute it. Written by
+    quiz submissions and by RecomputeProgressJob runs after content edits;
+    see main/progress.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="computed_level_progress")
+    course_level = models.ForeignKey(CourseLevel, on_delete=models.CASCADE, related_name="computed_progress")
+    quizzes_total = models.PositiveIntegerField(default=0)
+    quizzes_passed = models.PositiveIntegerField(default=0)
+    progress = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'course_level')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course_level.name}: {self.progress}% (computed)"
+
+
+class RecomputeProgressJob(models.Model):
+    """
+    A queued refresh of ComputedLevelProgress for every user enrolled in the
+    levels' courses, run by `manage.py recompute_progress --jobs`, which
+    records the last finished user id after each chunk so it can resume.
+    """
+    level_ids = models.JSONField()
+    last_user_id = models.PositiveBigIntegerField(default=0)
+    written = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['finished_at', 'id'])]
+
+    def __str__(self):
+        return f"Recompute progress for levels {self.level_ids}"
+
+
+# Attempt history moved out of the hot tables by `manage.py compact_attempts`.
+
+class UserQuizAttemptArchive(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="+")
+    score = models.IntegerField()
+    passed = models.BooleanField()
+    attempted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} - Quiz {self.quiz_id} Attempt (archived)"
+
+
+class UserExamAttemptArchive(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    exam = models.ForeignKey(LevelExam, on_delete=models.CASCADE, related_name="+")
+    score = models.IntegerField()
+    passed = models.BooleanField()
+    attempted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} - Exam {self.exam_id} Attempt (archived)"
+
+
+class QuizAttemptSummary(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="quiz_attempt_summaries")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="attempt_summaries")
+    archived_attempts = models.PositiveIntegerField(default=0)
+    archived_passes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'quiz')
+
+    def __str__(self):
+        return f"{self.user.username} - Quiz {self.quiz_id}: {self.archived_attempts} archived"
+
+
+class ExamAttemptSummary(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="exam_attempt_summaries")
+    exam = models.ForeignKey(LevelExam, on_delete=models.CASCADE, related_name="attempt_summaries")
+    archived_attempts = models.PositiveIntegerField(default=0)
+    archived_passes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'exam')
+
+    def __str__(self):
+        return f"{self.user.username} - Exam {self.exam_id}: {self.archived_attempts} archived"
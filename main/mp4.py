@@ -0,0 +1,253 @@
+# mp4.py
+"""
+Minimal ISO base media (MP4) box reader and faststart rewriter.
+
+Only the boxes needed to read duration/resolution and to relocate `moov` are
+parsed. Media data (`mdat`) is never loaded; it is streamed in fixed-size
+chunks when a file is rewritten.
+"""
+import struct
+
+CHUNK_SIZE = 1024 * 1024
+
+# Boxes whose payload is just a sequence of child boxes.
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'mvex', b'udta'}
+
+
+class MP4Error(ValueError):
+    pass
+
+
+def iter_boxes(f, start, end):
+    """
+    Yield (box_type, offset, size, header_size) for the boxes between the
+    `start` and `end` byte offsets of a seekable file.
+    """
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            largesize = f.read(8)
+            if len(largesize) < 8:
+                raise MP4Error("Truncated 64-bit box header.")
+            size = struct.unpack('>Q', largesize)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error(f"Invalid size for box {box_type!r} at offset {offset}.")
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def _file_size(f):
+    f.seek(0, 2)
+    return f.tell()
+
+
+def top_level_boxes(f):
+    boxes = list(iter_boxes(f, 0, _file_size(f)))
+    if not boxes or boxes[0][0] not in (b'ftyp', b'free', b'skip', b'wide', b'moov', b'mdat'):
+        raise MP4Error("Not an MP4 file.")
+    return boxes
+
+
+def _find(boxes, box_type):
+    for box in boxes:
+        if box[0] == box_type:
+            return box
+    return None
+
+
+def _read_payload(f, box):
+    _, offset, size, header_size = box
+    f.seek(offset + header_size)
+    return f.read(size - header_size)
+
+
+def _parse_mvhd(payload):
+    version = payload[0]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', payload[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', payload[12:20])
+    return timescale, duration
+
+
+def _parse_tkhd_dimensions(payload):
+    # The 16.16 fixed point width/height are the last eight bytes of tkhd.
+    width, height = struct.unpack('>II', payload[-8:])
+    return width >> 16, height >> 16
+
+
+def read_metadata(path):
+    """
+    Return duration (seconds), resolution, size, bitrate and whether `moov`
+    already precedes `mdat` for the MP4 file at `path`.
+    """
+    with open(path, 'rb') as f:
+        boxes = top_level_boxes(f)
+        size = _file_size(f)
+        moov = _find(boxes, b'moov')
+        if moov is None:
+            raise MP4Error("MP4 file has no moov box.")
+        _, moov_offset, moov_size, moov_header = moov
+        duration = None
+        width = height = None
+        for box_type, offset, box_size, header_size in iter_boxes(f, moov_offset + moov_header, moov_offset + moov_size):
+            if box_type == b'mvhd':
+                timescale, units = _parse_mvhd(_read_payload(f, (box_type, offset, box_size, header_size)))
+                if timescale:
+                    duration = units / timescale
+            elif box_type == b'trak' and width is None:
+                trak_end = offset + box_size
+                for child in iter_boxes(f, offset + header_size, trak_end):
+                    if child[0] == b'tkhd':
+                        track_width, track_height = _parse_tkhd_dimensions(_read_payload(f, child))
+                        if track_width and track_height:
+                            width, height = track_width, track_height
+                        break
+        mdat = _find(boxes, b'mdat')
+    return {
+        'duration': duration,
+        'width': width,
+        'height': height,
+        'file_size': size,
+        'bitrate': int(size * 8 / duration) if duration else None,
+        'faststart': mdat is None or moov_offset < mdat[1],
+    }
+
+
+# ----- Faststart -----
+
+def _parse_tree(data):
+    children = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise MP4Error(f"Invalid size for box {box_type!r} inside moov.")
+        payload = data[offset + header_size:offset + size]
+        if box_type in CONTAINER_BOXES:
+            children.append([box_type, _parse_tree(payload)])
+        else:
+            children.append([box_type, payload])
+        offset += size
+    return children
+
+
+def _serialize_tree(children):
+    out = []
+    for box_type, body in children:
+        payload = _serialize_tree(body) if isinstance(body, list) else body
+        out.append(struct.pack('>I4s', len(payload) + 8, box_type))
+        out.append(payload)
+    return b''.join(out)
+
+
+def _chunk_offset_boxes(children):
+    for box in children:
+        if isinstance(box[1], list):
+            yield from _chunk_offset_boxes(box[1])
+        elif box[0] in (b'stco', b'co64'):
+            yield box
+
+
+def _read_offsets(box):
+    box_type, payload = box
+    count = struct.unpack('>I', payload[4:8])[0]
+    fmt = '>%dQ' % count if box_type == b'co64' else '>%dI' % count
+    return list(struct.unpack(fmt, payload[8:8 + struct.calcsize(fmt)]))
+
+
+def _write_offsets(box, offsets, as_co64):
+    version_flags = box[1][:4]
+    if as_co64:
+        box[0] = b'co64'
+        box[1] = version_flags + struct.pack('>I%dQ' % len(offsets), len(offsets), *offsets)
+    else:
+        box[1] = version_flags + struct.pack('>I%dI' % len(offsets), len(offsets), *offsets)
+
+
+def _relocate(layout, new_moov_size):
+    """
+    Map each top-level box's old offset to its offset once `moov` sits
+    right after `ftyp`, given the rewritten moov size.
+    """
+    mapping = {}
+    position = 0
+    for box_type, offset, size, _ in layout:
+        mapping[offset] = position
+        position += new_moov_size if box_type == b'moov' else size
+    return mapping
+
+
+def faststart(src_path, dst_path):
+    """
+    Write a copy of `src_path` to `dst_path` with `moov` moved in front of
+    the media data, patching chunk offsets. Returns False without writing
+    anything if the file is already faststart.
+    """
+    with open(src_path, 'rb') as src:
+        boxes = top_level_boxes(src)
+        moov = _find(boxes, b'moov')
+        mdat = _find(boxes, b'mdat')
+        if moov is None:
+            raise MP4Error("MP4 file has no moov box.")
+        if mdat is None or moov[1] < mdat[1]:
+            return False
+
+        tree = _parse_tree(_read_payload(src, moov))
+        offset_boxes = list(_chunk_offset_boxes(tree))
+        original = [_read_offsets(box) for box in offset_boxes]
+
+        rest = [box for box in boxes if box[0] != b'moov']
+        insert_at = 1 if rest and rest[0][0] == b'ftyp' else 0
+        layout = rest[:insert_at] + [moov] + rest[insert_at:]
+
+        def to_new(old_offset, mapping):
+            for box_type, offset, size, _ in rest:
+                if offset <= old_offset < offset + size:
+                    return mapping[offset] + (old_offset - offset)
+            raise MP4Error(f"Chunk offset {old_offset} points outside the file.")
+
+        as_co64 = any(box[0] == b'co64' for box in offset_boxes)
+        while True:
+            for box, offsets in zip(offset_boxes, original):
+                _write_offsets(box, offsets, as_co64)
+            moov_bytes = struct.pack('>I4s', 0, b'moov') + _serialize_tree(tree)
+            mapping = _relocate(layout, len(moov_bytes))
+            patched = [[to_new(o, mapping) for o in offsets] for offsets in original]
+            if as_co64 or all(o <= 0xFFFFFFFF for offsets in patched for o in offsets):
+                break
+            # Shifting pushed an offset past 4 GiB; widen every table and redo.
+            as_co64 = True
+        for box, offsets in zip(offset_boxes, patched):
+            _write_offsets(box, offsets, as_co64)
+        moov_bytes = _serialize_tree([[b'moov', tree]])
+
+        with open(dst_path, 'wb') as dst:
+            for box_type, offset, size, _ in layout:
+                if box_type == b'moov':
+                    dst.write(moov_bytes)
+                    continue
+                src.seek(offset)
+                remaining = size
+                while remaining:
+                    chunk = src.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise MP4Error("Unexpected end of file while copying.")
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+    return True
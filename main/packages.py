@@ -0,0 +1,309 @@
+# packages.py
+"""
+Offline course packages and delta sync.
+
+Every content edit appends a ContentChange row (see main/signals.py); the
+highest change id for a course is its content version. A package is the
+course content (levels, videos, quizzes, exams and a media manifest) a user
+at one unlock frontier may open, at one version, written once as gzipped
+JSON and served to enrolled users by views.CoursePackageFileView. Neither
+packages nor deltas include locked levels or which answers are correct.
+
+Clients then sync with a cursor "<change_id>:<timestamp>:<unlocked_order>".
+The change id selects content changed since that version, the timestamp
+selects the user's progress rows written since the last sync, and levels
+unlocked since the cursor's frontier are sent whole, so a re-sync costs
+bytes proportional to what changed.
+"""
+import gzip
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import heartbeats
+from .fast_serializers import serialize_videos
+from .models import (
+    ContentChange, Course, CourseLevel, CoursePackage, LevelExam, Quiz, UserExamAttempt,
+    UserQuizAttempt, UserVideoProgress, Video,
+)
+from .serializers import CourseLevelSerializer, CourseSerializer, PackagedLevelExamSerializer, PackagedQuizSerializer
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+COURSE, LEVEL, VIDEO, QUIZ, EXAM = 'course', 'level', 'video', 'quiz', 'exam'
+# Packages kept per course; older files are deleted after a build.
+KEEP_PACKAGES = 2
+# Heartbeat positions are stamped when reported but written on flush, so
+# progress queries look back a little further than the cursor.
+PROGRESS_OVERLAP = heartbeats.FLUSH_INTERVAL + 5
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# ----- Change log -----
+
+def record_change(course_id, kind, object_id):
+    if course_id is not None:
+        ContentChange.objects.create(course_id=course_id, kind=kind, object_id=object_id)
+
+
+def quiz_course_id(quiz):
+    if quiz.level_id:
+        return CourseLevel.objects.filter(pk=quiz.level_id).values_list('course_id', flat=True).first()
+    if quiz.video_id:
+        return Video.objects.filter(pk=quiz.video_id).values_list('level__course_id', flat=True).first()
+    return None
+
+
+def current_version(course_id):
+    return ContentChange.objects.filter(course_id=course_id).aggregate(version=Max('id'))['version'] or 0
+
+
+# ----- Content -----
+
+def _levels(prefix, unlocked_order, unlocked_after=None):
+    """Q for levels (through `prefix`) with unlocked_after < order <= unlocked_order."""
+    if unlocked_order is None:
+        return Q(pk__in=[])
+    condition = Q(**{f'{prefix}order__lte': unlocked_order})
+    if unlocked_after is not None:
+        condition &= Q(**{f'{prefix}order__gt': unlocked_after})
+    return condition
+
+
+def serialize_content(course_id, unlocked_order, changed=None, unlocked_after=None):
+    """
+    Serialize the course's content in levels up to `unlocked_order` (and
+    above `unlocked_after`, if given). With `changed` ({kind: {ids}}) only
+    those objects are included, and ids that no longer belong to the course,
+    or are in locked levels, are reported under "deleted".
+    """
+    quizzes = Quiz.objects.filter(
+        Q(level__course_id=course_id) & _levels('level__', unlocked_order, unlocked_after)
+        | Q(video__level__course_id=course_id) & _levels('video__level__', unlocked_order, unlocked_after)
+    )
+    sections = [
+        (LEVEL, 'levels', CourseLevel.objects.filter(_levels('', unlocked_order, unlocked_after), course_id=course_id),
+         CourseLevelSerializer),
+        (VIDEO, 'videos', Video.objects.filter(_levels('level__', unlocked_order, unlocked_after),
+                                               level__course_id=course_id), None),
+        (QUIZ, 'quizzes', quizzes.prefetch_related('questions__answers'), PackagedQuizSerializer),
+        (EXAM, 'exams', LevelExam.objects.filter(_levels('level__', unlocked_order, unlocked_after),
+                                                 level__course_id=course_id).prefetch_related('questions__answers'),
+         PackagedLevelExamSerializer),
+    ]
+    content = {}
+    deleted = {}
+    for kind, section, queryset, serializer_class in sections:
+        if changed is not None:
+            if not changed.get(kind):
+                content[section] = []
+                continue
+            queryset = queryset.filter(id__in=changed[kind])
+        queryset = queryset.order_by('id')
+        if serializer_class is None:
+            rows = serialize_videos(queryset)
+        else:
+            rows = serializer_class(queryset, many=True).data
+        content[section] = rows
+        if changed is not None:
+            missing = changed[kind] - {row['id'] for row in rows}
+            if missing:
+                deleted[section] = sorted(missing)
+    if changed is None or changed.get(COURSE):
+        content['course'] = CourseSerializer(Course.objects.get(pk=course_id)).data
+    if changed is not None:
+        content['deleted'] = deleted
+    return content
+
+
+def media_manifest(videos):
+    return [
+        {
+            'video': video['id'],
+            'url': video['video_file'],
+            'file_size': video['file_size'],
+            'duration': video['duration'],
+        }
+        for video in videos if video['video_file']
+    ]
+
+
+# ----- Packages -----
+
+def build_package(course_id, unlocked_order):
+    """
+    Write the course's package for levels up to `unlocked_order` at its
+    current version, or return the existing one.
+    """
+    # Read before serializing: an edit landing mid-build is then replayed by
+    # the first sync, which is harmless, rather than missed.
+    version = current_version(course_id)
+    package = CoursePackage.objects.filter(course_id=course_id, version=version, unlocked_order=unlocked_order).first()
+    if package is not None:
+        return package
+
+    content = serialize_content(course_id, unlocked_order)
+    document = {
+        'format': FORMAT,
+        'version': version,
+        'unlocked_order': unlocked_order,
+        'cursor': format_cursor(version, None, unlocked_order),
+        'built_at': timezone.now(),
+        **content,
+        'media': media_manifest(content['videos']),
+    }
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb', mtime=0) as f:
+            for chunk in DjangoJSONEncoder(separators=(',', ':')).iterencode(document):
+                f.write(chunk.encode('utf-8'))
+        size = tmp.tell()
+        tmp.seek(0)
+        for chunk in iter(lambda: tmp.read(1024 * 1024), b''):
+            digest.update(chunk)
+        tmp.seek(0)
+        package = CoursePackage(
+            course_id=course_id, version=version, unlocked_order=unlocked_order, size=size, sha256=digest.hexdigest(),
+        )
+        package.file.save(f"course-{course_id}-v{version}-l{unlocked_order}.json.gz", File(tmp), save=False)
+    package.save()
+    prune_packages(course_id, unlocked_order)
+    return package
+
+
+def prune_packages(course_id, unlocked_order, keep=KEEP_PACKAGES):
+    stale = CoursePackage.objects.filter(course_id=course_id, unlocked_order=unlocked_order).order_by('-version')[keep:]
+    for package in stale:
+        package.file.delete(save=False)
+        package.delete()
+
+
+def latest_package(course_id, unlocked_order):
+    return (
+        CoursePackage.objects.filter(course_id=course_id, unlocked_order=unlocked_order).order_by('-version').first()
+    )
+
+
+_building = set()
+_building_lock = threading.Lock()
+
+
+def request_build(course_id, unlocked_order):
+    """Build the course's package in a background thread unless one is already running."""
+    key = (course_id, unlocked_order)
+    with _building_lock:
+        if key in _building:
+            return False
+        _building.add(key)
+
+    def run():
+        try:
+            build_package(course_id, unlocked_order)
+        except Exception:
+            logger.exception("Building the package for course %s, levels up to %s failed", course_id, unlocked_order)
+        finally:
+            with _building_lock:
+                _building.discard(key)
+            connection.close()
+
+    threading.Thread(target=run, name=f'course-package-{course_id}-{unlocked_order}', daemon=True).start()
+    return True
+
+
+def is_building(course_id, unlocked_order):
+    return (course_id, unlocked_order) in _building
+
+
+# ----- Delta sync -----
+
+def format_cursor(change_id, timestamp, unlocked_order):
+    return (
+        f"{change_id}:{'' if timestamp is None else f'{timestamp:.6f}'}"
+        f":{'' if unlocked_order is None else unlocked_order}"
+    )
+
+
+def parse_cursor(cursor):
+    """
+    Return (change_id, timestamp or None, unlocked_order or None) from
+    "<change_id>:<timestamp>:<unlocked_order>". Cursors issued before
+    frontiers were added have no third part.
+    """
+    change_id, _, rest = (cursor or '').partition(':')
+    timestamp, _, unlocked_order = rest.partition(':')
+    try:
+        return (
+            int(change_id),
+            float(timestamp) if timestamp else None,
+            int(unlocked_order) if unlocked_order else None,
+        )
+    except ValueError:
+        raise InvalidCursor(cursor)
+
+
+def content_changes(course_id, since):
+    """Return ({kind: {ids}}, latest change id) for changes after `since`."""
+    changed = {}
+    latest = since
+    rows = ContentChange.objects.filter(course_id=course_id, id__gt=since).values_list('id', 'kind', 'object_id')
+    for change_id, kind, object_id in rows.iterator():
+        changed.setdefault(kind, set()).add(object_id)
+        latest = max(latest, change_id)
+    return changed, latest
+
+
+def progress_changes(user, course_id, since, unlocked_order):
+    """The user's progress in the course written after `since` (a datetime, or None for all)."""
+    videos = UserVideoProgress.objects.filter(user=user, video__level__course_id=course_id)
+    quiz_attempts = UserQuizAttempt.objects.filter(user=user).filter(
+        Q(quiz__level__course_id=course_id) | Q(quiz__video__level__course_id=course_id)
+    )
+    exam_attempts = UserExamAttempt.objects.filter(user=user, exam__level__course_id=course_id)
+    if since is not None:
+        videos = videos.filter(Q(completed_at__gt=since) | Q(position_updated_at__gt=since))
+        quiz_attempts = quiz_attempts.filter(attempted_at__gt=since)
+        exam_attempts = exam_attempts.filter(attempted_at__gt=since)
+    return {
+        'videos': list(videos.order_by('id').values(
+            'video_id', 'is_completed', 'completed_at', 'position', 'position_updated_at',
+        )),
+        'quiz_attempts': list(quiz_attempts.order_by('id').values('id', 'quiz_id', 'score', 'passed', 'attempted_at')),
+        'exam_attempts': list(exam_attempts.order_by('id').values('id', 'exam_id', 'score', 'passed', 'attempted_at')),
+        'unlocked_order': unlocked_order,
+    }
+
+
+def delta(user, course_id, unlocked_order, cursor):
+    """
+    Everything that changed in the course since `cursor` for `user`, whose
+    frontier is `unlocked_order`, plus the next cursor.
+    """
+    since_change, since_timestamp, since_unlocked = parse_cursor(cursor)
+    # Taken before querying so nothing written meanwhile falls between cursors.
+    now = timezone.now()
+    changed, latest = content_changes(course_id, since_change)
+    since = None
+    if since_timestamp is not None:
+        since = datetime.fromtimestamp(since_timestamp - PROGRESS_OVERLAP, tz=dt_timezone.utc)
+    unlocked = None
+    if since_unlocked is not None and unlocked_order is not None and unlocked_order > since_unlocked:
+        # Levels unlocked since the last sync, whether or not they changed.
+        unlocked = serialize_content(course_id, unlocked_order, unlocked_after=since_unlocked)
+    return {
+        'cursor': format_cursor(latest, now.timestamp(), unlocked_order),
+        'content': serialize_content(course_id, unlocked_order, changed),
+        'unlocked': unlocked,
+        'progress': progress_changes(user, course_id, since, unlocked_order),
+    }
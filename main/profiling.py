@@ -0,0 +1,174 @@
+# profiling.py
+"""
+On-demand profiling of single requests.
+
+A request carrying `X-Profile: cpu`, `memory` or `cpu,memory` from a staff
+user (JWT) or with `X-Profile-Token: <PROFILE_TOKEN>` runs under cProfile
+and/or tracemalloc. Each capture is written to PROFILE_DIR/<id>/ as
+`meta.json`, `cpu.prof` (pstats format) and `memory.snapshot` (a tracemalloc
+snapshot), and `manage.py profiles` lists, summarizes and diffs them.
+
+Requests without the header only pay for one dict lookup in the middleware.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import secrets
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.utils import timezone
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+MODES = ('cpu', 'memory')
+TRACEMALLOC_FRAMES = 25
+
+# tracemalloc is process-wide and cProfile can't nest, so one capture at a time.
+_capture_lock = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', None) or os.path.join(settings.BASE_DIR, 'profiles')
+
+
+def requested_modes(value):
+    return [mode for mode in MODES if mode in {part.strip().lower() for part in value.split(',')}]
+
+
+def is_authorized(request):
+    token = getattr(settings, 'PROFILE_TOKEN', None)
+    supplied = request.META.get(TOKEN_HEADER)
+    if token and supplied and secrets.compare_digest(supplied, token):
+        return True
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+class Capture:
+    """Runs one request under the requested profilers and saves the results."""
+
+    def __init__(self, request, modes):
+        self.request = request
+        self.modes = modes
+        self.profiler = cProfile.Profile() if 'cpu' in modes else None
+        self.id = f"{timezone.now():%Y%m%dT%H%M%S}-{secrets.token_hex(3)}"
+
+    def run(self, get_response):
+        tracing = 'memory' in self.modes and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        started = time.perf_counter()
+        try:
+            if self.profiler:
+                response = self.profiler.runcall(get_response, self.request)
+            else:
+                response = get_response(self.request)
+            duration = time.perf_counter() - started
+            snapshot = None
+            if 'memory' in self.modes:
+                snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            peak = tracemalloc.get_traced_memory()[1] if snapshot else None
+        finally:
+            if tracing:
+                tracemalloc.stop()
+        self.save(response, duration, snapshot, peak)
+        response['X-Profile-Id'] = self.id
+        return response
+
+    def save(self, response, duration, snapshot, peak):
+        directory = os.path.join(profile_dir(), self.id)
+        os.makedirs(directory, exist_ok=True)
+        match = self.request.resolver_match
+        meta = {
+            'id': self.id,
+            'captured_at': timezone.now().isoformat(),
+            'method': self.request.method,
+            'path': self.request.path,
+            'query': self.request.META.get('QUERY_STRING', ''),
+            'route': match.url_name if match else None,
+            'status': response.status_code,
+            'duration_seconds': duration,
+            'modes': self.modes,
+            'memory_peak_bytes': peak,
+            'pid': os.getpid(),
+        }
+        if self.profiler:
+            self.profiler.dump_stats(os.path.join(directory, 'cpu.prof'))
+        if snapshot:
+            snapshot.dump(os.path.join(directory, 'memory.snapshot'))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+
+def profile_request(request, get_response, modes):
+    if not _capture_lock.acquire(blocking=False):
+        response = get_response(request)
+        response['X-Profile-Id'] = 'busy'
+        return response
+    try:
+        return Capture(request, modes).run(get_response)
+    finally:
+        _capture_lock.release()
+
+
+# ----- Reading captures -----
+
+def list_captures(directory=None):
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory)):
+        try:
+            with open(os.path.join(directory, name, 'meta.json')) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def capture_path(capture_id, filename, directory=None):
+    return os.path.join(directory or profile_dir(), capture_id, filename)
+
+
+def cpu_summary(capture_id, sort='cumulative', limit=30, directory=None):
+    out = io.StringIO()
+    stats = pstats.Stats(capture_path(capture_id, 'cpu.prof', directory), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def cpu_diff(before_id, after_id, limit=30, directory=None):
+    """Return [(function, before_seconds, after_seconds)] by largest change in cumulative time."""
+    def cumulative(capture_id):
+        stats = pstats.Stats(capture_path(capture_id, 'cpu.prof', directory))
+        return {
+            f"{os.path.basename(filename)}:{line}({name})": entry[3]
+            for (filename, line, name), entry in stats.stats.items()
+        }
+
+    before, after = cumulative(before_id), cumulative(after_id)
+    rows = [(function, before.get(function, 0.0), after.get(function, 0.0)) for function in set(before) | set(after)]
+    rows.sort(key=lambda row: abs(row[2] - row[1]), reverse=True)
+    return rows[:limit]
+
+
+def memory_summary(capture_id, limit=20, directory=None):
+    snapshot = tracemalloc.Snapshot.load(capture_path(capture_id, 'memory.snapshot', directory))
+    return snapshot.statistics('lineno')[:limit]
+
+
+def memory_diff(before_id, after_id, limit=20, directory=None):
+    before = tracemalloc.Snapshot.load(capture_path(before_id, 'memory.snapshot', directory))
+    after = tracemalloc.Snapshot.load(capture_path(after_id, 'memory.snapshot', directory))
+    return after.compare_to(before, 'lineno')[:limit]
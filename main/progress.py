@@ -0,0 +1,142 @@
+# progress.py
+"""
+Set-based progress helpers shared by list endpoints.
+
+These mirror CourseLevelProgressSerializer.get_progress_percentage() but
+answer for many levels at once with a fixed number of queries.
+
+Quiz-based percentages are stored in ComputedLevelProgress. A quiz submission
+refreshes the submitter's row; content edits that change a level's quiz set
+queue a RecomputeProgressJob (enqueue_recompute()), which
+`manage.py recompute_progress --jobs` works through with a checkpoint per
+chunk of users. Levels without a stored row are computed on read, as before.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import (
+    ComputedLevelProgress, CourseLevel, Enrollment, Quiz, RecomputeProgressJob, UserLevelProgress, UserQuizAttempt,
+)
+
+
+def percentage(passed, total):
+    return int((passed / total) * 100) if total else 0
+
+
+def level_progress_map(user, level_ids):
+    """
+    Return {level_id: progress_percentage} for `level_ids`. A manual
+    UserLevelProgress entry wins over the stored quiz-based percentage, which
+    wins over computing it live. Two queries when every level has a stored row.
+    """
+    level_ids = list(level_ids)
+    progress = dict(
+        UserLevelProgress.objects
+        .filter(user=user, course_level_id__in=level_ids)
+        .values_list('course_level_id', 'progress')
+    )
+    remaining = [level_id for level_id in level_ids if level_id not in progress]
+    if remaining:
+        progress.update(
+            ComputedLevelProgress.objects
+            .filter(user=user, course_level_id__in=remaining)
+            .values_list('course_level_id', 'progress')
+        )
+        remaining = [level_id for level_id in remaining if level_id not in progress]
+    if not remaining:
+        return progress
+
+    passed_attempts = UserQuizAttempt.objects.filter(user=user, quiz=OuterRef('pk'), passed=True)
+    quizzes = (
+        Quiz.objects
+        .filter(level_id__in=remaining)
+        .annotate(passed=Exists(passed_attempts))
+        .values_list('level_id', 'passed')
+    )
+    totals = defaultdict(int)
+    completed = defaultdict(int)
+    for level_id, passed in quizzes:
+        totals[level_id] += 1
+        if passed:
+            completed[level_id] += 1
+
+    for level_id in remaining:
+        progress[level_id] = percentage(completed[level_id], totals[level_id])
+    return progress
+
+
+# ----- Stored progress -----
+
+def compute_progress(level_ids, user_ids):
+    """
+    Return {(user_id, level_id): (quizzes_passed, quizzes_total)} for every
+    user and level of a course the user is enrolled in, using four queries
+    however many users and levels are passed.
+    """
+    levels_of_course = defaultdict(list)
+    for level_id, course_id in CourseLevel.objects.filter(id__in=level_ids).values_list('id', 'course_id'):
+        levels_of_course[course_id].append(level_id)
+    enrolled = Enrollment.objects.filter(user_id__in=user_ids, course_id__in=list(levels_of_course)).values_list(
+        'user_id', 'course_id',
+    )
+    level_of = dict(Quiz.objects.filter(level_id__in=level_ids).values_list('id', 'level_id'))
+    totals = defaultdict(int)
+    for level_id in level_of.values():
+        totals[level_id] += 1
+    passed = defaultdict(int)
+    pairs = (
+        UserQuizAttempt.objects
+        .filter(user_id__in=user_ids, quiz_id__in=list(level_of), passed=True)
+        .values_list('user_id', 'quiz_id')
+        .distinct()
+    )
+    for user_id, quiz_id in pairs.iterator():
+        passed[(user_id, level_of[quiz_id])] += 1
+    return {
+        (user_id, level_id): (passed[(user_id, level_id)], totals[level_id])
+        for user_id, course_id in enrolled.iterator() for level_id in levels_of_course[course_id]
+    }
+
+
+def store_progress(level_ids, user_ids):
+    """Recompute and upsert stored progress for users' levels in their enrolled courses. Returns rows written."""
+    rows = [
+        ComputedLevelProgress(
+            user_id=user_id, course_level_id=level_id,
+            quizzes_passed=passed, quizzes_total=total, progress=percentage(passed, total),
+        )
+        for (user_id, level_id), (passed, total) in compute_progress(level_ids, user_ids).items()
+    ]
+    with transaction.atomic():
+        ComputedLevelProgress.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'course_level'],
+            update_fields=['quizzes_passed', 'quizzes_total', 'progress', 'computed_at'],
+        )
+    return len(rows)
+
+
+def affected_users(level_ids):
+    """Ids of users enrolled in any course owning one of `level_ids`, ascending."""
+    return (
+        Enrollment.objects
+        .filter(course__levels__id__in=level_ids)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+
+
+def enqueue_recompute(level_ids):
+    """
+    Queue a recompute of stored progress for `level_ids` across all enrolled
+    users, for the recompute_progress worker. Returns the job, or None.
+    """
+    level_ids = sorted({level_id for level_id in level_ids if level_id is not None})
+    if not level_ids:
+        return None
+    return RecomputeProgressJob.objects.create(level_ids=level_ids)
@@ -0,0 +1,165 @@
+# purge.py
+"""
+Soft delete and batched purge of courses and users.
+
+Deleting a Course or User through the ORM makes the deletion collector load
+every dependent progress and attempt row into memory in one transaction.
+Instead, soft_delete() only stamps deleted_at: the default managers hide the
+row straight away and the API stops serving it. `manage.py purge_deleted`
+later removes rows deleted more than SOFT_DELETE_GRACE_HOURS ago, walking
+the dependent tables from the leaves up and deleting them in small
+transactions of raw DELETEs, then deletes the (by then childless) root row
+normally so its own signals still run.
+
+Raw deletes skip signals, so the work those handlers would do (search
+unindexing, enrollment counters, media blob references, package files) is
+done here.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, search, storage
+from .dashboard import invalidate_dashboards
+from .models import (
+    ComputedLevelProgress, ContentChange, Course, CourseLevel, CoursePackage, Enrollment, ExamAnswer,
+    ExamAttemptSummary, ExamQuestion, ExamSession, LevelExam, Quiz, QuizAnswer, QuizAttemptSummary,
+    QuizQuestion, User, UserExamAttempt, UserExamAttemptArchive, UserLevelProgress, UserQuizAttempt,
+    UserQuizAttemptArchive, UserVideoProgress, Video,
+)
+
+GRACE_HOURS = getattr(settings, 'SOFT_DELETE_GRACE_HOURS', 24)
+BATCH_SIZE = 1000
+
+
+def _set_deleted_at(queryset, value):
+    ids = list(queryset.values_list('pk', flat=True))
+    queryset.model.all_objects.filter(pk__in=ids).update(deleted_at=value)
+    if queryset.model is Course:
+        # Dashboards list enrolled courses.
+        invalidate_dashboards(
+            Enrollment.objects.filter(course_id__in=ids).values_list('user_id', flat=True).distinct().iterator()
+        )
+    return len(ids)
+
+
+def soft_delete(queryset):
+    """Hide every row of `queryset` (Course or User). Returns the number of rows hidden."""
+    return _set_deleted_at(queryset.filter(deleted_at__isnull=True), timezone.now())
+
+
+def restore(queryset):
+    """Undo soft_delete() for rows that have not been purged yet."""
+    return _set_deleted_at(queryset.filter(deleted_at__isnull=False), None)
+
+
+def _quiz_in_course(course_id, prefix=''):
+    return Q(**{f'{prefix}level__course_id': course_id}) | Q(**{f'{prefix}video__level__course_id': course_id})
+
+
+def course_plan(course_id):
+    """(model, filter) pairs for everything below a course, leaves first."""
+    quiz = _quiz_in_course(course_id, 'quiz__')
+    exam = Q(exam__level__course_id=course_id)
+    return [
+        (UserVideoProgress, Q(video__level__course_id=course_id)),
+        (QuizAttemptSummary, quiz),
+        (UserQuizAttemptArchive, quiz),
+        (UserQuizAttempt, quiz),
+        (QuizAnswer, _quiz_in_course(course_id, 'question__quiz__')),
+        (QuizQuestion, quiz),
+        (Quiz, _quiz_in_course(course_id)),
+        (ExamSession, exam),
+        (ExamAttemptSummary, exam),
+        (UserExamAttemptArchive, exam),
+        (UserExamAttempt, exam),
+        (ExamAnswer, Q(question__exam__level__course_id=course_id)),
+        (ExamQuestion, exam),
+        (LevelExam, Q(level__course_id=course_id)),
+        (ComputedLevelProgress, Q(course_level__course_id=course_id)),
+        (UserLevelProgress, Q(course_level__course_id=course_id)),
+        (Video, Q(level__course_id=course_id)),
+        (CourseLevel, Q(course_id=course_id)),
+        (Enrollment, Q(course_id=course_id)),
+        (ContentChange, Q(course_id=course_id)),
+    ]
+
+
+def user_plan(user_id):
+    """(model, filter) pairs for everything below a user, leaves first."""
+    mine = Q(user_id=user_id)
+    return [
+        (UserVideoProgress, mine),
+        (QuizAttemptSummary, mine),
+        (UserQuizAttemptArchive, mine),
+        (UserQuizAttempt, mine),
+        (ExamSession, mine),
+        (ExamAttemptSummary, mine),
+        (UserExamAttemptArchive, mine),
+        (UserExamAttempt, mine),
+        (ComputedLevelProgress, mine),
+        (UserLevelProgress, mine),
+        (Enrollment, mine),
+    ]
+
+
+def _before_delete(model, pks):
+    """Stand-ins for the post_delete handlers the raw deletes bypass."""
+    if model is Video:
+        search.get_backend().remove(search.VIDEO, pks)
+        for name, n in Counter(Video.objects.filter(pk__in=pks).values_list('video_file', flat=True)).items():
+            storage.add_reference(name, -n)
+    elif model is QuizQuestion:
+        search.get_backend().remove(search.QUESTION, pks)
+    elif model is Enrollment:
+        course_ids = Enrollment.objects.filter(pk__in=pks).values_list('course_id', flat=True)
+        for course_id, n in Counter(course_ids).items():
+            counters.adjust(course_id, enrollments_count=-n)
+
+
+def delete_in_batches(model, condition, batch_size=BATCH_SIZE, progress=None):
+    """Delete matching rows `batch_size` at a time, one transaction per batch. Returns rows deleted."""
+    label = model._meta.label
+    deleted = 0
+    while True:
+        pks = list(model._base_manager.filter(condition).order_by().values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            _before_delete(model, pks)
+            queryset = model._base_manager.filter(pk__in=pks)
+            # No collector and no signals: the plan has already removed dependents.
+            deleted += queryset._raw_delete(queryset.db)
+        if progress:
+            progress(label, deleted)
+
+
+def purge_course(course_id, batch_size=BATCH_SIZE, progress=None):
+    """Remove a soft-deleted course and everything under it. Returns {model label: rows deleted}."""
+    deleted = {}
+    for model, condition in course_plan(course_id):
+        deleted[model._meta.label] = delete_in_batches(model, condition, batch_size, progress)
+    for package in CoursePackage.objects.filter(course_id=course_id):
+        package.file.delete(save=False)
+    Course.all_objects.filter(pk=course_id, deleted_at__isnull=False).delete()
+    return deleted
+
+
+def purge_user(user_id, batch_size=BATCH_SIZE, progress=None):
+    """Remove a soft-deleted user and everything they own. Returns {model label: rows deleted}."""
+    deleted = {}
+    for model, condition in user_plan(user_id):
+        deleted[model._meta.label] = delete_in_batches(model, condition, batch_size, progress)
+    User.all_objects.filter(pk=user_id, deleted_at__isnull=False).delete()
+    return deleted
+
+
+def purgeable(model, grace_hours=None):
+    """Soft-deleted rows of `model` whose grace period is over."""
+    grace_hours = GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    return model.all_objects.filter(deleted_at__isnull=False, deleted_at__lte=cutoff).order_by('deleted_at')
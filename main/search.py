@@ -0,0 +1,240 @@
+# search.py
+"""
+Full-text search over courses, videos and quiz questions.
+
+The backend is chosen by the SEARCH_BACKEND setting (a dotted path). By
+default SQLite databases get an FTS5 index, and any other database, or an
+SQLite build without FTS5 (where migration 0006 skips the index), falls back
+to DatabaseSearchBackend, which needs no index. The index is kept in step
+with content saves by the signal handlers in main/signals.py, and
+`manage.py rebuild_search_index` rebuilds it from scratch.
+"""
+import itertools
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection as default_connection, connections, router
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import Course, QuizQuestion, Video
+
+Document = namedtuple('Document', ['kind', 'object_id', 'course_id', 'title', 'body'])
+Hit = namedtuple('Hit', ['kind', 'object_id', 'course_id', 'title', 'snippet', 'score'])
+
+COURSE, VIDEO, QUESTION = 'course', 'video', 'question'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+# ----- Documents -----
+
+def course_documents(queryset=None):
+    queryset = Course.objects.all() if queryset is None else queryset
+    for pk, title, description in queryset.values_list('id', 'title', 'description').iterator():
+        yield Document(COURSE, pk, pk, title, description)
+
+
+def video_documents(queryset=None):
+    queryset = Video.objects.all() if queryset is None else queryset
+    for pk, title, course_id, level_name in queryset.values_list('id', 'title', 'level__course_id', 'level__name').iterator():
+        yield Document(VIDEO, pk, course_id, title, level_name)
+
+
+def question_documents(queryset=None):
+    queryset = QuizQuestion.objects.all() if queryset is None else queryset
+    rows = (
+        queryset
+        .annotate(course_id=Coalesce('quiz__level__course_id', 'quiz__video__level__course_id'))
+        .values_list('id', 'course_id', 'question_text')
+        .iterator()
+    )
+    for pk, course_id, question_text in rows:
+        if course_id is not None:
+            yield Document(QUESTION, pk, course_id, '', question_text)
+
+
+def all_documents():
+    yield from course_documents()
+    yield from video_documents()
+    yield from question_documents()
+
+
+# ----- Backends -----
+
+class SearchBackend:
+    """Interface every search backend implements."""
+
+    def index(self, documents):
+        raise NotImplementedError
+
+    def remove(self, kind, object_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, course_ids, limit=20, offset=0):
+        """Return (total, [Hit, ...]) for documents in `course_ids`, best first."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    FTS5 index in the `main_search_index` virtual table (created by migration
+    0006). Each document's rowid encodes its kind and id, so updates and
+    deletes are rowid lookups rather than scans.
+    """
+    table = 'main_search_index'
+    kinds = {COURSE: 1, VIDEO: 2, QUESTION: 3}
+    # bm25() weights in column order: kind, object_id, course_id, title, body.
+    weights = (0.0, 0.0, 0.0, 10.0, 1.0)
+
+    create_sql = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED, title, body, "
+        "tokenize = 'porter unicode61')"
+    )
+
+    def __init__(self, connection=None):
+        # Without one, writes go to the primary and searches wherever the
+        # router sends reads: a replica inside ReplicaReadMixin views.
+        self.connection = connection
+
+    def connection_for(self, write=False):
+        if self.connection is not None:
+            return self.connection
+        return connections[router.db_for_write(Course) if write else router.db_for_read(Course)]
+
+    def rowid(self, kind, object_id):
+        return object_id * 4 + self.kinds[kind]
+
+    def create(self):
+        with self.connection_for(write=True).cursor() as cursor:
+            cursor.execute(self.create_sql.format(table=self.table))
+
+    def index(self, documents):
+        rows = []
+        for document in documents:
+            rows.append((
+                self.rowid(document.kind, document.object_id), document.kind, document.object_id,
+                document.course_id, document.title, document.body,
+            ))
+        if not rows:
+            return 0
+        with self.connection_for(write=True).cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, kind, object_id, course_id, title, body) "
+                f"VALUES (%s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+        return len(rows)
+
+    def remove(self, kind, object_ids):
+        with self.connection_for(write=True).cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(self.rowid(kind, object_id),) for object_id in object_ids],
+            )
+
+    def clear(self):
+        with self.connection_for(write=True).cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def match_expression(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Quote every token so user input can't use FTS5 query syntax, and
+        # prefix-match the last one for search-as-you-type.
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search(self, query, course_ids, limit=20, offset=0):
+        expression = self.match_expression(query)
+        course_ids = list(course_ids)
+        if expression is None or not course_ids:
+            return 0, []
+        placeholders = ', '.join(['%s'] * len(course_ids))
+        where = f"{self.table} MATCH %s AND course_id IN ({placeholders})"
+        params = [expression, *course_ids]
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with self.connection_for().cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {self.table} WHERE {where}", params)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f"SELECT kind, object_id, course_id, title, "
+                f"snippet({self.table}, 4, '[', ']', '…', 12), bm25({self.table}, {weights}) AS rank "
+                f"FROM {self.table} WHERE {where} ORDER BY rank LIMIT %s OFFSET %s",
+                params + [limit, offset],
+            )
+            hits = [
+                Hit(kind, object_id, course_id, title, snippet, -rank)
+                for kind, object_id, course_id, title, snippet, rank in cursor.fetchall()
+            ]
+        return total, hits
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Index-free fallback using icontains filters. Only suitable for small
+    catalogs; configure a real full-text backend elsewhere.
+    """
+
+    def index(self, documents):
+        return 0
+
+    def remove(self, kind, object_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, course_ids, limit=20, offset=0):
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+
+        def matching(fields):
+            condition = Q()
+            for token in tokens:
+                token_condition = Q()
+                for field in fields:
+                    token_condition |= Q(**{f'{field}__icontains': token})
+                condition &= token_condition
+            return condition
+
+        sources = [
+            (course_documents, Course.objects.filter(matching(['title', 'description']), id__in=course_ids)),
+            (video_documents, Video.objects.filter(matching(['title']), level__course_id__in=course_ids)),
+            (question_documents, QuizQuestion.objects.filter(
+                matching(['question_text']),
+                Q(quiz__level__course_id__in=course_ids) | Q(quiz__video__level__course_id__in=course_ids),
+            )),
+        ]
+        total = 0
+        hits = []
+        for to_documents, queryset in sources:
+            total += queryset.count()
+            for document in itertools.islice(to_documents(queryset.order_by('id')), offset + limit):
+                hits.append(Hit(*document[:4], document.body[:200], 0.0))
+        return total, hits[offset:offset + limit]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if default_connection.vendor == 'sqlite' and SQLiteFTSBackend.table in default_connection.introspection.table_names():
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
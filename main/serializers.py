@@ -14,13 +14,16 @@ User = get_user_model()
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'created_at']
+        fields = [
+            'id', 'title', 'description', 'created_at',
+            'levels_count', 'videos_count', 'quizzes_count', 'enrollments_count',
+        ]
 
 
 class CourseLevelSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseLevel
-        fields = ['id', 'course', 'name', 'order']
+        fields = ['id', 'course', 'name', 'order', 'videos_count', 'quizzes_count']
 
 
 # serializers.py
@@ -31,7 +34,7 @@ class CourseLevelProgressSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CourseLevel
-        fields = ['id', 'course', 'name', 'order', 'progress_percentage']
+        fields = ['id', 'course', 'name', 'order', 'videos_count', 'quizzes_count', 'progress_percentage']
 
     def get_progress_percentage(self, obj):
         user = self.context.get('request').user
@@ -43,6 +46,11 @@ class CourseLevelProgressSerializer(serializers.ModelSerializer):
         except UserLevelProgress.DoesNotExist:
             pass
 
+        # Then the stored quiz-based percentage (see main/progress.py).
+        computed = obj.computed_progress.filter(user=user).values_list('progress', flat=True).first()
+        if computed is not None:
+            return computed
+
         # Fallback: compute progress based on quiz attempts.
         quizzes = obj.quizzes.all()
         total_quizzes = quizzes.count()
@@ -59,7 +67,7 @@ class CourseLevelProgressSerializer(serializers.ModelSerializer):
 class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
-        fields = ['id', 'title', 'level', 'order', 'video_file']
+        fields = ['id', 'title', 'level', 'order', 'video_file', 'duration', 'file_size']
 
 
 class UserVideoProgressSerializer(serializers.ModelSerializer):
@@ -118,6 +126,37 @@ class LevelExamSerializer(serializers.ModelSerializer):
         fields = ['id', 'level', 'passing_score', 'questions']
 
 
+# Offline packages (main/packages.py) are downloaded ahead of time, so their
+# quizzes and exams leave out which answers are correct.
+
+class PackagedQuizAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuizAnswer
+        fields = ['id', 'answer_text']
+
+
+class PackagedQuizQuestionSerializer(QuizQuestionSerializer):
+    answers = PackagedQuizAnswerSerializer(many=True, read_only=True)
+
+
+class PackagedQuizSerializer(QuizSerializer):
+    questions = PackagedQuizQuestionSerializer(many=True, read_only=True)
+
+
+class PackagedExamAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExamAnswer
+        fields = ['id', 'answer_text']
+
+
+class PackagedExamQuestionSerializer(ExamQuestionSerializer):
+    answers = PackagedExamAnswerSerializer(many=True, read_only=True)
+
+
+class PackagedLevelExamSerializer(LevelExamSerializer):
+    questions = PackagedExamQuestionSerializer(many=True, read_only=True)
+
+
 class UserExamAttemptSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserExamAttempt
@@ -0,0 +1,396 @@
+# signals.py
+"""
+Keep derived data in step with content edits made through the ORM.
+
+Bulk operations (bulk_create, QuerySet.update, raw deletes) skip these
+handlers; the matching management commands rebuild from scratch.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import completion, counters, exam_sessions, live, packages, progress, search, storage, unlocks
+from .models import (
+    ContentChange, Course, CourseLevel, Enrollment, ExamAnswer, ExamQuestion, LevelExam, Quiz, QuizAnswer, QuizQuestion, User,
+    UserExamAttempt, Video,
+)
+
+
+# ----- Search index -----
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index([
+            search.Document(search.COURSE, instance.pk, instance.pk, instance.title, instance.description),
+        ])
+
+
+@receiver(post_save, sender=Video)
+def index_video(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index(search.video_documents(Video.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_save, sender=QuizQuestion)
+def index_question(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index(search.question_documents(QuizQuestion.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_save, sender=CourseLevel)
+def reindex_level(sender, instance, created=False, raw=False, **kwargs):
+    # Videos carry the level name, and both videos and questions its course.
+    if created or raw:
+        return
+    backend = search.get_backend()
+    backend.index(search.video_documents(Video.objects.filter(level=instance)))
+    backend.index(search.question_documents(QuizQuestion.objects.filter(quiz__level=instance)))
+
+
+@receiver(post_save, sender=Quiz)
+def reindex_quiz(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    questions = QuizQuestion.objects.filter(quiz=instance)
+    backend = search.get_backend()
+    backend.remove(search.QUESTION, list(questions.values_list('id', flat=True)))
+    backend.index(search.question_documents(questions))
+
+
+@receiver(pre_delete, sender=CourseLevel)
+@receiver(pre_delete, sender=Video)
+def unindex_detached_questions(sender, instance, **kwargs):
+    # Quizzes are SET_NULL rather than deleted, which would orphan their questions.
+    lookup = 'quiz__level' if sender is CourseLevel else 'quiz__video'
+    question_ids = QuizQuestion.objects.filter(**{lookup: instance}).values_list('id', flat=True)
+    search.get_backend().remove(search.QUESTION, list(question_ids))
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=QuizQuestion)
+def unindex(sender, instance, **kwargs):
+    kind = {Course: search.COURSE, Video: search.VIDEO, QuizQuestion: search.QUESTION}[sender]
+    search.get_backend().remove(kind, [instance.pk])
+
+
+# ----- Exam answer keys -----
+
+@receiver(post_save, sender=ExamQuestion)
+@receiver(post_delete, sender=ExamQuestion)
+def invalidate_question_answer_key(sender, instance, **kwargs):
+    exam_sessions.invalidate_answer_key(instance.exam_id)
+
+
+@receiver(post_save, sender=ExamAnswer)
+@receiver(post_delete, sender=ExamAnswer)
+def invalidate_answer_answer_key(sender, instance, **kwargs):
+    exam_id = ExamQuestion.objects.filter(pk=instance.question_id).values_list('exam_id', flat=True).first()
+    if exam_id is not None:
+        exam_sessions.invalidate_answer_key(exam_id)
+
+
+@receiver(post_delete, sender=LevelExam)
+def invalidate_exam_answer_key(sender, instance, **kwargs):
+    exam_sessions.invalidate_answer_key(instance.pk)
+
+
+# ----- Content change log -----
+# Deletes are recorded in pre_delete, while the parents that lead to the
+# course still exist. Child rows (questions, answers) are logged as a change
+# to their quiz or exam, which is the unit clients sync.
+
+def _level_course_id(level_id):
+    return CourseLevel.objects.filter(pk=level_id).values_list('course_id', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+def log_course_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        packages.record_change(instance.pk, packages.COURSE, instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def drop_course_changes(sender, instance, **kwargs):
+    ContentChange.objects.filter(course_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=CourseLevel)
+@receiver(pre_delete, sender=CourseLevel)
+def log_level_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    packages.record_change(instance.course_id, packages.LEVEL, instance.pk)
+    if 'created' not in kwargs:
+        # Deleting a level detaches its quizzes (SET_NULL) without a signal.
+        for quiz_id in Quiz.objects.filter(level=instance).values_list('id', flat=True):
+            packages.record_change(instance.course_id, packages.QUIZ, quiz_id)
+
+
+@receiver(post_save, sender=Video)
+@receiver(pre_delete, sender=Video)
+def log_video_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    course_id = _level_course_id(instance.level_id)
+    packages.record_change(course_id, packages.VIDEO, instance.pk)
+    if 'created' not in kwargs:
+        for quiz_id in Quiz.objects.filter(video=instance).values_list('id', flat=True):
+            packages.record_change(course_id, packages.QUIZ, quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(pre_delete, sender=Quiz)
+def log_quiz_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        packages.record_change(packages.quiz_course_id(instance), packages.QUIZ, instance.pk)
+
+
+@receiver(post_save, sender=QuizQuestion)
+@receiver(pre_delete, sender=QuizQuestion)
+@receiver(post_save, sender=QuizAnswer)
+@receiver(pre_delete, sender=QuizAnswer)
+def log_quiz_content_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    quiz_id = instance.quiz_id if sender is QuizQuestion else (
+        QuizQuestion.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    )
+    quiz = Quiz.objects.filter(pk=quiz_id).only('id', 'level_id', 'video_id').first()
+    if quiz is not None:
+        packages.record_change(packages.quiz_course_id(quiz), packages.QUIZ, quiz.pk)
+
+
+@receiver(post_save, sender=LevelExam)
+@receiver(pre_delete, sender=LevelExam)
+def log_exam_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        packages.record_change(_level_course_id(instance.level_id), packages.EXAM, instance.pk)
+
+
+@receiver(post_save, sender=ExamQuestion)
+@receiver(pre_delete, sender=ExamQuestion)
+@receiver(post_save, sender=ExamAnswer)
+@receiver(pre_delete, sender=ExamAnswer)
+def log_exam_content_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    questions = ExamQuestion.objects.filter(pk=instance.pk if sender is ExamQuestion else instance.question_id)
+    row = questions.values_list('exam_id', 'exam__level__course_id').first()
+    if row is not None:
+        packages.record_change(row[1], packages.EXAM, row[0])
+
+
+# ----- Catalog counters -----
+# pre_save remembers where a row was so post_save can move its counts.
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        counters.adjust(instance.course_id, enrollments_count=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    counters.adjust(instance.course_id, enrollments_count=-1)
+
+
+@receiver(pre_save, sender=CourseLevel)
+def remember_level_course(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._counted_course_id = CourseLevel.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+
+
+@receiver(post_save, sender=CourseLevel)
+def count_level(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.adjust(instance.course_id, levels_count=1)
+        return
+    previous = getattr(instance, '_counted_course_id', instance.course_id)
+    if previous != instance.course_id:
+        counters.recount_course(previous)
+        counters.recount_course(instance.course_id)
+
+
+@receiver(post_delete, sender=CourseLevel)
+def recount_level_course(sender, instance, **kwargs):
+    # The level's videos are gone and its quizzes detached; recount rather
+    # than follow the cascade.
+    counters.recount_course(instance.course_id)
+
+
+@receiver(pre_save, sender=Video)
+def remember_stored_video(sender, instance, raw=False, **kwargs):
+    # One lookup for this section, the media references and the layouts below.
+    if raw or not instance.pk:
+        return
+    stored = Video._base_manager.filter(pk=instance.pk).values('level_id', 'video_file', 'order').first()
+    instance._counted_level_id = stored and stored['level_id']
+    instance._stored_media_name = stored and stored['video_file']
+    instance._stored_position = stored and (stored['level_id'], stored['order'])
+
+
+@receiver(post_save, sender=Video)
+def count_video(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.adjust(counters.level_course_id(instance.level_id), instance.level_id, videos_count=1)
+        return
+    previous = getattr(instance, '_counted_level_id', instance.level_id)
+    if previous is not None and previous != instance.level_id:
+        # Quizzes attached only to this video move with it.
+        quizzes = Quiz.objects.filter(video=instance, level=None).count()
+        counters.adjust(counters.level_course_id(previous), previous, videos_count=-1, quizzes_count=-quizzes)
+        counters.adjust(counters.level_course_id(instance.level_id), instance.level_id,
+                        videos_count=1, quizzes_count=quizzes)
+
+
+@receiver(pre_delete, sender=Video)
+def uncount_video(sender, instance, **kwargs):
+    # Quizzes attached only to this video are detached (SET_NULL) and stop counting.
+    quizzes = Quiz.objects.filter(video=instance, level=None).count()
+    counters.adjust(counters.level_course_id(instance.level_id), instance.level_id,
+                    videos_count=-1, quizzes_count=-quizzes)
+
+
+@receiver(pre_save, sender=Quiz)
+def remember_quiz_level(sender, instance, raw=False, **kwargs):
+    # (level_id, video_id) as stored; also read by enqueue_progress_recompute().
+    if instance.pk and not raw:
+        instance._stored_quiz = Quiz.objects.filter(pk=instance.pk).values_list('level_id', 'video_id').first()
+
+
+@receiver(post_save, sender=Quiz)
+def count_quiz(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    home = counters.quiz_home_level_id(instance.level_id, instance.video_id)
+    if created:
+        previous = None
+    elif hasattr(instance, '_stored_quiz'):
+        previous = counters.quiz_home_level_id(*instance._stored_quiz) if instance._stored_quiz else None
+    else:
+        previous = home
+    if previous != home:
+        counters.adjust(counters.level_course_id(previous), previous, quizzes_count=-1)
+        counters.adjust(counters.level_course_id(home), home, quizzes_count=1)
+
+
+@receiver(pre_delete, sender=Quiz)
+def uncount_quiz(sender, instance, **kwargs):
+    home = counters.quiz_home_level_id(instance.level_id, instance.video_id)
+    counters.adjust(counters.level_course_id(home), home, quizzes_count=-1)
+
+
+# ----- Media blob references -----
+
+MEDIA_FIELDS = {Video: 'video_file', User: 'profile_photo'}
+
+
+@receiver(pre_save, sender=User)
+def remember_media_file(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A video's stored file is read by remember_stored_video(). Logins save
+    # User with update_fields=['last_login']; skip the lookup then.
+    if raw or not instance.pk or (update_fields is not None and 'profile_photo' not in update_fields):
+        return
+    instance._stored_media_name = User._base_manager.filter(pk=instance.pk).values_list('profile_photo', flat=True).first()
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=User)
+def count_media_reference(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    name = getattr(instance, MEDIA_FIELDS[sender]).name or ''
+    if created:
+        storage.add_reference(name)
+    elif hasattr(instance, '_stored_media_name'):
+        storage.retarget(instance.__dict__.pop('_stored_media_name') or '', name)
+
+
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=User)
+def release_media_reference(sender, instance, **kwargs):
+    storage.add_reference(getattr(instance, MEDIA_FIELDS[sender]).name, -1)
+
+
+# ----- Completion bitmap layouts -----
+# Bitmaps index videos by position in the course, so anything that moves a
+# position bumps the course's layout version (main/completion.py). Where a
+# saved video was is recorded by remember_stored_video().
+
+@receiver(post_save, sender=Video)
+def move_video_position(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    stored = instance.__dict__.pop('_stored_position', None)
+    if created or stored is None:
+        completion.bump_layout(counters.level_course_id(instance.level_id))
+    elif stored != (instance.level_id, instance.order):
+        old_course_id = counters.level_course_id(stored[0])
+        new_course_id = counters.level_course_id(instance.level_id)
+        completion.bump_layout(old_course_id)
+        if new_course_id != old_course_id:
+            completion.bump_layout(new_course_id)
+
+
+@receiver(pre_delete, sender=Video)
+def drop_video_position(sender, instance, **kwargs):
+    completion.bump_layout(counters.level_course_id(instance.level_id))
+
+
+@receiver(pre_save, sender=CourseLevel)
+def remember_level_position(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._stored_position = CourseLevel.objects.filter(pk=instance.pk).values_list('course_id', 'order').first()
+
+
+@receiver(post_save, sender=CourseLevel)
+def move_level_position(sender, instance, created=False, raw=False, **kwargs):
+    # A new level has no videos yet; a deleted one's videos bump on their own.
+    stored = instance.__dict__.pop('_stored_position', None)
+    if raw or created or stored is None or stored == (instance.course_id, instance.order):
+        return
+    completion.bump_layout(stored[0])
+    if stored[0] != instance.course_id:
+        completion.bump_layout(instance.course_id)
+
+
+# ----- Level unlock frontiers -----
+
+@receiver(post_save, sender=CourseLevel)
+@receiver(post_delete, sender=CourseLevel)
+def open_first_level(sender, instance, raw=False, **kwargs):
+    if not raw:
+        unlocks.open_first_level(instance.course_id)
+
+
+# ----- Stored level progress -----
+# Adding, moving or removing a level quiz changes the progress of every user
+# enrolled in the course; the recompute_progress worker refreshes it.
+
+@receiver(post_save, sender=Quiz)
+def enqueue_progress_recompute(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, '_stored_quiz', None)
+    previous = stored[0] if stored and not created else None
+    if created or previous != instance.level_id:
+        progress.enqueue_recompute([previous, instance.level_id])
+
+
+@receiver(post_delete, sender=Quiz)
+def enqueue_removed_quiz_recompute(sender, instance, **kwargs):
+    progress.enqueue_recompute([instance.level_id])
+
+
+# ----- Live exam monitoring -----
+
+@receiver(post_save, sender=UserExamAttempt)
+def announce_exam_attempt(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: live.get_broker().attempts_created([instance.pk]))
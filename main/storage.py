@@ -0,0 +1,220 @@
+# storage.py
+"""
+Content-addressed media storage for Video.video_file and User.profile_photo.
+
+Uploads are hashed (SHA-256) while they are streamed to a temporary file and
+then stored once as `blobs/<2 hex>/<digest><ext>`. A second upload of the
+same bytes, under any filename, reuses the existing blob. Blob names never
+change content, so they are served with a one-year `immutable` cache policy
+(see views.serve_blob; in production point the web server's `/blobs/`
+location at MEDIA_ROOT/blobs with the same headers).
+
+MediaBlob rows count how many Video/User rows reference each blob; the
+signal handlers in main/signals.py keep the counts, and `manage.py
+gc_media_blobs` deletes blobs nobody has referenced for
+MEDIA_BLOB_GC_GRACE_HOURS. Files stored before this backend keep their
+original names until `manage.py adopt_media_files` moves them into blobs.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_DIR = 'blobs'
+BLOB_NAME = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})(?P<ext>\.[\w]+)?$')
+CACHE_SECONDS = 365 * 24 * 60 * 60
+GC_GRACE_HOURS = getattr(settings, 'MEDIA_BLOB_GC_GRACE_HOURS', 24)
+
+
+def digest_of(name):
+    """The blob digest in a stored file name, or None for names outside the blob store."""
+    match = BLOB_NAME.match(name or '')
+    return match.group('digest') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name is the content digest, chosen in _save().
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        tmp_dir = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            digest = hasher.hexdigest()
+
+            blob = MediaBlob.objects.filter(digest=digest).first()
+            if blob is not None and self.exists(blob.name):
+                # Touch it so a concurrent gc_media_blobs run leaves it alone.
+                MediaBlob.objects.filter(digest=digest).update(touched_at=timezone.now())
+                return blob.name
+
+            ext = os.path.splitext(name)[1].lower()
+            blob_name = f"{BLOB_DIR}/{digest[:2]}/{digest}{ext}"
+            os.makedirs(os.path.dirname(self.path(blob_name)), exist_ok=True)
+            os.replace(tmp_path, self.path(blob_name))
+            if self.file_permissions_mode is not None:
+                os.chmod(self.path(blob_name), self.file_permissions_mode)
+            MediaBlob.objects.update_or_create(
+                digest=digest, defaults={'name': blob_name, 'size': size, 'touched_at': timezone.now()},
+            )
+            return blob_name
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete(self, name):
+        # Blobs may be shared; only gc_media_blobs removes them, via delete_blob().
+        if digest_of(name) is None:
+            super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    """Callable for FileField(storage=...), so migrations don't serialize the instance."""
+    return blob_storage
+
+
+# ----- Course packages -----
+# A package holds the content a user has unlocked, so packages live outside
+# MEDIA_ROOT and are only served through views.CoursePackageFileView.
+
+package_storage = FileSystemStorage(location=getattr(settings, 'COURSE_PACKAGE_DIR', None))
+
+
+def get_package_storage():
+    return package_storage
+
+
+# ----- Reference counts -----
+
+def add_reference(name, delta=1):
+    from .models import MediaBlob
+
+    digest = digest_of(name)
+    if digest is not None and delta:
+        MediaBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + delta, touched_at=timezone.now())
+
+
+def retarget(old_name, new_name):
+    """Move one reference from `old_name` to `new_name` (either may be empty or a legacy path)."""
+    if old_name != new_name:
+        add_reference(new_name)
+        add_reference(old_name, -1)
+
+
+def referenced_names(names):
+    """The subset of `names` still stored on a Video or User row."""
+    from .models import User, Video
+
+    names = list(names)
+    found = set(Video.objects.filter(video_file__in=names).values_list('video_file', flat=True))
+    found.update(User.all_objects.filter(profile_photo__in=names).values_list('profile_photo', flat=True))
+    return found
+
+
+def exact_reference_counts():
+    """{digest: n} for every blob referenced by a Video or User row."""
+    from .models import User, Video
+
+    counts = {}
+    sources = (
+        Video.objects.filter(video_file__startswith=f'{BLOB_DIR}/').values_list('video_file', flat=True),
+        User.all_objects.filter(profile_photo__startswith=f'{BLOB_DIR}/').values_list('profile_photo', flat=True),
+    )
+    for source in sources:
+        for name in source.iterator():
+            digest = digest_of(name)
+            if digest is not None:
+                counts[digest] = counts.get(digest, 0) + 1
+    return counts
+
+
+def fix_reference_counts():
+    """Set ref_count to the exact count everywhere. Returns {digest: (stored, exact)} for rows that were off."""
+    from .models import MediaBlob
+
+    exact = exact_reference_counts()
+    drift = {
+        digest: (stored, exact.get(digest, 0))
+        for digest, stored in MediaBlob.objects.values_list('digest', 'ref_count').iterator()
+        if stored != exact.get(digest, 0)
+    }
+    for digest, (_, count) in drift.items():
+        MediaBlob.objects.filter(digest=digest).update(ref_count=count)
+    return drift
+
+
+# ----- Garbage collection -----
+
+def _cutoff(grace_hours):
+    return timezone.now() - timedelta(hours=GC_GRACE_HOURS if grace_hours is None else grace_hours)
+
+
+def unreferenced_blobs(grace_hours=None):
+    """Blobs with no references that nobody has stored or referenced within the grace period."""
+    from .models import MediaBlob
+
+    return MediaBlob.objects.filter(ref_count__lte=0, touched_at__lte=_cutoff(grace_hours)).order_by('touched_at')
+
+
+def collect_garbage(grace_hours=None, dry_run=False, chunk_size=500):
+    """
+    Delete unreferenced blobs, then stray files under blobs/ that have no
+    MediaBlob row (interrupted uploads). References are re-checked against
+    the Video and User tables first, so a drifted count never loses a file.
+    Returns (blobs deleted, bytes freed, stray files deleted).
+    """
+    from .models import MediaBlob
+
+    cutoff = _cutoff(grace_hours)
+    candidates = list(unreferenced_blobs(grace_hours).values_list('digest', 'name', 'size'))
+    deleted = freed = 0
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        live = referenced_names(name for _, name, _ in chunk)
+        for digest, name, size in chunk:
+            if name in live:
+                continue
+            if not dry_run:
+                # Conditional, so a blob re-uploaded since the query above survives.
+                if not MediaBlob.objects.filter(digest=digest, ref_count__lte=0, touched_at__lte=cutoff).delete()[0]:
+                    continue
+                blob_storage.delete_blob(name)
+            deleted += 1
+            freed += size
+
+    strays = 0
+    root = blob_storage.path(BLOB_DIR)
+    known = set(MediaBlob.objects.values_list('name', flat=True))
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, blob_storage.location).replace(os.sep, '/')
+            if name in known or os.path.getmtime(path) > cutoff.timestamp():
+                continue
+            if not dry_run:
+                os.remove(path)
+            strays += 1
+    return deleted, freed, strays
@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import struct
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import checks
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from VWBE.database import enable_wal, sqlite_database
+
+from . import (
+    compaction, completion, counters, dashboard, exam_sessions, heartbeats, live, metrics, mp4, packages, profiling,
+    progress, purge, search, storage, unlocks, views,
+)
+from .checks import check_shared_cache
+from .db_routers import ReplicaRouter, replica_reads
+from .fast_serializers import serialize_courses, serialize_level_progress, serialize_videos
+from .models import (
+    ComputedLevelProgress, Course, CourseLevel, Enrollment, ExamAnswer, ExamQuestion, ExamSession, LevelExam, MediaBlob,
+    Quiz, QuizAnswer, QuizQuestion, RecomputeProgressJob, User, UserExamAttempt, UserLevelProgress, UserQuizAttempt,
+    UserVideoProgress, Video,
+)
+from .serializers import CourseLevelProgressSerializer, CourseSerializer, VideoSerializer
+
+
+class HeartbeatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        cls.video = Video.objects.create(title='Intro', level=level, order=1, duration=100)
+        Enrollment.objects.create(user=cls.user, course=course, unlocked_order=1)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = f'/api/videos/{self.video.id}/heartbeat/'
+        self.addCleanup(heartbeats.buffer.flush)
+
+    def heartbeat(self, position):
+        return self.client.post(self.url, {'position': position}, content_type='application/json')
+
+    def progress(self):
+        return UserVideoProgress.objects.get(user=self.user, video=self.video)
+
+    def test_positions_are_coalesced_and_visible_to_other_workers_once_flushed(self):
+        for position in (5, 10, 15):
+            self.assertEqual(self.heartbeat(position).status_code, 202)
+        self.assertFalse(UserVideoProgress.objects.exists())
+        self.assertEqual(self.client.get(self.url).json()['position'], 15)
+        # Another process's buffer only sees flushed positions.
+        self.assertIsNone(heartbeats.HeartbeatBuffer().get(self.user.id, self.video.id))
+
+        self.assertEqual(heartbeats.buffer.flush(), 1)
+        self.assertEqual(self.progress().position, 15)
+
+    def test_heartbeat_does_not_write_to_the_database(self):
+        self.heartbeat(5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.heartbeat(10).status_code, 202)
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_flush_keeps_a_newer_position_flushed_by_another_worker(self):
+        self.heartbeat(10)
+        other = heartbeats.HeartbeatBuffer()
+        other.record(self.user.id, self.video.id, 40)
+        other.flush()
+        self.assertEqual(heartbeats.buffer.flush(), 0)
+        self.assertEqual(self.progress().position, 40)
+
+    def test_threshold_completes_once(self):
+        response = self.heartbeat(95)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.progress().is_completed)
+        self.assertEqual(self.heartbeat(96).status_code, 202)
+        heartbeats.buffer.flush()
+        self.assertTrue(self.progress().is_completed)
+        self.assertEqual(self.progress().position, 96)
+
+    def test_flush_updates_the_row_complete_created(self):
+        self.heartbeat(20)
+        self.client.post(f'/api/videos/{self.video.id}/complete/')
+        self.heartbeat(30)
+        heartbeats.buffer.flush()
+        self.assertEqual(UserVideoProgress.objects.count(), 1)
+        self.assertTrue(self.progress().is_completed)
+        self.assertEqual(self.progress().position, 30)
+        self.assertTrue(self.client.get(self.url).json()['is_completed'])
+
+
+def mp4_box(box_type, payload):
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+
+class MP4Tests(TestCase):
+    CHUNKS = (b'first-chunk', b'second-chunk')
+
+    def write_mp4(self):
+        """A minimal moov-last MP4: 5s long, 640x360, with two chunks in mdat."""
+        ftyp = mp4_box(b'ftyp', b'isom\x00\x00\x02\x00isom')
+        mdat = mp4_box(b'mdat', b''.join(self.CHUNKS))
+        first = len(ftyp) + 8
+        self.offsets = [first, first + len(self.CHUNKS[0])]
+        mvhd = mp4_box(b'mvhd', bytes(12) + struct.pack('>II', 1000, 5000) + bytes(80))
+        tkhd = mp4_box(b'tkhd', bytes(76) + struct.pack('>II', 640 << 16, 360 << 16))
+        stco = mp4_box(b'stco', bytes(4) + struct.pack('>III', 2, *self.offsets))
+        stbl = mp4_box(b'stbl', stco)
+        trak = mp4_box(b'trak', tkhd + mp4_box(b'mdia', mp4_box(b'minf', stbl)))
+        fd, path = tempfile.mkstemp(suffix='.mp4')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(ftyp + mdat + mp4_box(b'moov', mvhd + trak))
+        self.addCleanup(os.remove, path)
+        return path
+
+    def chunk_offsets(self, path):
+        with open(path, 'rb') as f:
+            moov = next(box for box in mp4.top_level_boxes(f) if box[0] == b'moov')
+            tree = mp4._parse_tree(mp4._read_payload(f, moov))
+        return [offset for box in mp4._chunk_offset_boxes(tree) for offset in mp4._read_offsets(box)]
+
+    def test_reads_metadata(self):
+        metadata = mp4.read_metadata(self.write_mp4())
+        self.assertEqual(metadata['duration'], 5.0)
+        self.assertEqual((metadata['width'], metadata['height']), (640, 360))
+        self.assertFalse(metadata['faststart'])
+
+    def test_faststart_moves_moov_and_patches_chunk_offsets(self):
+        src = self.write_mp4()
+        dst = src + '.faststart'
+        self.addCleanup(os.remove, dst)
+        self.assertTrue(mp4.faststart(src, dst))
+
+        self.assertTrue(mp4.read_metadata(dst)['faststart'])
+        self.assertEqual(os.path.getsize(dst), os.path.getsize(src))
+        offsets = self.chunk_offsets(dst)
+        self.assertTrue(all(new > old for new, old in zip(offsets, self.offsets)))
+        with open(dst, 'rb') as f:
+            for offset, chunk in zip(offsets, self.CHUNKS):
+                f.seek(offset)
+                self.assertEqual(f.read(len(chunk)), chunk)
+        self.assertFalse(mp4.faststart(dst, dst + '.again'))
+
+    def test_rejects_non_mp4(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'not a video at all')
+        self.addCleanup(os.remove, path)
+        with self.assertRaises(mp4.MP4Error):
+            mp4.read_metadata(path)
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        cls.video = Video.objects.create(title='Intro', level=level, order=1)
+        Enrollment.objects.create(user=cls.user, course=course, unlocked_order=1)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def videos_completed(self):
+        return self.client.get('/api/me/dashboard/').json()['courses'][0]['levels'][0]['videos_completed']
+
+    def test_cache_is_shared_between_processes(self):
+        # A per-process cache would leave other gunicorn workers serving stale dashboards.
+        self.assertNotIsInstance(cache, LocMemCache)
+
+    def test_progress_write_invalidates_cached_dashboard(self):
+        self.assertEqual(self.videos_completed(), 0)
+        self.assertIsNotNone(cache.get(dashboard.cache_key(self.user.id)))
+        self.client.post(f'/api/videos/{self.video.id}/complete/')
+        self.assertIsNone(cache.get(dashboard.cache_key(self.user.id)))
+        self.assertEqual(self.videos_completed(), 1)
+
+    def test_query_count_does_not_grow_with_courses_on_a_cold_layout_cache(self):
+        def enroll_in_new_course(title):
+            course = Course.objects.create(title=title, description='')
+            level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+            Video.objects.create(title='Intro', level=level, order=1)
+            Video.objects.create(title='Next', level=level, order=2)
+            Enrollment.objects.create(user=self.user, course=course, unlocked_order=1)
+
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                dashboard.build_dashboard(self.user)
+            return len(queries)
+
+        single = count_queries()
+        for i in range(4):
+            enroll_in_new_course(f'Course {i}')
+        self.assertEqual(count_queries(), single)
+        self.client.post(f'/api/videos/{self.video.id}/complete/')
+        data = dashboard.build_dashboard(self.user)
+        self.assertEqual(data['courses'][0]['levels'][0]['videos_completed'], 1)
+        self.assertEqual(data['courses'][1]['next_video']['title'], 'Intro')
+
+
+class FastSerializerEquivalenceTests(TestCase):
+    """
+    The values()-based serializers must render byte-identical JSON to the
+    ModelSerializers they replace on list endpoints.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='Learn "Python" – fast.')
+        Course.objects.create(title='Empty', description='')
+        cls.levels = [
+            CourseLevel.objects.create(course=cls.course, name=name, order=order)
+            for order, name in enumerate(['Beginner', 'Intermediate', 'Professional'], start=1)
+        ]
+        Video.objects.create(title='Intro', level=cls.levels[0], order=1, video_file='videos/intro.mp4',
+                             duration=61.5, file_size=1024)
+        Video.objects.create(title='No file', level=cls.levels[0], order=2, video_file='')
+        quizzes = [Quiz.objects.create(level=cls.levels[0], passing_score=50, order=i) for i in range(3)]
+        UserQuizAttempt.objects.create(user=cls.user, quiz=quizzes[0], score=100, passed=True)
+        UserQuizAttempt.objects.create(user=cls.user, quiz=quizzes[1], score=10, passed=False)
+        UserLevelProgress.objects.create(user=cls.user, course_level=cls.levels[1], progress=40)
+
+    def assertSameJSON(self, fast, serializer):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(serializer.data))
+
+    def test_courses(self):
+        queryset = Course.objects.all()
+        self.assertSameJSON(serialize_courses(queryset), CourseSerializer(queryset, many=True))
+
+    def test_videos(self):
+        queryset = Video.objects.order_by('order')
+        self.assertSameJSON(serialize_videos(queryset), VideoSerializer(queryset, many=True))
+
+    def test_videos_with_request(self):
+        request = RequestFactory().get('/api/levels/1/videos/')
+        queryset = Video.objects.order_by('order')
+        self.assertSameJSON(
+            serialize_videos(queryset, request),
+            VideoSerializer(queryset, many=True, context={'request': request}),
+        )
+
+    def test_level_progress(self):
+        request = RequestFactory().get('/api/courses/1/levels/')
+        request.user = self.user
+        queryset = self.course.levels.order_by('order')
+        self.assertSameJSON(
+            serialize_level_progress(queryset, self.user),
+            CourseLevelProgressSerializer(queryset, many=True, context={'request': request}),
+        )
+
+
+class MetricsTests(TestCase):
+    def test_render_counters_and_cumulative_histograms(self):
+        registry = metrics.MetricsRegistry()
+        registry.inc('http_requests_total', {'route': 'course-list', 'method': 'GET', 'status': '200'}, 3)
+        registry.inc('cache_requests_total', {'cache': 'say "hi"\n', 'result': 'hit'})
+        for value in (0.003, 0.02, 0.02, 20):
+            registry.observe('grading_duration_seconds', value)
+        text = metrics.render([registry.snapshot()])
+
+        self.assertIn('# TYPE http_requests_total counter', text)
+        self.assertIn('http_requests_total{method="GET",route="course-list",status="200"} 3\n', text)
+        self.assertIn('cache_requests_total{cache="say \\"hi\\"\\n",result="hit"} 1\n', text)
+        self.assertIn('# TYPE grading_duration_seconds histogram', text)
+        self.assertIn('grading_duration_seconds_bucket{le="0.005"} 1\n', text)
+        self.assertIn('grading_duration_seconds_bucket{le="0.025"} 3\n', text)
+        self.assertIn('grading_duration_seconds_bucket{le="10"} 3\n', text)
+        self.assertIn('grading_duration_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn('grading_duration_seconds_count 4\n', text)
+
+    def test_merges_worker_snapshots_and_keeps_dead_workers_totals(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = metrics.MetricsRegistry(directory)
+        registry.inc('db_queries_total', {'route': 'dashboard'}, 2)
+        registry.observe('grading_duration_seconds', 0.01)
+        # Another worker's snapshot file, as its own registry would write it.
+        other = metrics.MetricsRegistry()
+        other.inc('db_queries_total', {'route': 'dashboard'}, 5)
+        other.observe('grading_duration_seconds', 0.2)
+        with open(os.path.join(directory, '999999.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+
+        text = metrics.render(registry.collect())
+        self.assertIn('db_queries_total{route="dashboard"} 7\n', text)
+        self.assertIn('grading_duration_seconds_count 2\n', text)
+
+        registry.mark_process_dead(999999)
+        self.assertFalse(os.path.exists(os.path.join(directory, '999999.json')))
+        self.assertIn('db_queries_total{route="dashboard"} 7\n', metrics.render(registry.collect()))
+
+
+class LevelUnlockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='')
+        cls.first = CourseLevel.objects.create(course=cls.course, name='Basics', order=1)
+        cls.second = CourseLevel.objects.create(course=cls.course, name='Functions', order=2)
+        LevelExam.objects.create(level=cls.first, passing_score=0)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_exam_pass_unlocks_next_level(self):
+        self.client.post(f'/api/courses/{self.course.id}/enroll/')
+        self.assertEqual(self.client.get(f'/api/levels/{self.first.id}/videos/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/levels/{self.second.id}/videos/').status_code, 403)
+
+        self.client.post(f'/api/levels/{self.first.id}/exam/submit/', {'answers': []}, content_type='application/json')
+        self.assertEqual(self.client.get(f'/api/levels/{self.second.id}/videos/').status_code, 200)
+
+    def test_gating_is_one_query(self):
+        Enrollment.objects.create(user=self.user, course=self.course, unlocked_order=1)
+        with CaptureQueriesContext(connection) as queries:
+            enrollment, denied = views.level_access(self.user, self.second)
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(len(queries), 1)
+
+    def test_first_level_stays_open_when_levels_change(self):
+        enrollment = Enrollment.objects.create(user=self.user, course=self.course, unlocked_order=1)
+        self.first.delete()
+        enrollment.refresh_from_db()
+        self.assertTrue(unlocks.is_level_unlocked(enrollment, self.second))
+
+        # Enrolled while the course had no levels.
+        course = Course.objects.create(title='Go', description='')
+        self.client.post(f'/api/courses/{course.id}/enroll/')
+        level = CourseLevel.objects.create(course=course, name='Basics', order=5)
+        self.assertEqual(self.client.get(f'/api/levels/{level.id}/videos/').status_code, 200)
+
+    def test_backfill_unlocks(self):
+        enrollment = Enrollment.objects.create(user=self.user, course=self.course)
+        UserExamAttempt.objects.create(user=self.user, exam=self.first.exam, score=100, passed=True)
+
+        call_command('backfill_unlocks', '--dry-run', stdout=StringIO())
+        enrollment.refresh_from_db()
+        self.assertIsNone(enrollment.unlocked_order)
+
+        call_command('backfill_unlocks', stdout=StringIO())
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.unlocked_order, 2)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.course = Course.objects.create(title='Python programming', description='Learn generators and decorators')
+        level = CourseLevel.objects.create(course=cls.course, name='Basics', order=1)
+        cls.video = Video.objects.create(title='Generators explained', level=level, order=1)
+        other = Course.objects.create(title='Generators in Go', description='')
+        Enrollment.objects.create(user=cls.user, course=cls.course, unlocked_order=1)
+        cls.other_id = other.id
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        search.get_backend.cache_clear()
+        self.addCleanup(search.get_backend.cache_clear)
+
+    def results(self, query):
+        return self.client.get('/api/search/', {'q': query}).json()['results']
+
+    def test_fts_ranks_title_matches_in_enrolled_courses(self):
+        self.assertIsInstance(search.get_backend(), search.SQLiteFTSBackend)
+        results = self.results('gener')
+        # Prefix match on the last token; the title hit outranks the description one.
+        self.assertEqual([(hit['type'], hit['id']) for hit in results], [('video', self.video.id), ('course', self.course.id)])
+        self.assertNotIn(self.other_id, [hit['course'] for hit in results])
+        # FTS5 query syntax in the input is matched as plain words, not parsed.
+        self.assertEqual(self.client.get('/api/search/', {'q': 'generators" NEAR(*'}).status_code, 200)
+
+    def test_fts_search_reads_from_the_routed_database(self):
+        backend = search.get_backend()
+        with mock.patch.object(search.router, 'db_for_read', return_value='replica') as db_for_read, \
+                mock.patch.object(search, 'connections', {'replica': connection}):
+            total, hits = backend.search('gener', [self.course.id])
+        db_for_read.assert_called_once_with(Course)
+        self.assertEqual(total, 2)
+
+    def test_falls_back_without_fts5_index(self):
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            backend = search.get_backend()
+        self.assertIsInstance(backend, search.DatabaseSearchBackend)
+        total, hits = backend.search('python generators', [self.course.id, self.other_id])
+        self.assertEqual(total, 1)
+        self.assertEqual([(hit.kind, hit.object_id) for hit in hits], [('course', self.course.id)])
+
+
+class CompactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        quiz = Quiz.objects.create(level=level, passing_score=50, order=1)
+        for score in (90, 10, 20, 30):
+            UserQuizAttempt.objects.create(user=cls.user, quiz=quiz, score=score, passed=score >= 50)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_ndjson_archive_appears_only_on_commit(self):
+        sink = compaction.NDJSONSink(self.directory)
+        with self.captureOnCommitCallbacks() as callbacks:
+            compaction.compact(compaction.KINDS['quiz'], sink, keep_latest=1)
+        # Staged, but not published until the transaction commits.
+        self.assertEqual([name for name in os.listdir(self.directory) if not name.endswith('.tmp')], [])
+        for callback in callbacks:
+            callback()
+        [name] = os.listdir(self.directory)
+        with gzip.open(os.path.join(self.directory, name), 'rt') as f:
+            self.assertEqual(sorted(json.loads(line)['score'] for line in f), [10, 20])
+        self.assertEqual(sorted(UserQuizAttempt.objects.values_list('score', flat=True)), [30, 90])
+
+    def test_rolled_back_batch_leaves_no_file(self):
+        sink = compaction.NDJSONSink(self.directory)
+        with mock.patch.object(compaction, '_update_summaries', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                compaction.compact(compaction.KINDS['quiz'], sink, keep_latest=1)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(UserQuizAttempt.objects.count(), 4)
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def test_student_scenario_reports_every_route(self):
+        self.addCleanup(heartbeats.buffer.flush)
+        out = StringIO()
+        call_command(
+            'loadtest', '--base-url', self.live_server_url, '--seed-users', '--seed-content',
+            '--concurrency', '1', '--duration', '2', '--correct-rate', '1', stdout=out, stderr=StringIO(),
+        )
+        output = out.getvalue()
+        self.assertIn('concurrency=1 ', output)
+        self.assertIn('errors=0 (0.0%)', output)
+        for route in ('POST token_obtain_pair', 'POST course-enroll', 'GET level-videos', 'POST video-heartbeat',
+                      'POST quiz-submit', 'POST exam-submit'):
+            self.assertIn(route, output)
+        # The scenario passed the first level's exam and moved on to the next level.
+        self.assertTrue(UserExamAttempt.objects.filter(user__username='loadtest-0', passed=True).exists())
+        self.assertEqual(UserVideoProgress.objects.filter(user__username='loadtest-0', is_completed=True).count(), 15)
+
+
+    def test_exam_rush_enrolls_then_submits_together(self):
+        out = StringIO()
+        call_command(
+            'loadtest', '--base-url', self.live_server_url, '--seed-users', '--seed-content', '--scenario', 'exam-rush',
+            '--concurrency', '3', '--duration', '1', stdout=out, stderr=StringIO(),
+        )
+        output = out.getvalue()
+        self.assertIn('errors=0 (0.0%)', output)
+        self.assertRegex(output, r'POST exam-submit +3 +0\.0 ')
+        self.assertEqual(UserExamAttempt.objects.filter(user__username__startswith='loadtest-').count(), 3)
+
+class ExamSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        exam = LevelExam.objects.create(level=level, passing_score=50)
+        cls.correct = {}
+        for order in (1, 2):
+            question = ExamQuestion.objects.create(exam=exam, question_text=f'Q{order}', order=order)
+            cls.correct[question.id] = ExamAnswer.objects.create(question=question, answer_text='yes', is_correct=True).id
+            ExamAnswer.objects.create(question=question, answer_text='no', is_correct=False)
+        Enrollment.objects.create(user=cls.user, course=course, unlocked_order=1)
+        cls.level = level
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.session_id = self.client.post(f'/api/levels/{self.level.id}/exam/session/').json()['id']
+
+    def save(self, answers):
+        return self.client.put(
+            f'/api/exam-sessions/{self.session_id}/answers/',
+            {'answers': [{'question_id': q, 'answer_id': a} for q, a in answers.items()]},
+            content_type='application/json',
+        )
+
+    def test_concurrent_autosaves_keep_each_others_answers(self):
+        # Two workers holding the same stale draft each save one answer.
+        first, second = exam_sessions.load(self.session_id), exam_sessions.load(self.session_id)
+        (q1, a1), (q2, a2) = self.correct.items()
+        exam_sessions.autosave(self.session_id, first, {q1: a1})
+        exam_sessions.autosave(self.session_id, second, {q2: a2})
+        self.assertEqual(exam_sessions.load(self.session_id)['answers'], self.correct)
+
+    def test_submit_grades_saved_answers(self):
+        self.assertEqual(self.save(self.correct).status_code, 202)
+        response = self.client.post(f'/api/exam-sessions/{self.session_id}/submit/')
+        self.assertEqual((response.json()['score'], response.json()['passed']), (100, True))
+        session = ExamSession.objects.get(pk=self.session_id)
+        self.assertEqual(session.answers, {str(q): a for q, a in self.correct.items()})
+        self.assertEqual(self.save(self.correct).status_code, 409)
+
+    def test_autosave_is_one_write_whatever_the_number_of_answers(self):
+        draft = exam_sessions.load(self.session_id)
+        (q1, a1), (q2, a2) = self.correct.items()
+        with CaptureQueriesContext(connection) as one:
+            exam_sessions.autosave(self.session_id, draft, {q1: a1})
+        with CaptureQueriesContext(connection) as both:
+            exam_sessions.autosave(self.session_id, draft, {q1: a1, q2: a2})
+        # The SELECT ... FOR UPDATE and the UPDATE, in one transaction (a savepoint here).
+        self.assertEqual(len(one), 4)
+        self.assertEqual(len(both), 4)
+        self.assertEqual([query['sql'].split()[0] for query in both].count('UPDATE'), 1)
+        self.assertEqual(ExamSession.objects.get(pk=self.session_id).answers, {str(q): a for q, a in self.correct.items()})
+
+    def test_autosave_after_deadline_is_refused(self):
+        ExamSession.objects.filter(pk=self.session_id).update(deadline=timezone.now())
+        cache.delete(exam_sessions.draft_key(self.session_id))
+        self.assertEqual(self.save(self.correct).status_code, 409)
+        response = self.client.post(f'/api/exam-sessions/{self.session_id}/submit/')
+        self.assertEqual(response.json()['score'], 0)
+
+    def test_per_process_cache_is_rejected(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['main.E001'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BufferedExamSessionTests(ExamSessionTests):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_autosave_is_one_write_whatever_the_number_of_answers(self):
+        draft = exam_sessions.load(self.session_id)
+        with self.assertNumQueries(0):
+            exam_sessions.autosave(self.session_id, draft, self.correct)
+        # Not flushed yet: the answers are only in the cache.
+        self.assertEqual(ExamSession.objects.get(pk=self.session_id).answers, {})
+        self.assertEqual(exam_sessions.load(self.session_id)['answers'], self.correct)
+
+
+class CoursePackageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='')
+        cls.levels = []
+        for order in (1, 2):
+            level = CourseLevel.objects.create(course=cls.course, name=f'Level {order}', order=order)
+            Video.objects.create(title=f'Video {order}', level=level, order=1)
+            quiz = Quiz.objects.create(level=level, passing_score=50, order=1)
+            question = QuizQuestion.objects.create(quiz=quiz, question_text='Q', order=1)
+            QuizAnswer.objects.create(question=question, answer_text='yes', is_correct=True)
+            exam = LevelExam.objects.create(level=level, passing_score=50)
+            question = ExamQuestion.objects.create(exam=exam, question_text='Q', order=1)
+            ExamAnswer.objects.create(question=question, answer_text='yes', is_correct=True)
+            cls.levels.append(level)
+        cls.enrollment = Enrollment.objects.create(user=cls.user, course=cls.course, unlocked_order=1)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for attribute in ('base_location', 'location'):
+            patcher = mock.patch.object(storage.package_storage, attribute, directory)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_package_holds_unlocked_levels_without_answer_keys(self):
+        packages.build_package(self.course.id, 1)
+        info = self.client.get(f'/api/courses/{self.course.id}/package/').json()
+        self.assertFalse(info['url'].startswith('http://testserver/media/'))
+        document = self.download(info['url'])
+        self.assertEqual([level['id'] for level in document['levels']], [self.levels[0].id])
+        self.assertEqual([video['level'] for video in document['videos']], [self.levels[0].id])
+        self.assertEqual(len(document['quizzes']), 1)
+        self.assertEqual(len(document['exams']), 1)
+        self.assertNotIn('is_correct', json.dumps(document))
+
+    def test_package_beyond_frontier_is_forbidden(self):
+        package = packages.build_package(self.course.id, 2)
+        response = self.client.get(f'/api/courses/{self.course.id}/package/{package.id}/')
+        self.assertEqual(response.status_code, 403)
+        anonymous = Client().get(f'/api/courses/{self.course.id}/package/{package.id}/')
+        self.assertEqual(anonymous.status_code, 401)
+
+    def test_sync_sends_levels_unlocked_since_the_cursor(self):
+        first = self.client.get(f'/api/courses/{self.course.id}/sync/').json()
+        self.assertEqual([level['id'] for level in first['content']['levels']], [self.levels[0].id])
+        self.assertTrue(first['cursor'].endswith(':1'))
+
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(unlocked_order=2)
+        second = self.client.get(f'/api/courses/{self.course.id}/sync/', {'cursor': first['cursor']}).json()
+        self.assertEqual(second['content']['levels'], [])
+        self.assertEqual([level['id'] for level in second['unlocked']['levels']], [self.levels[1].id])
+        self.assertNotIn('is_correct', json.dumps(second))
+
+
+class RecomputeProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'password')
+        cls.python = Course.objects.create(title='Python', description='')
+        cls.go = Course.objects.create(title='Go', description='')
+        cls.levels = []
+        for course in (cls.python, cls.go):
+            level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+            quizzes = [Quiz.objects.create(level=level, passing_score=50, order=order) for order in (1, 2, 3)]
+            cls.levels.append(level)
+            UserQuizAttempt.objects.create(user=cls.alice, quiz=quizzes[0], score=90, passed=True)
+            UserQuizAttempt.objects.create(user=cls.bob, quiz=quizzes[1], score=10, passed=False)
+        Enrollment.objects.create(user=cls.alice, course=cls.python, unlocked_order=1)
+        Enrollment.objects.create(user=cls.bob, course=cls.python, unlocked_order=1)
+        Enrollment.objects.create(user=cls.bob, course=cls.go, unlocked_order=1)
+        # Drop the jobs creating the quizzes queued; each test queues its own.
+        RecomputeProgressJob.objects.all().delete()
+
+    def test_stores_only_levels_of_enrolled_courses(self):
+        level_ids = [level.id for level in self.levels]
+        written = progress.store_progress(level_ids, [self.alice.id, self.bob.id])
+        self.assertEqual(written, 3)
+        self.assertFalse(ComputedLevelProgress.objects.filter(user=self.alice, course_level=self.levels[1]).exists())
+
+    def test_queued_job_matches_lazy_progress(self):
+        level_ids = [level.id for level in self.levels]
+        lazy = {user.id: progress.level_progress_map(user, level_ids) for user in (self.alice, self.bob)}
+        job = progress.enqueue_recompute(level_ids + [None])
+        self.assertEqual(job.level_ids, level_ids)
+
+        call_command('recompute_progress', '--jobs', '--chunk-size', '1', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual((job.last_user_id, job.written, job.error), (self.bob.id, 3, ''))
+        self.assertEqual(ComputedLevelProgress.objects.count(), 3)
+        for user in (self.alice, self.bob):
+            self.assertEqual(progress.level_progress_map(user, level_ids), lazy[user.id])
+
+    def test_interrupted_job_resumes_after_checkpoint(self):
+        job = RecomputeProgressJob.objects.create(
+            level_ids=[self.levels[0].id], last_user_id=self.alice.id, written=1, started_at=timezone.now(),
+        )
+        call_command('recompute_progress', '--jobs', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.written, 2)
+        self.assertEqual(list(ComputedLevelProgress.objects.values_list('user_id', flat=True)), [self.bob.id])
+
+
+    def test_quiz_changes_made_through_the_orm_queue_recomputes(self):
+        python, go = self.levels
+        quiz = Quiz.objects.create(level=python, passing_score=50, order=4)
+        quiz.passing_score = 60
+        quiz.save()
+        quiz.level = go
+        quiz.save()
+        quiz.delete()
+        self.assertEqual(
+            list(RecomputeProgressJob.objects.order_by('id').values_list('level_ids', flat=True)),
+            [[python.id], sorted([python.id, go.id]), [go.id]],
+        )
+
+class CatalogCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='')
+        cls.basics = CourseLevel.objects.create(course=cls.course, name='Basics', order=1)
+        cls.advanced = CourseLevel.objects.create(course=cls.course, name='Advanced', order=2)
+        cls.video = Video.objects.create(title='Intro', level=cls.basics, order=1)
+        Video.objects.create(title='Loops', level=cls.basics, order=2)
+        Quiz.objects.create(video=cls.video, passing_score=50, order=1)
+        Quiz.objects.create(level=cls.advanced, passing_score=50, order=1)
+        Enrollment.objects.create(user=cls.user, course=cls.course, unlocked_order=1)
+
+    def counts(self, obj, *fields):
+        obj.refresh_from_db()
+        return tuple(getattr(obj, field) for field in fields)
+
+    def test_signals_keep_counters_exact(self):
+        self.assertEqual(self.counts(self.course, *counters.COURSE_COUNTERS), (2, 2, 2, 1))
+        self.assertEqual(self.counts(self.basics, *counters.LEVEL_COUNTERS), (2, 1))
+
+        # A video-only quiz moves with its video.
+        self.video.level = self.advanced
+        self.video.save()
+        self.assertEqual(self.counts(self.basics, *counters.LEVEL_COUNTERS), (1, 0))
+        self.assertEqual(self.counts(self.advanced, *counters.LEVEL_COUNTERS), (1, 2))
+
+        self.advanced.delete()
+        self.assertEqual(self.counts(self.course, *counters.COURSE_COUNTERS), (1, 1, 0, 1))
+        self.assertEqual(counters.find_drift(), ({}, {}))
+
+    def test_find_and_fix_drift(self):
+        # Bulk writes skip the signal handlers.
+        Video.objects.bulk_create([Video(title='Bulk', level=self.basics, order=3)])
+        Course.objects.filter(pk=self.course.pk).update(enrollments_count=5)
+        course_drift, level_drift = counters.find_drift()
+        self.assertEqual(course_drift, {self.course.id: {'videos_count': (2, 3), 'enrollments_count': (5, 1)}})
+        self.assertEqual(level_drift, {self.basics.id: {'videos_count': (2, 3)}})
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn(f"Course {self.course.id}: enrollments_count 5 -> 1, videos_count 2 -> 3", out.getvalue())
+        self.assertNotEqual(counters.find_drift(), ({}, {}))
+
+        counters.fix_drift(course_drift, level_drift)
+        self.assertEqual(counters.find_drift(), ({}, {}))
+        self.assertEqual(self.counts(self.course, 'videos_count', 'enrollments_count'), (3, 1))
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(PROFILE_DIR=self.directory, PROFILE_TOKEN='s3cret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, **headers):
+        return self.client.get('/api/courses/', HTTP_X_PROFILE='cpu', **headers)
+
+    def test_token_or_staff_jwt_captures_a_profile(self):
+        response = self.get(HTTP_X_PROFILE_TOKEN='s3cret')
+        capture_id = response['X-Profile-Id']
+        self.assertTrue(os.path.exists(profiling.capture_path(capture_id, 'cpu.prof')))
+        self.assertEqual([capture['id'] for capture in profiling.list_captures()], [capture_id])
+
+        response = self.get(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+        self.assertIn('X-Profile-Id', response)
+
+    def test_other_requests_are_served_without_profiling(self):
+        for headers in (
+            {},
+            {'HTTP_X_PROFILE_TOKEN': 'wrong'},
+            {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.student)}'},
+            {'HTTP_AUTHORIZATION': 'Bearer not-a-token'},
+        ):
+            response = self.get(**headers)
+            self.assertNotIn('X-Profile-Id', response)
+        with override_settings(PROFILE_TOKEN=None):
+            self.assertNotIn('X-Profile-Id', self.get(HTTP_X_PROFILE_TOKEN=''))
+        self.assertEqual(profiling.list_captures(), [])
+
+
+class LeanAPIMiddlewareTests(TestCase):
+    """
+    API routes skip the session, CSRF, auth, messages and clickjacking
+    middleware; the admin must behave exactly as with the stock stack.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True, is_superuser=True)
+        cls.course = Course.objects.create(title='Python', description='')
+
+    def test_admin_middleware_checks_pass(self):
+        errors = [message for message in checks.run_checks() if message.id.startswith('admin.')]
+        self.assertEqual(errors, [])
+
+    def test_admin_login_page_sets_csrf_cookie_and_frame_options(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('csrftoken', response.cookies)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_admin_rejects_post_without_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post('/admin/login/', {'username': 'admin', 'password': 'password'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_session_login_and_messages(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get('/admin/login/')
+        token = client.cookies['csrftoken'].value
+        response = client.post('/admin/login/?next=/admin/', {
+            'username': 'admin', 'password': 'password', 'csrfmiddlewaretoken': token,
+        })
+        self.assertRedirects(response, '/admin/')
+        self.assertIn('sessionid', client.cookies)
+
+        # Logging in rotates the CSRF token.
+        token = client.cookies['csrftoken'].value
+        response = client.post(f'/admin/main/course/{self.course.id}/change/', {
+            'title': 'Python 3', 'description': 'Updated', 'csrfmiddlewaretoken': token,
+        }, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([str(message) for message in response.context['messages']][:1],
+                         [f'The course “<a href="/admin/main/course/{self.course.id}/change/">Python 3</a>” '
+                          f'was changed successfully.'])
+
+    def test_api_skips_browser_middleware(self):
+        client = Client(enforce_csrf_checks=True, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+        response = client.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertEqual(response.cookies, {})
+
+        # No CSRF token is needed for JWT-authenticated writes.
+        response = client.post(f'/api/courses/{self.course.id}/enroll/')
+        self.assertEqual(response.status_code, 201)
+
+
+class ReplicaRouterTests(TestCase):
+    def test_reads_use_replica_only_when_marked(self):
+        router = ReplicaRouter(replicas=['replica'])
+        self.assertEqual(router.db_for_read(Course), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Course), 'replica')
+            self.assertEqual(router.db_for_write(Course), 'default')
+        self.assertEqual(router.db_for_read(Course), 'default')
+
+    def test_no_replicas_configured(self):
+        with replica_reads():
+            self.assertEqual(ReplicaRouter(replicas=[]).db_for_read(Course), 'default')
+
+
+class SQLiteProfileTests(TestCase):
+    def test_wal_is_enabled_once_not_per_connection(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        database = sqlite_database(path, {})
+        self.assertNotIn('journal_mode', database['OPTIONS']['init_command'])
+        enable_wal(database)
+        with open(path, 'rb') as f:
+            header = f.read(20)
+        self.assertEqual(header[18:20], b'\x02\x02')
+
+
+class BulkEnrollmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        cls.alice = User.objects.create_user('alice', 'Alice@Example.com', 'password')
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='')
+        cls.other = Course.objects.create(title='Django', description='')
+        CourseLevel.objects.create(course=cls.course, name='Basics', order=1)
+        Enrollment.objects.create(user=cls.bob, course=cls.course)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+
+    def test_enrolls_by_username_and_email_and_skips_existing(self):
+        response = self.client.post('/api/enrollments/bulk/', {
+            'courses': [self.course.id, self.other.id],
+            'users': ['alice@example.com', 'bob', 'nobody'],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(response.json()['skipped'], 1)
+        self.assertEqual(response.json()['unknown'], ['nobody'])
+        self.assertEqual(Enrollment.objects.get(user=self.alice, course=self.course).unlocked_order, 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 2)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('cohort.csv', b'name,email\nAlice,alice@example.com\nBob,bob@example.com\n')
+        response = self.client.post('/api/enrollments/bulk/', {'courses': self.course.id, 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['skipped']), (1, 1))
+
+    def test_requires_staff_and_known_courses(self):
+        response = self.client.post('/api/enrollments/bulk/', {'courses': [999], 'users': ['alice']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.alice)}')
+        response = client.post('/api/enrollments/bulk/', {'courses': [self.course.id], 'users': ['alice']},
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class SoftDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cls.course = Course.objects.create(title='Python', description='')
+        cls.level = CourseLevel.objects.create(course=cls.course, name='Basics', order=1)
+        cls.quiz = Quiz.objects.create(level=cls.level, passing_score=50, order=1)
+        Enrollment.objects.create(user=cls.user, course=cls.course)
+        UserQuizAttempt.objects.create(user=cls.user, quiz=cls.quiz, score=100, passed=True)
+
+    def test_soft_deleted_username_cannot_be_registered_again(self):
+        purge.soft_delete(User.objects.filter(pk=self.user.pk))
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.post('/admin/main/user/add/', {
+            'username': self.user.username, 'password1': 'a-long-password-1', 'password2': 'a-long-password-1',
+            'usable_password': 'true',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('username', response.context['adminform'].form.errors)
+        self.assertEqual(User.all_objects.filter(username=self.user.username).count(), 1)
+
+        response = self.client.post(f'/admin/main/user/{admin_user.pk}/change/', {
+            'username': self.user.username, 'date_joined_0': '2024-01-01', 'date_joined_1': '00:00:00',
+        })
+        self.assertIn('username', response.context['adminform'].form.errors)
+
+    def test_deleted_course_is_hidden_then_purged(self):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        purge.soft_delete(Course.objects.filter(pk=self.course.pk))
+        self.assertEqual(client.get('/api/courses/').json(), [])
+        self.assertEqual(client.get(f'/api/courses/{self.course.id}/levels/').status_code, 404)
+
+        purge.purge_course(self.course.id, batch_size=1)
+        self.assertFalse(Course.all_objects.exists())
+        self.assertFalse(UserQuizAttempt.objects.exists())
+        self.assertFalse(Quiz.objects.exists())
+
+    def test_deleted_user_cannot_authenticate_and_purge_updates_counters(self):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        purge.soft_delete(User.objects.filter(pk=self.user.pk))
+        self.assertEqual(client.get('/api/courses/').status_code, 401)
+
+        purge.purge_user(self.user.id)
+        self.assertFalse(User.all_objects.exists())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 0)
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        course = Course.objects.create(title='Python', description='')
+        self.level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+
+    def upload(self, filename, content):
+        video = Video(title=filename, level=self.level, order=1)
+        video.video_file.save(filename, ContentFile(content))
+        return video
+
+    def test_same_content_is_stored_once_and_served_immutable(self):
+        first = self.upload('lecture.mp4', b'frames')
+        second = self.upload('lecture-copy.mp4', b'frames')
+        self.assertEqual(first.video_file.name, second.video_file.name)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+        response = self.client.get(first.video_file.url)
+        self.assertEqual(b''.join(response.streaming_content), b'frames')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(first.video_file.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_blob_bytes_are_counted_as_media_served(self):
+        video = self.upload('lecture.mp4', b'frames')
+        registry = metrics.MetricsRegistry()
+        with mock.patch('main.middleware.registry', registry):
+            response = self.client.get(video.video_file.url)
+            b''.join(response.streaming_content)
+        self.assertIn('media_bytes_served_total 6\n', metrics.render([registry.snapshot()]))
+
+    def test_saving_a_video_reads_its_stored_row_once(self):
+        video = self.upload('lecture.mp4', b'frames')
+        video.order = 2
+        with CaptureQueriesContext(connection) as queries:
+            video.save()
+        # The stored-row lookups of the pre_save handlers (the search index
+        # reads the video separately).
+        lookups = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT "main_video"') and 'LIMIT 1' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_gc_deletes_only_unreferenced_blobs(self):
+        kept = self.upload('kept.mp4', b'kept')
+        dropped = self.upload('dropped.mp4', b'dropped')
+        name = dropped.video_file.name
+        dropped.delete()
+        self.assertEqual(storage.collect_garbage(grace_hours=0), (1, len(b'dropped'), 0))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+        self.assertTrue(os.path.exists(kept.video_file.path))
+
+
+@override_settings(EXAM_EVENT_BROKER='main.live.LocalBroker')
+class LiveExamStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password', is_staff=True)
+        cls.student = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        cls.level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        cls.exam = LevelExam.objects.create(level=cls.level, passing_score=50)
+        UserExamAttempt.objects.create(user=cls.student, exam=cls.exam, score=20, passed=False)
+
+    def setUp(self):
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+
+    async def test_snapshot_then_attempts_with_running_pass_rate(self):
+        response = await self.async_client.get(
+            f'/api/levels/{self.level.id}/exam/live/', headers={'Authorization': f'Bearer {AccessToken.for_user(self.staff)}'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        snapshot = (await anext(events)).decode()
+        self.assertIn('event: snapshot', snapshot)
+        self.assertIn('"attempts":1,"passed":0', snapshot)
+
+        attempt = await UserExamAttempt.objects.acreate(user=self.student, exam=self.exam, score=90, passed=True)
+        await sync_to_async(live.get_broker().attempts_created)([attempt.id])
+        self.assertIn(f'id: {attempt.id}\nevent: attempt', (await anext(events)).decode())
+        self.assertIn('"attempts":2,"passed":1,"pass_rate":0.5', (await anext(events)).decode())
+        await events.aclose()
+
+    def test_poller_starts_from_the_subscribers_snapshot(self):
+        broker = live.PollingBroker(interval=0)
+        with mock.patch('main.live.threading.Thread'):
+            subscription = broker.subscribe([live.topic(live.EXAM, self.exam.id)], loop=None)
+        subscription.after_id = live.latest_attempt_id()
+        # Committed after the snapshot was read, before the poller's first read.
+        attempt = UserExamAttempt.objects.create(user=self.student, exam=self.exam, score=90, passed=True)
+
+        published = []
+
+        def publish(event):
+            published.append(event['attempt'])
+            subscription.close()
+
+        with mock.patch.object(broker, 'publish', publish), mock.patch('main.live.connection'):
+            broker._run()
+        self.assertEqual(published, [attempt.id])
+
+    async def test_poller_starts_at_the_table_tail_for_an_exam_without_attempts(self):
+        await UserExamAttempt.objects.abulk_create(
+            UserExamAttempt(user=self.student, exam=self.exam, score=20, passed=False) for _ in range(30)
+        )
+        level = await CourseLevel.objects.acreate(course_id=self.level.course_id, name='Advanced', order=2)
+        new_exam = await LevelExam.objects.acreate(level=level, passing_score=50)
+        broker = live.PollingBroker(interval=0)
+        with mock.patch('main.live.get_broker', return_value=broker), mock.patch('main.live.threading.Thread'):
+            events = aiter(live.stream(live.EXAM, new_exam.id))
+            self.assertIn('event: snapshot', await anext(events))
+        subscription, = broker._subscribers[live.topic(live.EXAM, new_exam.id)]
+        self.assertEqual(subscription.after_id, await sync_to_async(live.latest_attempt_id)())
+
+        attempt = await UserExamAttempt.objects.acreate(user=self.student, exam=new_exam, score=90, passed=True)
+        published = []
+
+        def publish(event):
+            published.append(event['attempt'])
+            subscription.close()
+
+        with mock.patch.object(broker, 'publish', publish), mock.patch('main.live.connection'):
+            await sync_to_async(broker._run)()
+        self.assertEqual(published, [attempt.id])
+        await events.aclose()
+
+    async def test_requires_staff(self):
+        response = await self.async_client.get(
+            f'/api/levels/{self.level.id}/exam/live/?access_token={AccessToken.for_user(self.student)}',
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class CompletionBitmapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        course = Course.objects.create(title='Python', description='')
+        cls.level = CourseLevel.objects.create(course=course, name='Basics', order=1)
+        cls.videos = [Video.objects.create(title=f'Video {i}', level=cls.level, order=i) for i in range(1, 4)]
+        cls.enrollment = Enrollment.objects.create(user=cls.user, course=course, unlocked_order=1)
+
+    def setUp(self):
+        # Layouts are cached by course id, which rolled-back tests reuse.
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def locks(self):
+        return [video['is_locked'] for video in self.client.get(f'/api/levels/{self.level.id}/videos/').json()]
+
+    def test_completion_sets_bit_and_locks_skip_progress_rows(self):
+        self.assertEqual(self.client.post(f'/api/videos/{self.videos[0].id}/complete/').status_code, 200)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(bytes(self.enrollment.completed_videos), b'\x01')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.locks(), [False, False, True])
+        self.assertFalse([q for q in queries if 'main_uservideoprogress' in q['sql']])
+
+    def test_reorder_rebuilds_bitmap(self):
+        UserVideoProgress.objects.create(user=self.user, video=self.videos[2], is_completed=True)
+        self.assertEqual(self.locks(), [False, True, True])
+
+        # Video 3 moves first; its completion now unlocks the next one.
+        first, last = self.videos[0], self.videos[2]
+        first.order, last.order = last.order, first.order
+        first.save()
+        last.save()
+        self.assertEqual(self.locks(), [False, False, True])
+        self.enrollment.refresh_from_db()
+        self.assertEqual(bytes(self.enrollment.completed_videos), completion.from_positions([0]))
@@ -0,0 +1,67 @@
+# unlocks.py
+"""
+Per-(user, course) level unlock frontier.
+
+Enrollment.unlocked_order holds the order of the highest level the user may
+open: the first level at enrollment, moved forward whenever a level exam is
+passed. Gating a level is then a comparison against the enrollment row the
+views already load, with no further query.
+
+The first level is always open, so when levels are added, reordered or
+deleted (main/signals.py) every frontier below the course's first level is
+raised to it. Enrollments from before frontiers were stored were filled in
+by migration 0018; backfill_unlocks re-derives them from exam attempts.
+"""
+from django.db.models import Min, Q
+
+from .models import CourseLevel, Enrollment
+
+
+def first_level_order(course_id):
+    return CourseLevel.objects.filter(course_id=course_id).aggregate(first=Min('order'))['first']
+
+
+def frontier_for(level_orders, max_passed_order):
+    """
+    Work out the frontier from a course's sorted level orders and the highest
+    level order whose exam the user has passed (or None).
+    """
+    if not level_orders:
+        return None
+    if max_passed_order is None:
+        return level_orders[0]
+    for order in level_orders:
+        if order > max_passed_order:
+            return order
+    return level_orders[-1]
+
+
+def is_level_unlocked(enrollment, level):
+    return enrollment.unlocked_order is not None and level.order <= enrollment.unlocked_order
+
+
+def open_first_level(course_id):
+    """Raise the course's frontiers that are below its first level (or unset) to it."""
+    first = first_level_order(course_id)
+    if first is not None:
+        Enrollment.objects.filter(course_id=course_id).filter(
+            Q(unlocked_order__lt=first) | Q(unlocked_order__isnull=True)
+        ).update(unlocked_order=first)
+
+
+def unlock_level(user, level):
+    """Move the user's frontier in `level.course` up to `level`, never back."""
+    Enrollment.objects.filter(user=user, course_id=level.course_id).filter(
+        Q(unlocked_order__lt=level.order) | Q(unlocked_order__isnull=True)
+    ).update(unlocked_order=level.order)
+
+
+def advance_past(user, level):
+    """
+    Unlock the level after `level` once its exam is passed. Returns that
+    level, or None if `level` was the last one in the course.
+    """
+    next_level = CourseLevel.objects.filter(course_id=level.course_id, order__gt=level.order).order_by('order').first()
+    if next_level:
+        unlock_level(user, next_level)
+    return next_level
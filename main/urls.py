@@ -1,30 +1,58 @@
 # urls.py
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path
+from django.urls import path, re_path
 from .views import (
     CourseListAPIView,
     EnrollCourseAPIView,
+    BulkEnrollAPIView,
     CourseLevelsAPIView,
     LevelVideosAPIView,
     VideoDetailAPIView,
     CompleteVideoAPIView,
+    VideoHeartbeatAPIView,
+    DashboardAPIView,
+    SearchAPIView,
+    CoursePackageAPIView,
+    CoursePackageFileView,
+    CourseSyncAPIView,
     QuizDetailAPIView,
     SubmitQuizAPIView,
     LevelExamDetailAPIView,
     SubmitExamAPIView,
+    StartExamSessionAPIView,
+    ExamSessionAPIView,
+    ExamSessionAnswersAPIView,
+    SubmitExamSessionAPIView,
+    exam_live_stream,
+    metrics_view,
+    serve_blob,
 )
 
 urlpatterns = [
     # Course endpoints
     path('api/courses/', CourseListAPIView.as_view(), name='course-list'),
     path('api/courses/<int:course_id>/enroll/', EnrollCourseAPIView.as_view(), name='course-enroll'),
+    path('api/enrollments/bulk/', BulkEnrollAPIView.as_view(), name='enrollments-bulk'),
     path('api/courses/<int:course_id>/levels/', CourseLevelsAPIView.as_view(), name='course-levels'),
 
     # Video endpoints
     path('api/levels/<int:level_id>/videos/', LevelVideosAPIView.as_view(), name='level-videos'),
     path('api/videos/<int:video_id>/', VideoDetailAPIView.as_view(), name='video-detail'),
     path('api/videos/<int:video_id>/complete/', CompleteVideoAPIView.as_view(), name='video-complete'),
+    path('api/videos/<int:video_id>/heartbeat/', VideoHeartbeatAPIView.as_view(), name='video-heartbeat'),
+
+    # Dashboard endpoints
+    path('api/me/dashboard/', DashboardAPIView.as_view(), name='me-dashboard'),
+
+    # Search endpoints
+    path('api/search/', SearchAPIView.as_view(), name='search'),
+
+    # Offline packages
+    path('api/courses/<int:course_id>/package/', CoursePackageAPIView.as_view(), name='course-package'),
+    path('api/courses/<int:course_id>/package/<int:package_id>/', CoursePackageFileView.as_view(),
+         name='course-package-file'),
+    path('api/courses/<int:course_id>/sync/', CourseSyncAPIView.as_view(), name='course-sync'),
 
     # Quiz endpoints
     path('api/quizzes/<int:quiz_id>/', QuizDetailAPIView.as_view(), name='quiz-detail'),
@@ -33,6 +61,20 @@ urlpatterns = [
     # Exam endpoints
     path('api/levels/<int:level_id>/exam/', LevelExamDetailAPIView.as_view(), name='exam-detail'),
     path('api/levels/<int:level_id>/exam/submit/', SubmitExamAPIView.as_view(), name='exam-submit'),
+    path('api/levels/<int:level_id>/exam/session/', StartExamSessionAPIView.as_view(), name='exam-session-start'),
+    path('api/exam-sessions/<int:session_id>/', ExamSessionAPIView.as_view(), name='exam-session-detail'),
+    path('api/exam-sessions/<int:session_id>/answers/', ExamSessionAnswersAPIView.as_view(), name='exam-session-answers'),
+    path('api/exam-sessions/<int:session_id>/submit/', SubmitExamSessionAPIView.as_view(), name='exam-session-submit'),
+
+    # Live exam monitoring (ASGI)
+    path('api/levels/<int:level_id>/exam/live/', exam_live_stream, name='exam-live'),
+    path('api/courses/<int:course_id>/exams/live/', exam_live_stream, name='course-exams-live'),
+
+    # Monitoring
+    path('metrics', metrics_view, name='metrics'),
+
+    # Content-addressed media, served in production too, with immutable caching
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}blobs/(?P<path>[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.\w+)?)$', serve_blob, name='media-blob'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,29 +1,76 @@
 # views.py
+import csv
+import math
+import os
+
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from .models import (
-    Course, CourseLevel, Enrollment, Video, UserVideoProgress,
-    Quiz, UserQuizAttempt, LevelExam, UserExamAttempt
+    Course, CourseLevel, CoursePackage, Enrollment, Video, UserVideoProgress,
+    Quiz, UserQuizAttempt, LevelExam, UserExamAttempt, ExamSession
 )
+from . import completion, enrollments, exam_sessions, heartbeats, live, metrics, packages, search, storage, unlocks
+from .dashboard import get_dashboard, invalidate_dashboard
+from .db_routers import ReplicaReadMixin
+from .fast_serializers import serialize_courses, serialize_level_progress, serialize_videos
+from .progress import store_progress
 from .serializers import (
-    CourseSerializer, CourseLevelProgressSerializer, VideoSerializer,
+    CourseSerializer, VideoSerializer,
     EnrollmentSerializer, QuizSerializer, LevelExamSerializer
 )
 
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+
+
+def level_access(user, level):
+    """
+    Return (enrollment, None), or (None, a 403 response) if `user` is not
+    enrolled in the level's course or has not unlocked the level yet. The
+    enrollment comes with its completion bitmap and course layout version.
+    """
+    enrollment = (
+        Enrollment.objects
+        .filter(user=user, course_id=level.course_id, course__deleted_at__isnull=True)
+        .select_related('course')
+        .only('id', 'user_id', 'course_id', 'unlocked_order', 'completed_videos', 'completion_version',
+              'course__video_layout_version')
+        .first()
+    )
+    if enrollment is None:
+        return None, Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+    if not unlocks.is_level_unlocked(enrollment, level):
+        return None, Response({"detail": "This level is locked."}, status=status.HTTP_403_FORBIDDEN)
+    return enrollment, None
+
+
+def level_access_denied(user, level):
+    """Return a 403 response if `user` may not open `level`, otherwise None."""
+    return level_access(user, level)[1]
 
 # ----- Course APIs -----
 
 # GET /api/courses/
-class CourseListAPIView(ListAPIView):
+class CourseListAPIView(ReplicaReadMixin, ListAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        # Same output as CourseSerializer, built from .values() rows.
+        return Response(serialize_courses(self.filter_queryset(self.get_queryset())))
+
 
 # POST /api/courses/<course_id>/enroll/
 class EnrollCourseAPIView(APIView):
@@ -33,11 +80,64 @@ class EnrollCourseAPIView(APIView):
         course = get_object_or_404(Course, id=course_id)
         if Enrollment.objects.filter(user=request.user, course=course).exists():
             return Response({"detail": "Already enrolled."}, status=status.HTTP_400_BAD_REQUEST)
-        enrollment = Enrollment.objects.create(user=request.user, course=course)
+        try:
+            with transaction.atomic():
+                enrollment = Enrollment.objects.create(
+                    user=request.user, course=course, unlocked_order=unlocks.first_level_order(course.id)
+                )
+        except IntegrityError:
+            # A concurrent request enrolled the user first.
+            return Response({"detail": "Already enrolled."}, status=status.HTTP_400_BAD_REQUEST)
+        invalidate_dashboard(request.user.id)
         serializer = EnrollmentSerializer(enrollment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+# POST /api/enrollments/bulk/
+# JSON {"courses": [1, 2], "users": ["alice", "bob@example.com"]}, or a
+# multipart form with `courses` and a CSV `file` of usernames/emails.
+class BulkEnrollAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        courses = request.data.get('courses')
+        if hasattr(request.data, 'getlist'):
+            courses = request.data.getlist('courses')
+        try:
+            course_ids = [int(course_id) for course_id in enrollments.parse_identifiers(courses or [])]
+        except ValueError:
+            return Response({"detail": "Course ids must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not course_ids:
+            return Response({"detail": "No courses given."}, status=status.HTTP_400_BAD_REQUEST)
+        missing = set(course_ids) - set(Course.objects.filter(id__in=course_ids).values_list('id', flat=True))
+        if missing:
+            return Response({"detail": f"Unknown courses: {sorted(missing)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                identifiers = enrollments.identifiers_from_csv(upload)
+            except (UnicodeDecodeError, csv.Error):
+                return Response({"detail": "Could not read the CSV file."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            users = request.data.get('users')
+            if hasattr(request.data, 'getlist'):
+                users = request.data.getlist('users')
+            identifiers = enrollments.parse_identifiers(users or [])
+        if not identifiers:
+            return Response({"detail": "No users given."}, status=status.HTTP_400_BAD_REQUEST)
+
+        found, unknown = enrollments.resolve_users(identifiers)
+        report = enrollments.enroll_users(found.values(), course_ids)
+        return Response({
+            "users": len(set(found.values())),
+            "unknown": unknown,
+            "created": sum(counts['created'] for counts in report.values()),
+            "skipped": sum(counts['skipped'] for counts in report.values()),
+            "courses": report,
+        }, status=status.HTTP_200_OK)
+
+
 # GET /api/courses/<course_id>/levels/
 class CourseLevelsAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -48,8 +148,7 @@ class CourseLevelsAPIView(APIView):
         if not Enrollment.objects.filter(user=request.user, course=course).exists():
             return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
         levels = course.levels.all().order_by('order')
-        serializer = CourseLevelProgressSerializer(levels, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(serialize_level_progress(levels, request.user))
 
 
 # GET /api/levels/<level_id>/videos/
@@ -58,27 +157,26 @@ class LevelVideosAPIView(APIView):
 
     def get(self, request, level_id):
         level = get_object_or_404(CourseLevel, id=level_id)
-        # Check if the user is enrolled in the course of this level.
-        if not Enrollment.objects.filter(user=request.user, course=level.course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        # Check if the user is enrolled in the course and has unlocked this level.
+        enrollment, denied = level_access(request.user, level)
+        if denied:
+            return denied
         videos = level.videos.all().order_by('order')
+        data = serialize_videos(videos)
+        # From the enrollment's completion bitmap; no UserVideoProgress scan.
+        completed = completion.completed_video_ids(enrollment)
         # Determine locked/unlocked status based on sequential completion.
-        data = []
         previous_completed = True  # For the first video, we assume it’s unlocked.
-        first_video_order = videos.first().order if videos.exists() else None
-        for video in videos:
-            # Check if the video has been completed.
-            progress = UserVideoProgress.objects.filter(user=request.user, video=video, is_completed=True).exists()
+        first_video_order = data[0]['order'] if data else None
+        for video_data in data:
             # If it is not the first video, lock it if the previous video was not completed.
             is_locked = False
-            if video.order != first_video_order and not previous_completed:
+            if video_data['order'] != first_video_order and not previous_completed:
                 is_locked = True
             # Update the flag for sequential unlocking.
-            if not progress:
+            if video_data['id'] not in completed:
                 previous_completed = False
-            video_data = VideoSerializer(video).data
             video_data['is_locked'] = is_locked
-            data.append(video_data)
         return Response(data)
 
 
@@ -87,9 +185,10 @@ class VideoDetailAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, video_id):
-        video = get_object_or_404(Video, id=video_id)
-        if not Enrollment.objects.filter(user=request.user, course=video.level.course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        video = get_object_or_404(Video.objects.select_related('level'), id=video_id)
+        denied = level_access_denied(request.user, video.level)
+        if denied:
+            return denied
         serializer = VideoSerializer(video)
         return Response(serializer.data)
 
@@ -99,16 +198,218 @@ class CompleteVideoAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, video_id):
-        video = get_object_or_404(Video, id=video_id)
-        if not Enrollment.objects.filter(user=request.user, course=video.level.course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
-        progress, created = UserVideoProgress.objects.get_or_create(user=request.user, video=video)
-        progress.is_completed = True
-        progress.completed_at = timezone.now()
-        progress.save()
+        video = get_object_or_404(Video.objects.select_related('level'), id=video_id)
+        denied = level_access_denied(request.user, video.level)
+        if denied:
+            return denied
+        with transaction.atomic():
+            progress, created = UserVideoProgress.objects.get_or_create(user=request.user, video=video)
+            progress.is_completed = True
+            progress.completed_at = timezone.now()
+            progress.save()
+            completion.mark_completed(request.user.id, video.id)
+        invalidate_dashboard(request.user.id)
         return Response({"detail": "Video marked as completed."})
 
 
+def _parse_seconds(value):
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds) or seconds < 0:
+        return None
+    return seconds
+
+
+# GET/POST /api/videos/<video_id>/heartbeat/
+class VideoHeartbeatAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_video(self, request, video_id):
+        video = get_object_or_404(Video.objects.select_related('level'), id=video_id)
+        return video, level_access_denied(request.user, video.level)
+
+    def get(self, request, video_id):
+        video, denied = self.get_video(request, video_id)
+        if denied:
+            return denied
+        progress = UserVideoProgress.objects.filter(user=request.user, video=video).order_by('id').first()
+        # A buffered heartbeat is newer than anything already flushed.
+        position = heartbeats.buffer.get(request.user.id, video.id)
+        if position is None:
+            position = progress.position if progress else 0
+        return Response({
+            "position": position,
+            "is_completed": bool(progress and progress.is_completed),
+        })
+
+    def post(self, request, video_id):
+        video, denied = self.get_video(request, video_id)
+        if denied:
+            return denied
+        # Expecting data like: {"position": 132.5, "duration": 600}
+        position = _parse_seconds(request.data.get('position'))
+        if position is None:
+            return Response({"detail": "A non-negative numeric position is required."}, status=status.HTTP_400_BAD_REQUEST)
+        # Prefer the duration measured at ingest over the client's report.
+        duration = video.duration or _parse_seconds(request.data.get('duration'))
+        if (not heartbeats.buffer.is_completed(request.user.id, video.id)
+                and heartbeats.is_past_threshold(position, duration)):
+            heartbeats.complete_video(request.user, video, position)
+            return Response({"detail": "Video marked as completed.", "position": position})
+        heartbeats.buffer.record(request.user.id, video.id, position)
+        return Response({"detail": "Heartbeat recorded.", "position": position}, status=status.HTTP_202_ACCEPTED)
+
+
+# ----- Dashboard APIs -----
+
+# GET /api/me/dashboard/
+class DashboardAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_dashboard(request.user))
+
+
+# ----- Search APIs -----
+
+def _positive_int(value, default, maximum=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    if number < 1:
+        return default
+    return min(number, maximum) if maximum else number
+
+
+# GET /api/search/?q=<query>&page=<n>&page_size=<n>
+class SearchAPIView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "A search query is required."}, status=status.HTTP_400_BAD_REQUEST)
+        page = _positive_int(request.query_params.get('page'), 1)
+        page_size = _positive_int(request.query_params.get('page_size'), 20, maximum=100)
+        # Only search courses the user is enrolled in.
+        course_ids = list(
+            Enrollment.objects.filter(user=request.user, course__deleted_at__isnull=True).values_list('course_id', flat=True)
+        )
+        total, hits = search.get_backend().search(
+            query, course_ids, limit=page_size, offset=(page - 1) * page_size
+        )
+        return Response({
+            "count": total,
+            "page": page,
+            "page_size": page_size,
+            "results": [
+                {
+                    "type": hit.kind,
+                    "id": hit.object_id,
+                    "course": hit.course_id,
+                    "title": hit.title,
+                    "snippet": hit.snippet,
+                    "score": hit.score,
+                }
+                for hit in hits
+            ],
+        })
+
+
+# ----- Offline packages -----
+
+def _enrollment(user, course_id):
+    return (
+        Enrollment.objects.filter(user=user, course_id=course_id, course__deleted_at__isnull=True)
+        .only('unlocked_order').first()
+    )
+
+
+# GET /api/courses/<course_id>/package/
+class CoursePackageAPIView(APIView):
+    """
+    Describe the latest offline package of the levels the user has unlocked.
+    A stale or missing package is rebuilt in the background.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        enrollment = _enrollment(request.user, course.id)
+        if enrollment is None:
+            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        package = packages.latest_package(course.id, enrollment.unlocked_order)
+        stale = package is None or package.version < packages.current_version(course.id)
+        if stale:
+            packages.request_build(course.id, enrollment.unlocked_order)
+        if package is None:
+            return Response({"detail": "The package is being built. Try again shortly."},
+                            status=status.HTTP_202_ACCEPTED)
+        return Response({
+            "course": course.id,
+            "version": package.version,
+            "unlocked_order": package.unlocked_order,
+            "url": request.build_absolute_uri(reverse('course-package-file', args=[course.id, package.id])),
+            "size": package.size,
+            "sha256": package.sha256,
+            "built_at": package.built_at,
+            "stale": stale,
+        })
+
+
+# GET /api/courses/<course_id>/package/<package_id>/
+class CoursePackageFileView(APIView):
+    """Serve a package file to enrolled users who have unlocked every level in it."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, course_id, package_id):
+        package = get_object_or_404(CoursePackage, id=package_id, course_id=course_id)
+        enrollment = _enrollment(request.user, course_id)
+        if enrollment is None:
+            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        if package.unlocked_order is not None and not (
+            enrollment.unlocked_order is not None and package.unlocked_order <= enrollment.unlocked_order
+        ):
+            return Response({"detail": "This package includes levels you have not unlocked."},
+                            status=status.HTTP_403_FORBIDDEN)
+        etag = f'"{package.sha256}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            try:
+                response = FileResponse(
+                    package.file.open('rb'), as_attachment=True, filename=os.path.basename(package.file.name),
+                    content_type='application/gzip',
+                )
+            except FileNotFoundError:
+                raise Http404
+        # A package's content never changes, but only its users may cache it.
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+# GET /api/courses/<course_id>/sync/?cursor=<change_id>:<timestamp>:<unlocked_order>
+class CourseSyncAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        enrollment = _enrollment(request.user, course.id)
+        if enrollment is None:
+            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            data = packages.delta(
+                request.user, course.id, enrollment.unlocked_order, request.query_params.get('cursor', '0:'),
+            )
+        except packages.InvalidCursor:
+            return Response({"detail": "Invalid sync cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
 # ----- Quiz APIs -----
 
 # GET /api/quizzes/<quiz_id>/
@@ -116,11 +417,12 @@ class QuizDetailAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, quiz_id):
-        quiz = get_object_or_404(Quiz, id=quiz_id)
-        # Determine the related course from quiz.video or quiz.level.
-        course = quiz.video.level.course if quiz.video else (quiz.level.course if quiz.level else None)
-        if course and not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        quiz = get_object_or_404(Quiz.objects.select_related('video__level', 'level'), id=quiz_id)
+        # Determine the related level from quiz.video or quiz.level.
+        level = quiz.video.level if quiz.video else quiz.level
+        denied = level and level_access_denied(request.user, level)
+        if denied:
+            return denied
         serializer = QuizSerializer(quiz)
         return Response(serializer.data)
 
@@ -130,27 +432,32 @@ class SubmitQuizAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, quiz_id):
-        quiz = get_object_or_404(Quiz, id=quiz_id)
-        course = quiz.video.level.course if quiz.video else (quiz.level.course if quiz.level else None)
-        if course and not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        quiz = get_object_or_404(Quiz.objects.select_related('video__level', 'level'), id=quiz_id)
+        level = quiz.video.level if quiz.video else quiz.level
+        denied = level and level_access_denied(request.user, level)
+        if denied:
+            return denied
         answers = request.data.get('answers', [])
-        total_questions = quiz.questions.count()
-        correct_count = 0
-        # Expecting data like: {"answers": [{"question_id": X, "answer_id": Y}, ...]}
-        for ans in answers:
-            question_id = ans.get('question_id')
-            answer_id = ans.get('answer_id')
-            try:
-                question = quiz.questions.get(id=question_id)
-                answer = question.answers.get(id=answer_id)
-                if answer.is_correct:
-                    correct_count += 1
-            except Exception as e:
-                continue
+        with metrics.registry.timer('grading_duration_seconds', {'kind': 'quiz'}):
+            total_questions = quiz.questions.count()
+            correct_count = 0
+            # Expecting data like: {"answers": [{"question_id": X, "answer_id": Y}, ...]}
+            for ans in answers:
+                question_id = ans.get('question_id')
+                answer_id = ans.get('answer_id')
+                try:
+                    question = quiz.questions.get(id=question_id)
+                    answer = question.answers.get(id=answer_id)
+                    if answer.is_correct:
+                        correct_count += 1
+                except Exception as e:
+                    continue
         score = int((correct_count / total_questions) * 100) if total_questions else 0
         passed = score >= quiz.passing_score
         UserQuizAttempt.objects.create(user=request.user, quiz=quiz, score=score, passed=passed)
+        if quiz.level_id:
+            store_progress([quiz.level_id], [request.user.id])
+        invalidate_dashboard(request.user.id)
         return Response({"score": score, "passed": passed})
 
 
@@ -162,8 +469,9 @@ class LevelExamDetailAPIView(APIView):
 
     def get(self, request, level_id):
         level = get_object_or_404(CourseLevel, id=level_id)
-        if not Enrollment.objects.filter(user=request.user, course=level.course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        denied = level_access_denied(request.user, level)
+        if denied:
+            return denied
         exam = get_object_or_404(LevelExam, level=level)
         serializer = LevelExamSerializer(exam)
         return Response(serializer.data)
@@ -175,33 +483,194 @@ class SubmitExamAPIView(APIView):
 
     def post(self, request, level_id):
         level = get_object_or_404(CourseLevel, id=level_id)
-        if not Enrollment.objects.filter(user=request.user, course=level.course).exists():
-            return Response({"detail": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
+        denied = level_access_denied(request.user, level)
+        if denied:
+            return denied
         exam = get_object_or_404(LevelExam, level=level)
         answers = request.data.get('answers', [])
-        total_questions = exam.questions.count()
-        correct_count = 0
-        # Expecting data like: {"answers": [{"question_id": X, "answer_id": Y}, ...]}
-        for ans in answers:
-            question_id = ans.get('question_id')
-            answer_id = ans.get('answer_id')
-            try:
-                question = exam.questions.get(id=question_id)
-                answer = question.answers.get(id=answer_id)
-                if answer.is_correct:
-                    correct_count += 1
-            except Exception as e:
-                continue
+        with metrics.registry.timer('grading_duration_seconds', {'kind': 'exam'}):
+            total_questions = exam.questions.count()
+            correct_count = 0
+            # Expecting data like: {"answers": [{"question_id": X, "answer_id": Y}, ...]}
+            for ans in answers:
+                question_id = ans.get('question_id')
+                answer_id = ans.get('answer_id')
+                try:
+                    question = exam.questions.get(id=question_id)
+                    answer = question.answers.get(id=answer_id)
+                    if answer.is_correct:
+                        correct_count += 1
+                except Exception as e:
+                    continue
         score = int((correct_count / total_questions) * 100) if total_questions else 0
         passed = score >= exam.passing_score
         UserExamAttempt.objects.create(user=request.user, exam=exam, score=score, passed=passed)
-        # Unlock the next level if the exam is passed.
-        if passed:
-            next_level = CourseLevel.objects.filter(course=level.course, order__gt=level.order).order_by('order').first()
-            if next_level:
-                message = f"Exam passed. Next level unlocked: {next_level.name}."
-            else:
-                message = "Exam passed. You have completed the course."
-        else:
-            message = "Exam failed."
+        message = exam_outcome(request.user, level, passed)
+        invalidate_dashboard(request.user.id)
         return Response({"score": score, "passed": passed, "message": message})
+
+
+def exam_outcome(user, level, passed):
+    """Unlock the next level if the exam is passed and describe the result."""
+    if not passed:
+        return "Exam failed."
+    next_level = unlocks.advance_past(user, level)
+    if next_level:
+        return f"Exam passed. Next level unlocked: {next_level.name}."
+    return "Exam passed. You have completed the course."
+
+
+def session_state(session, draft):
+    return {
+        "id": session.id,
+        "exam": session.exam_id,
+        "started_at": session.started_at,
+        "deadline": session.deadline,
+        "seconds_remaining": max(0, int((session.deadline - timezone.now()).total_seconds())),
+        "submitted": draft['submitted'],
+        "answers": [
+            {"question_id": question_id, "answer_id": answer_id}
+            for question_id, answer_id in sorted(draft['answers'].items())
+        ],
+    }
+
+
+# POST /api/levels/<level_id>/exam/session/
+class StartExamSessionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, level_id):
+        level = get_object_or_404(CourseLevel, id=level_id)
+        denied = level_access_denied(request.user, level)
+        if denied:
+            return denied
+        exam = get_object_or_404(LevelExam, level=level)
+        session = exam_sessions.start(request.user, exam)
+        return Response(session_state(session, exam_sessions.load(session.id)), status=status.HTTP_201_CREATED)
+
+
+# GET /api/exam-sessions/<session_id>/
+class ExamSessionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = get_object_or_404(ExamSession, id=session_id, user=request.user)
+        return Response(session_state(session, exam_sessions.load(session.id)))
+
+
+# PUT/PATCH /api/exam-sessions/<session_id>/answers/
+class ExamSessionAnswersAPIView(APIView):
+    """
+    Autosave answer drafts. Served from the cached draft alone, so frequent
+    saves cost no queries until a flush is due.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, session_id):
+        draft = exam_sessions.load(session_id)
+        if draft is None or draft['user_id'] != request.user.id:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        # Expecting data like: {"answers": [{"question_id": X, "answer_id": Y}, ...]}
+        answers = exam_sessions.parse_answers(request.data.get('answers', []))
+        try:
+            exam_sessions.autosave(session_id, draft, answers)
+        except exam_sessions.SessionClosed:
+            return Response({"detail": "This exam session is closed."}, status=status.HTTP_409_CONFLICT)
+        return Response({"saved": len(answers)}, status=status.HTTP_202_ACCEPTED)
+
+    patch = put
+
+
+# POST /api/exam-sessions/<session_id>/submit/
+class SubmitExamSessionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        session = get_object_or_404(
+            ExamSession.objects.select_related('exam__level'), id=session_id, user=request.user
+        )
+        # Answers sent with the submit are a last autosave, if still in time.
+        answers = exam_sessions.parse_answers(request.data.get('answers', []))
+        if answers:
+            try:
+                exam_sessions.autosave(session.id, exam_sessions.load(session.id), answers)
+            except exam_sessions.SessionClosed:
+                pass
+        with metrics.registry.timer('grading_duration_seconds', {'kind': 'exam'}):
+            try:
+                score, passed = exam_sessions.submit(session)
+            except exam_sessions.SessionClosed:
+                return Response({"detail": "This exam session was already submitted."}, status=status.HTTP_409_CONFLICT)
+        message = exam_outcome(request.user, session.exam.level, passed)
+        invalidate_dashboard(request.user.id)
+        return Response({"score": score, "passed": passed, "message": message})
+
+
+# ----- Live exam monitoring -----
+
+# GET /api/levels/<level_id>/exam/live/
+# GET /api/courses/<course_id>/exams/live/
+# Staff only; a text/event-stream of attempt and aggregate events (see main/live.py).
+async def exam_live_stream(request, level_id=None, course_id=None):
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would tie up a worker thread for good.
+        return JsonResponse({"detail": "Live streams are served by the ASGI application."},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+    user = await sync_to_async(live.authenticate)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."},
+                            status=status.HTTP_401_UNAUTHORIZED)
+    if not user.is_staff:
+        return JsonResponse({"detail": "You do not have permission to perform this action."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    if level_id is not None:
+        exam = await LevelExam.objects.filter(level_id=level_id).only('id').afirst()
+        if exam is None:
+            return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        kind, object_id = live.EXAM, exam.id
+    else:
+        if not await Course.objects.filter(id=course_id).aexists():
+            return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        kind, object_id = live.COURSE, course_id
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    response = StreamingHttpResponse(live.stream(kind, object_id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ----- Media -----
+
+# GET <MEDIA_URL>blobs/<xx>/<digest>.<ext>
+def serve_blob(request, path):
+    name = f"{storage.BLOB_DIR}/{path}"
+    digest = storage.digest_of(name)
+    if digest is None:
+        raise Http404
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(storage.blob_storage.open(name, 'rb'))
+        except FileNotFoundError:
+            raise Http404
+    # The name is the content hash, so the response can be cached forever.
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={storage.CACHE_SECONDS}, immutable'
+    return response
+
+
+# ----- Metrics -----
+
+# GET /metrics
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    body = metrics.render(metrics.registry.collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')